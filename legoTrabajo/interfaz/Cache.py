@@ -0,0 +1,105 @@
+# Cache.py
+# Caché local en disco del cliente (PC):
+#   - programas/  -> .mpy compilados del LISTENER_SCRIPT (clave: hash + ABI + firmware)
+#   - hubs.json   -> qué programa quedó descargado en cada hub
+#   - dispositivos.json -> dirección BLE y metadatos de cada hub por nombre
+# Evita recompilar con mpy-cross, volver a descargar el script y repetir el
+# escaneo BLE completo en cada conexión.
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+_lock = threading.Lock()
+
+
+def cache_dir() -> str:
+    base = os.environ.get("LOCALAPPDATA") or os.path.join(os.path.expanduser("~"), ".cache")
+    path = os.path.join(base, "ControlLego")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _leer_json(nombre: str) -> dict:
+    try:
+        with open(os.path.join(cache_dir(), nombre), encoding='utf-8') as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+
+def _escribir_json(nombre: str, data: dict):
+    path = os.path.join(cache_dir(), nombre)
+    tmp = path + ".tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp, path)  # escritura atómica
+
+
+# --- PROGRAMAS COMPILADOS ---
+
+def clave_programa(prog_hash: str, fw_version, abi) -> str:
+    raw = f"{prog_hash}|{fw_version}|{abi}"
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()[:24]
+
+
+def programa_cacheado(clave: str):
+    path = os.path.join(cache_dir(), "programas", f"{clave}.mpy")
+    try:
+        with open(path, 'rb') as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def guardar_programa(clave: str, mpy: bytes):
+    carpeta = os.path.join(cache_dir(), "programas")
+    os.makedirs(carpeta, exist_ok=True)
+    tmp = os.path.join(carpeta, f"{clave}.tmp")
+    with open(tmp, 'wb') as f:
+        f.write(mpy)
+    os.replace(tmp, os.path.join(carpeta, f"{clave}.mpy"))
+
+
+# --- PROGRAMA DESCARGADO EN CADA HUB ---
+
+def programa_en_hub(hub_id: str):
+    with _lock:
+        return _leer_json("hubs.json").get(hub_id, {}).get("programa")
+
+
+def registrar_programa_en_hub(hub_id: str, clave):
+    with _lock:
+        data = _leer_json("hubs.json")
+        entrada = data.setdefault(hub_id, {})
+        if clave is None:
+            entrada.pop("programa", None)
+        else:
+            entrada["programa"] = clave
+        _escribir_json("hubs.json", data)
+
+
+# --- DISPOSITIVOS BLE (nombre -> dirección) ---
+
+def dispositivo_cacheado(nombre: str):
+    """Metadatos guardados del hub (dict con 'address' y 'visto') o None."""
+    with _lock:
+        entrada = _leer_json("dispositivos.json").get(nombre)
+    return entrada if isinstance(entrada, dict) and entrada.get("address") else None
+
+
+def guardar_dispositivo(nombre: str, address: str):
+    with _lock:
+        data = _leer_json("dispositivos.json")
+        data[nombre] = {"address": address, "visto": round(time.time())}
+        _escribir_json("dispositivos.json", data)
+
+
+def olvidar_dispositivo(nombre: str):
+    with _lock:
+        data = _leer_json("dispositivos.json")
+        if data.pop(nombre, None) is not None:
+            _escribir_json("dispositivos.json", data)
@@ -4,100 +4,1268 @@ import asyncio
 import threading
 import tempfile
 import os
+import time
 import traceback
-from queue import Queue
-from pybricksdev.ble import find_device  # type: ignore
-from pybricksdev.connections.pybricks import PybricksHubBLE  # type: ignore
+from collections import deque
+from queue import Queue, SimpleQueue
+# pybricksdev (bleak, mpy-cross...) se importa dentro de las funciones que lo
+# usan: así el módulo también carga con el simulador, sin pila BLE instalada
 
 # Importamos el script del robot del otro archivo
-from ControlMotores import LISTENER_SCRIPT  # payload del servidor a cargar en el hub
-
-# worker BLE asíncrono, puente cliente→servidor
-class BLEWorker:
-    def __init__(self, log_queue: Queue):
-        self.loop = asyncio.new_event_loop()
-        self.thread = threading.Thread(target=self._thread_main, daemon=True)
-        self.queue = asyncio.Queue()
+from ControlMotores import preparar_script  # payload del servidor a cargar en el hub
+import Cache
+from Protocolo import Codificador, PROTO_BINARIO
+import Telemetria
+from Latencia import RegistroLatencias, Histograma
+import Registro
+import Grabador
+import Metricas
+
+# Tiempo máximo esperando la línea READY del hub tras arrancar el programa
+READY_TIMEOUT = 5.0
+
+# Conexión directa a la dirección guardada en caché antes de escanear por nombre
+DIRECTO_TIMEOUT = 2.0
+
+# Transportes: "auto" usa USB si hay un hub enchufado y si no BLE
+TRANSPORTES = ("auto", "usb", "ble")
+# Hubs con firmware Pybricks por USB (pybricksdev.usb): VID de LEGO y PID por modelo
+LEGO_USB_VID = 0x0694
+PYBRICKS_USB_PIDS = (0x0009, 0x000D, 0x0010)  # SPIKE Prime, SPIKE Essential, MINDSTORMS Inventor
+
+# Esperas (s) entre intentos de reconexión tras una caída del enlace
+RECONEXION_BACKOFF = (0.5, 1.0, 2.0, 4.0, 8.0)
+
+# Canales cuyo último comando se restaura al reconectar
+CANALES_ESTADO = ("traccion", "direccion", "rumbo")
+
+# Canal de cada acción: en un mismo canal sólo importa el último comando
+CANALES = {
+    "F": "traccion", "B": "traccion", "S": "traccion", "U": "traccion",
+    "L": "direccion", "R": "direccion", "Z": "direccion", "W": "direccion",
+    "T": "telemetria",
+    "H": "latido", "E": "lease",
+    "M": "rumbo", "A": "rumbo",
+    "I": "rampa_vel", "J": "rampa_dir",
+}
+
+# Lease del hub (hombre muerto): sin comandos ni latidos en este plazo el hub
+# para la tracción y centra la dirección. El latido sale sólo si el enlace
+# lleva LEASE/LATIDOS_POR_LEASE ms sin escribir nada.
+LEASE_MS = 500
+LATIDOS_POR_LEASE = 3
+
+# Modo rápido (sin_respuesta=True): writes BLE sin respuesta al comando
+# WRITE_STDIN del servicio Pybricks (lo mismo que PybricksHubBLE.write pero sin
+# esperar la confirmación GATT). Lo que se pierde se detecta por el seq: el hub
+# avisa los huecos ("N <desde> <hasta>") y lo que no tiene ack en ACK_TIMEOUT se
+# da por perdido. Sólo se reenvía lo que sigue vigente en su canal.
+PYBRICKS_COMMAND_EVENT_UUID = "c5f50002-8280-46da-89f4-6d8051e4aeef"  # pybricksdev.ble.pybricks
+CMD_WRITE_STDIN = 6
+ACK_TIMEOUT = (0.05, 0.1, 0.5)  # s: mínimo, inicial (sin medidas), máximo
+# Con writes con respuesta no hay reenvío: sin ack en este plazo el comando se
+# da por no confirmado (y libera su hueco en el tope de Controlador)
+ACK_LIMITE = 2.0
+MAX_REENVIOS = 5
+
+# HubCapabilityFlag.USER_PROG_MULTI_FILE_MPY6_1_NATIVE (pybricksdev.ble.pybricks)
+CAP_MPY6_1_NATIVE = 1 << 2
+
+
+# comando en tránsito: texto + marcas de tiempo de cada etapa (perf_counter)
+class Comando:
+    __slots__ = ("texto", "t_gui", "t_cola", "t_salida", "t_tx", "t_fin_tx", "seq", "fin", "intentos")
+
+    def __init__(self, texto: str, t_gui: float = None, fin=None):
+        self.texto = texto
+        self.t_gui = time.perf_counter() if t_gui is None else t_gui
+        self.t_cola = self.t_gui
+        self.t_salida = 0.0
+        self.t_tx = 0.0
+        self.t_fin_tx = 0.0
+        self.seq = -1
+        # fin: Future opcional (ver Controlador) -> True al llegar al hub (ack, o
+        # write si no hay acks), False si se descartó o lo sustituyó otro del canal
+        self.fin = fin
+        self.intentos = 0
+
+
+def _resolver(cmd: Comando, entregado: bool):
+    fut = cmd.fin
+    if fut is not None and not fut.done():
+        fut.set_result(entregado)
+
+
+# cola de comandos acotada: "el último gana" por canal + carril prioritario
+class ColaComandos:
+    def __init__(self, max_fifo: int = 32, max_prioridad: int = 8):
+        # Canales y FIFO comparten número de llegada: sale el más antiguo de los
+        # dos, y sólo el carril prioritario se adelanta a ambos
+        self._prioridad = deque(maxlen=max_prioridad)
+        self._canales = {}                      # canal -> (llegada, último comando pendiente)
+        self._fifo = deque(maxlen=max_fifo)     # (llegada, comando) sin canal (Q, etc.)
+        self._llegada = 0
+        self._evento = asyncio.Event()
+        # métricas
+        self.encolados = 0
+        self.coalescidos = 0
+        self.descartados = 0
+        self.max_profundidad = 0
+
+    def __len__(self):
+        return len(self._prioridad) + len(self._canales) + len(self._fifo)
+
+    def put(self, cmd: Comando, prioridad: bool = False):
+        # Debe llamarse desde el hilo del loop (via call_soon_threadsafe)
+        cmd.t_cola = time.perf_counter()
+        self.encolados += 1
+        canal = CANALES.get(cmd.texto[:1])
+        if prioridad:
+            # un comando urgente deja obsoleto lo pendiente en su canal
+            viejo = self._canales.pop(canal, None) if canal else None
+            if viejo is not None:
+                self.coalescidos += 1
+                _resolver(viejo[1], False)
+            if len(self._prioridad) == self._prioridad.maxlen:
+                self.descartados += 1
+                _resolver(self._prioridad[0], False)
+            self._prioridad.append(cmd)
+        elif canal:
+            # el nuevo toma el puesto de llegada actual (el dict queda en orden de llegada)
+            viejo = self._canales.pop(canal, None)
+            if viejo is not None:
+                self.coalescidos += 1
+                _resolver(viejo[1], False)
+            self._llegada += 1
+            self._canales[canal] = (self._llegada, cmd)
+        else:
+            if len(self._fifo) == self._fifo.maxlen:
+                self.descartados += 1
+                _resolver(self._fifo[0][1], False)
+            self._llegada += 1
+            self._fifo.append((self._llegada, cmd))
+        self.max_profundidad = max(self.max_profundidad, len(self))
+        self._evento.set()
+
+    def get_nowait(self):
+        if self._prioridad:
+            cmd = self._prioridad.popleft()
+        else:
+            canal = next(iter(self._canales), None)
+            if canal is not None and (not self._fifo or self._canales[canal][0] < self._fifo[0][0]):
+                cmd = self._canales.pop(canal)[1]
+            elif self._fifo:
+                cmd = self._fifo.popleft()[1]
+            else:
+                return None
+        cmd.t_salida = time.perf_counter()
+        return cmd
+
+    async def get(self):
+        while True:
+            cmd = self.get_nowait()
+            if cmd is not None:
+                return cmd
+            self._evento.clear()
+            await self._evento.wait()
+
+    def fifo_libre(self) -> int:
+        return self._fifo.maxlen - len(self._fifo)
+
+    def pendiente(self, canal: str) -> bool:
+        # ¿hay en cola un comando de este canal (en su carril o en el prioritario)?
+        return canal in self._canales or any(CANALES.get(c.texto[:1]) == canal for c in self._prioridad)
+
+    def pop_prioridad(self):
+        return self._prioridad.popleft() if self._prioridad else None
+
+    def clear(self):
+        for cmd in (*self._prioridad, *(c for _, c in self._canales.values()), *(c for _, c in self._fifo)):
+            _resolver(cmd, False)
+        self._prioridad.clear()
+        self._canales.clear()
+        self._fifo.clear()
+
+    def stats(self) -> dict:
+        return {
+            "profundidad": len(self),
+            "max_profundidad": self.max_profundidad,
+            "encolados": self.encolados,
+            "coalescidos": self.coalescidos,
+            "descartados": self.descartados,
+        }
+
+
+def precargar_pila_ble():
+    """Importa bleak, pybricksdev y mpy-cross (varios segundos en frío).
+
+    Pensado para un hilo en segundo plano tras el primer frame de la GUI: al
+    pulsar Conectar los módulos ya están en sys.modules.
+    """
+    try:
+        import bleak  # noqa: F401  # type: ignore
+        import pybricksdev.ble  # noqa: F401  # type: ignore
+        import pybricksdev.connections.pybricks  # noqa: F401  # type: ignore
+    except ImportError:
+        pass  # sin pila BLE instalada (p. ej. sólo simulador)
+
+
+class DireccionBLE(str):
+    # Dirección en caché con la forma de un BLEDevice para PybricksHubBLE (que
+    # sólo lee .name): BleakClient recibe un str y conecta directo a esa
+    # dirección, sin escaneo previo
+    def __new__(cls, address: str, nombre: str):
+        d = super().__new__(cls, address)
+        d.name = nombre
+        return d
+
+    @property
+    def address(self) -> str:
+        return str(self)
+
+
+def hub_ble(nombre: str, device, directo: bool = False):
+    """PybricksHubBLE marcado para BLEWorker._session.
+
+    directo: device es la dirección en caché (DireccionBLE); la sesión conecta
+    con DIRECTO_TIMEOUT y, si falla, la olvida y vuelve a la fábrica (escaneo).
+    nombre_cache: al conectar se refresca la entrada del hub en la caché.
+    """
+    from pybricksdev.connections.pybricks import PybricksHubBLE  # type: ignore
+
+    hub = PybricksHubBLE(device)
+    hub.directo = directo
+    hub.nombre_cache = nombre
+    return hub
+
+
+async def conectar_ble(nombre: str):
+    # Fábrica BLE: (id del hub, PybricksHubBLE). Con dirección en caché no se
+    # escanea: el connect() de la sesión va directo a ella.
+    cacheado = Cache.dispositivo_cacheado(nombre)
+    if cacheado:
+        address = cacheado["address"]
+        return address, hub_ble(nombre, DireccionBLE(address, nombre), directo=True)
+    from pybricksdev.ble import find_device  # type: ignore
+
+    device = await find_device(nombre)
+    return device.address, hub_ble(nombre, device)
+
+
+def buscar_usb():
+    """Primer hub Pybricks enchufado por USB, o None (también sin pyusb / libusb)."""
+    try:
+        import usb.core  # type: ignore
+    except ImportError:
+        return None
+
+    def es_pybricks(dev):
+        if dev.idVendor != LEGO_USB_VID or dev.idProduct not in PYBRICKS_USB_PIDS:
+            return False
+        try:
+            return (dev.product or "").endswith("Pybricks")
+        except (ValueError, usb.core.USBError):
+            return False  # sin permiso para leer los descriptores
+
+    try:
+        return usb.core.find(custom_match=es_pybricks)
+    except (usb.core.NoBackendError, usb.core.USBError):
+        return None
+
+
+async def conectar_usb(nombre: str):
+    # Fábrica USB: el hub enchufado (el cable ya lo identifica, el nombre no se usa)
+    from pybricksdev.connections.pybricks import PybricksHubUSB  # type: ignore
+
+    device = await asyncio.to_thread(buscar_usb)
+    if device is None:
+        raise asyncio.TimeoutError("no hay hub Pybricks por USB")
+    try:
+        hub_id = f"USB-{device.serial_number}"
+    except Exception:
+        hub_id = f"USB-{device.bus}-{device.address}"
+    return hub_id, PybricksHubUSB(device)
+
+
+async def conectar_auto(nombre: str):
+    # Fábrica por defecto: USB si hay un hub enchufado (sin GATT ni escaneo), si no BLE
+    if await asyncio.to_thread(buscar_usb) is not None:
+        try:
+            return await conectar_usb(nombre)
+        except asyncio.TimeoutError:
+            pass  # desenchufado justo ahora
+    return await conectar_ble(nombre)
+
+
+FABRICAS = {"auto": conectar_auto, "usb": conectar_usb, "ble": conectar_ble}
+
+
+def transporte_de(hub) -> str:
+    # HubSimulado declara 'transporte'; en pybricksdev se deduce de la clase
+    return getattr(hub, "transporte", None) or ("usb" if "USB" in type(hub).__name__ else "ble")
+
+
+def admite_sin_respuesta(hub) -> bool:
+    # Por USB no hay GATT y el stdio antiguo (NUS) ya escribe sin respuesta
+    return transporte_de(hub) == "ble" and not getattr(hub, "_legacy_stdio", False)
+
+
+# Núcleo asíncrono del enlace cliente→servidor: sesión, cola, acks y
+# reconexión, todo en un único loop. Se usa tal cual desde asyncio
+# (Controlador); BLEWorker lo adapta a un hilo propio para la GUI.
+class NucleoHub:
+    def __init__(self, log_queue: Queue, binario: bool = True, batch_budget_ms: float = 0.0,
+                 telemetry_ms: int = 200, hub_name: str = "SP-7", hub_factory=None, loop=None,
+                 lease_ms: int = LEASE_MS, heartbeat_ms: int = None, transporte: str = "auto",
+                 sin_respuesta: bool = False, acel_max: int = 0, giro_max: int = 0):
+        # loop=None: el del que lo crea (tiene que estar corriendo)
+        self.loop = loop or asyncio.get_running_loop()
+        self.queue = ColaComandos()
+        self._runner_task = None
+        self._prescan_task = None
+        self._session_task = None
+        self._session_ok = False
+        self._link_lost = False
+        self._stopping = False
         self.hub = None
+        # running: acepta comandos. Sigue activo mientras reconecta (la cola se
+        # queda con el último comando de cada canal)
         self.running = threading.Event()
         self.log_queue = log_queue
+        # hub_factory: corrutina (nombre) -> (hub_id, hub). Por defecto la del
+        # transporte pedido (USB/BLE reales); Simulador.fabrica() la sustituye por un hub simulado
+        self.hub_name = hub_name
+        if transporte not in TRANSPORTES:
+            raise ValueError(f"transporte desconocido: {transporte}")
+        self.hub_factory = hub_factory or FABRICAS[transporte]
+        self.transporte = None  # "usb" / "ble" de la sesión en curso
+        self.write_lat = Histograma()  # duración de cada write al hub (ms)
+        # binario=True: usar marcos v2 si el hub los anuncia; si no, texto v1
+        self.binario = binario
+        self.codec = Codificador()
+        # stdout del hub: el loop BLE sólo encola los bytes; un hilo lector los parsea
+        self._rx = SimpleQueue()
+        self._parser = None
+        self._stdout_sub = None
+        self.hub_stats = None  # (iteraciones, bucle máx. ms) reportado por 'Q'
+        self.hub_id = None
+        # Handshake READY: versión, hash del programa y capacidades del hub
+        self._prog_hash_hub = None
+        self._ready_event = asyncio.Event()
+        self.hub_caps = set()
+        self.hub_motors = ""
+        # Estado de conexión: los listeners se llaman desde el hilo del loop
+        self.state = "desconectado"
+        self._state_listeners = []
+        # Agrupación de comandos en un mismo write: con 0 ms sólo se agrupa lo que
+        # ya está en cola (nunca se retiene un comando solo esperando compañía)
+        self.batch_budget_ms = batch_budget_ms
+        self.writes = 0
+        self.cmds_sent = 0
+        # Telemetría del hub (0 = no pedirla)
+        self.telemetry_ms = telemetry_ms
+        self.telemetry = Telemetria.BufferTelemetria()
+        # Latencia extremo a extremo: comandos escritos esperando su ack (seq -> Comando)
+        self.latency = RegistroLatencias()
+        self._pending_ack = {}
+        # Salud del enlace
+        self.last_ack = 0.0   # perf_counter del último ack recibido
+        self.tx_errors = 0
+        self.invalidos = 0    # comandos que no se pudieron codificar
+        self.bytes_tx = 0     # bytes de comandos escritos al hub (sin cabeceras GATT)
+        self.reconexiones = 0
+        # Último comando pedido por canal (tracción/dirección) para restaurarlo al reconectar
+        self._control_state = {}
+        # Último comando confirmado por el hub en cada canal (por ack; sin ack, al escribirlo)
+        self.confirmado = {}
+        # Trayectoria en curso: se resuelve con la línea "TRJ ..." del hub
+        self._trj_fin = None
+        # Lease: plazo pedido (0 = sin lease), periodo de latido y diagnóstico
+        self.lease_ms = lease_ms
+        self.heartbeat_ms = heartbeat_ms
+        self.lease_hub_ms = 0      # plazo aceptado por el hub ("LEASE <ms>")
+        self.lease_fallos = 0      # leases vencidos reportados por el hub
+        self.heartbeats = 0
+        self._last_tx = 0.0
+        self._heartbeat_task = None
+        # Mantener rumbo en el hub (capacidad HDG): lo informa la línea "MODO"
+        self.heading_hold = False
+        # Rampas del hub para las consignas U/W (capacidad PROP): °/s² y °/s, 0 = sin límite
+        self.acel_max = acel_max
+        self.giro_max = giro_max
+        # Modo rápido: pedido (sin_respuesta) y activo en la sesión (BLE + BIN/ACK/NACK)
+        self.sin_respuesta = sin_respuesta
+        self.rapido = False
+        self._ultimo_enviado = {}  # canal -> último Comando escrito (para decidir reenvíos)
+        self._vigilancia_task = None
+        self.reenvios = 0
+        self.perdidos_tx = 0       # comandos dados por perdidos (hueco o sin ack a tiempo)
+        # Grabación del flujo de comandos de send_packet (ver Grabador.py)
+        self.recorder = None
+        self._registrar_metricas()
 
-    def log(self, msg: str):
-        if self.log_queue:
+    def _registrar_metricas(self):
+        # Todo se lee al exportar (Metricas.Exportador): nada extra por comando.
+        # Un worker nuevo con el mismo hub sustituye las funciones del anterior
+        cola = self.queue
+        for nombre, fn, ayuda, tipo in (
+            ("lego_comandos_encolados_total", lambda: cola.encolados, "comandos encolados", "counter"),
+            ("lego_comandos_coalescidos_total", lambda: cola.coalescidos,
+             "comandos sustituidos por otro más nuevo de su canal", "counter"),
+            ("lego_comandos_descartados_total", lambda: cola.descartados, "comandos descartados con la cola llena", "counter"),
+            ("lego_comandos_enviados_total", lambda: self.cmds_sent, "comandos escritos al hub", "counter"),
+            ("lego_comandos_confirmados_total", lambda: self.latency.hist["total"].n, "comandos con ack del hub", "counter"),
+            ("lego_comandos_invalidos_total", lambda: self.invalidos, "comandos que no se pudieron codificar", "counter"),
+            ("lego_comandos_perdidos_total", lambda: self.perdidos_tx, "comandos perdidos en el enlace (modo rápido)", "counter"),
+            ("lego_reenvios_total", lambda: self.reenvios, "comandos perdidos reenviados", "counter"),
+            ("lego_errores_tx_total", lambda: self.tx_errors, "writes fallidos", "counter"),
+            ("lego_writes_total", lambda: self.writes, "writes al hub", "counter"),
+            ("lego_bytes_tx_total", lambda: self.bytes_tx, "bytes de comandos escritos al hub", "counter"),
+            ("lego_reconexiones_total", lambda: self.reconexiones, "intentos de reconexión tras una caída", "counter"),
+            ("lego_leases_vencidos_total", lambda: self.lease_fallos, "paradas del hub por lease vencido", "counter"),
+            ("lego_telemetria_perdida_total", lambda: self.telemetry.perdidos, "registros de telemetría perdidos", "counter"),
+            ("lego_conectado", lambda: int(self.state == "listo"), "1 si el hub está listo", "gauge"),
+            ("lego_cola_profundidad", lambda: len(cola), "comandos en cola", "gauge"),
+            ("lego_acks_pendientes", lambda: len(self._pending_ack), "comandos escritos esperando ack", "gauge"),
+            ("lego_latencia_p95_ms", lambda: self.latency.percentiles("total")[1],
+             "latencia extremo a extremo p95 (ms)", "gauge"),
+            ("lego_write_p95_ms", lambda: self.write_lat.percentil(95), "duración de un write p95 (ms)", "gauge"),
+            ("lego_hub_bucle_ms", lambda: self._telemetria("bucle_ms"),
+             "bucle del hub más lento desde el registro de telemetría anterior (ms)", "gauge"),
+            ("lego_hub_entrada_bytes", lambda: self._telemetria("entrada_bytes"),
+             "bytes esperando en la entrada del hub", "gauge"),
+        ):
+            Metricas.METRICAS.funcion(nombre, fn, ayuda, tipo, hub=self.hub_name)
+
+    def _telemetria(self, campo: str):
+        reg = self.telemetry.ultimo()
+        return reg[campo] if reg else None
+
+    def log(self, msg: str, nivel: int = Registro.INFO):
+        if not self.log_queue:
+            return
+        registrar = getattr(self.log_queue, "registrar", None)
+        if registrar:
+            registrar(msg, nivel, self.hub_name)
+        elif nivel >= Registro.INFO:
             self.log_queue.put(msg)
 
-    def _thread_main(self):
-        asyncio.set_event_loop(self.loop)
-        self.loop.create_task(self._runner())
-        self.loop.run_forever()
+    def add_state_listener(self, fn):
+        self._state_listeners.append(fn)
 
-    async def _runner(self):
-        temp_path = None
-        try:
-            self.log("Buscando hub 'SP-7'...")
-            device = await find_device("SP-7")
-            if not device:
-                self.log("No se encontró hub.")
+    def _set_state(self, state: str):
+        self.state = state
+        for fn in list(self._state_listeners):
+            try:
+                fn(state)
+            except Exception:
+                pass
+
+    def _on_stdout(self, data: bytes):
+        # En el loop BLE: sólo marca de llegada y a la cola del hilo lector
+        self._rx.put((time.perf_counter(), data))
+
+    def _start_parser(self):
+        if self._parser is None or not self._parser.is_alive():
+            self._parser = threading.Thread(target=self._parser_main, daemon=True)
+            self._parser.start()
+
+    def _parser_main(self):
+        # Salida del hub partida en líneas fuera del loop BLE: la telemetría se
+        # decodifica aquí y sólo los acks y READY/STAT vuelven al loop
+        buf = bytearray()
+        while True:
+            item = self._rx.get()
+            if item is None:
+                buf.clear()  # nueva sesión
+                continue
+            if item is False:
+                return
+            t_rx, data = item
+            buf.extend(data)
+            ack = -1
+            while True:
+                idx = buf.find(b"\n")
+                if idx < 0:
+                    break
+                line = buf[:idx].decode('utf-8', 'replace').strip()
+                del buf[:idx + 1]
+                if not line:
+                    continue
+                if line.startswith(Telemetria.PREFIJO):
+                    valores = Telemetria.decodificar(line)
+                    if valores:
+                        self.telemetry.append(valores)
+                    continue
+                if line[0] == "K" and line[1:].isdigit():
+                    ack = int(line[1:])  # acumulado: basta el último del bloque
+                    continue
+                self.log(line, Registro.DEBUG)
+                if line.startswith(("READY", "STAT", "TRJ", "LEASE", "MODO", "N ")):
+                    self.loop.call_soon_threadsafe(self._on_hub_line, line)
+            if ack >= 0:
+                self.loop.call_soon_threadsafe(self._on_ack, ack, t_rx)
+
+    def _on_hub_line(self, line: str):
+        if line.startswith("READY"):
+            # READY <proto> <hash> <caps> <motores>
+            partes = line.split()
+            try:
+                version = int(partes[1])
+            except (IndexError, ValueError):
+                return
+            self._prog_hash_hub = partes[2] if len(partes) > 2 else None
+            self.hub_caps = set(partes[3].split(",")) if len(partes) > 3 else set()
+            self.hub_motors = partes[4] if len(partes) > 4 else ""
+            if self.binario and version >= PROTO_BINARIO and "BIN" in self.hub_caps:
+                self.codec.version = PROTO_BINARIO
+            self.codec.ack = "ACK" in self.hub_caps
+            self.log(f"Hub protocolo v{version}, usando v{self.codec.version} (motores: {self.hub_motors})")
+            self._ready_event.set()
+        elif line.startswith("STAT"):
+            # STAT <iteraciones> <bucle máx. ms> [<leases vencidos>]
+            try:
+                valores = [int(x) for x in line.split()[1:4]]
+                iteraciones, max_ms = valores[:2]
+            except ValueError:
                 return
+            self.hub_stats = (iteraciones, max_ms)
+            if len(valores) > 2:
+                self.lease_fallos = valores[2]
+            self.log(f"Hub: {iteraciones} iteraciones, bucle máx. {max_ms} ms, "
+                     f"leases vencidos {self.lease_fallos}")
+        elif line.startswith("LEASE"):
+            # LEASE <ms> | LEASE VENCIDO <n>
+            partes = line.split()
+            if len(partes) > 2 and partes[1] == "VENCIDO":
+                self.lease_fallos = int(partes[2]) if partes[2].isdigit() else self.lease_fallos + 1
+                self.log(f"El hub paró por lease vencido ({self.lease_fallos})", Registro.AVISO)
+            elif len(partes) > 1 and partes[1].isdigit():
+                self.lease_hub_ms = int(partes[1])
+                self.log(f"Lease del hub: {self.lease_hub_ms} ms" if self.lease_hub_ms
+                         else "Lease del hub desactivado")
+        elif line.startswith("N "):
+            # N <desde> <hasta>: seqs que nunca llegaron al hub (modo rápido)
+            try:
+                desde, hasta = (int(x) for x in line.split()[1:3])
+            except ValueError:
+                return
+            self._on_nack(desde, hasta)
+        elif line.startswith("MODO"):
+            # MODO <0|1>: manual / mantener rumbo
+            self.heading_hold = line.split()[-1] == "1"
+            self.log("Hub manteniendo el rumbo" if self.heading_hold else "Dirección manual")
+        elif line.startswith("TRJ"):
+            # TRJ FIN <n> | TRJ ABORT | TRJ LLENO
+            partes = line.split()
+            resultado = partes[1] if len(partes) > 1 else ""
+            self.log(f"Trayectoria: {' '.join(partes[1:])}",
+                     Registro.INFO if resultado == "FIN" else Registro.AVISO)
+            fut = self._trj_fin
+            if fut is not None and not fut.done():
+                fut.set_result(resultado)
+
+    def _on_ack(self, seq: int, t_ack: float = None):
+        # Ack acumulado: confirma todos los seq pendientes hasta 'seq' (módulo 256).
+        # t_ack: llegada al loop BLE (no cuando lo procesó el hilo lector)
+        if t_ack is None:
+            t_ack = time.perf_counter()
+        self.last_ack = t_ack
+        for s in list(self._pending_ack):
+            if ((seq - s) & 0xFF) >= 128:
+                continue
+            c = self._pending_ack.pop(s)
+            _resolver(c, True)
+            canal = CANALES.get(c.texto[:1])
+            if canal == "latido":
+                continue  # los latidos no cuentan como latencia de comandos
+            if canal:
+                self.confirmado[canal] = c.texto
+            self.latency.registrar(c.seq, c.texto, {
+                "gui": (c.t_cola - c.t_gui) * 1000,
+                "cola": (c.t_salida - c.t_cola) * 1000,
+                "gatt": (c.t_fin_tx - c.t_tx) * 1000,
+                "ack": (t_ack - c.t_fin_tx) * 1000,
+                "total": (t_ack - c.t_gui) * 1000,
+            })
+
+    def _on_nack(self, desde: int, hasta: int):
+        for i in range(((hasta - desde) & 0xFF) + 1):
+            c = self._pending_ack.pop((desde + i) & 0xFF, None)
+            if c is not None:
+                self._perdido(c)
 
-            self.hub = PybricksHubBLE(device)
-            await self.hub.connect()
-            self.log("Conectado. Cargando script...")
+    def _perdido(self, c: Comando):
+        # Reenvía un comando perdido sólo si sigue siendo el último de su canal
+        # y no hay otro más nuevo esperando: lo demás ya está obsoleto
+        self.perdidos_tx += 1
+        canal = CANALES.get(c.texto[:1])
+        if (canal and canal != "latido" and self._ultimo_enviado.get(canal) is c
+                and not self.queue.pendiente(canal) and c.intentos < MAX_REENVIOS):
+            nuevo = Comando(c.texto, t_gui=c.t_gui, fin=c.fin)
+            nuevo.intentos = c.intentos + 1
+            self.reenvios += 1
+            self.log(f"Reenviando '{c.texto}' (seq {c.seq} perdido)", Registro.DEBUG)
+            self.queue.put(nuevo, prioridad=c.texto in ("S", "Z"))
+        else:
+            _resolver(c, False)
 
+    def _ack_timeout(self) -> float:
+        # Plazo para dar un comando por perdido: 2x el p95 del ack medido
+        minimo, inicial, maximo = ACK_TIMEOUT
+        hist = self.latency.hist["ack"]
+        if not hist.n:
+            return inicial
+        return min(maximo, max(minimo, 2 * hist.percentil(95) / 1000))
+
+    async def _vigilar_acks(self):
+        # Ningún comando espera su ack para siempre. En modo rápido cubre lo que el
+        # hub no puede avisar como hueco (p. ej. el último marco de una ráfaga)
+        while True:
+            plazo = self._ack_timeout() if self.rapido else ACK_LIMITE
+            await asyncio.sleep(plazo / 4)
+            limite = time.perf_counter() - plazo
+            for s in [s for s, c in self._pending_ack.items() if c.t_fin_tx < limite]:
+                c = self._pending_ack.pop(s)
+                if self.rapido:
+                    self._perdido(c)
+                else:
+                    _resolver(c, False)
+
+    def start_runner(self) -> asyncio.Task:
+        """Desde el loop del núcleo: arranca el runner (si no corre ya) y devuelve su tarea."""
+        if self._runner_task is None or self._runner_task.done():
+            self._stopping = False
+            self._runner_task = self.loop.create_task(self._runner())
+        return self._runner_task
+
+    def _start_prescan(self):
+        # Busca el hub en segundo plano; el runner reutiliza el resultado
+        if self._prescan_task is None and (self._runner_task is None or self._runner_task.done()):
+            self._prescan_task = self.loop.create_task(self.hub_factory(self.hub_name))
+            # si nadie lo recoge, que un fallo del escaneo no quede como excepción sin leer
+            self._prescan_task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+    async def _resolve_hub(self):
+        tarea, self._prescan_task = self._prescan_task, None
+        if tarea is not None:
+            try:
+                return await tarea
+            except asyncio.TimeoutError:
+                pass  # puede haberse encendido después: se vuelve a buscar
+        return await self.hub_factory(self.hub_name)
+
+    async def _load_program(self):
+        # Carga el LISTENER_SCRIPT en el hub evitando compilar y descargar si ya está
+        hub = self.hub
+        prog_hash, script = preparar_script()
+        self._prog_hash_hub = None
+        self._ready_event.clear()
+
+        if hub._mpy_abi_version:
+            # firmware antiguo (perfil < 1.2.0): no admite arrancar un programa guardado
+            await self._run_from_source(script)
+            await self._expect_ready(prog_hash)
+            return
+
+        abi = 6
+        if hub._capability_flags & CAP_MPY6_1_NATIVE:
+            abi = (6, 1)
+        clave = Cache.clave_programa(prog_hash, hub.fw_version, abi)
+
+        # Ruta rápida: el hub ya tiene este programa -> sólo arrancarlo
+        if Cache.programa_en_hub(self.hub_id) == clave:
+            self.log("Programa ya presente en el hub, arrancando...")
+            await hub.start_user_program()
+            if await self._wait_ready(prog_hash, 2.0):
+                return
+            self.log("El programa del hub no coincide, recargando...")
+            try:
+                await hub.stop_user_program()
+            except Exception:
+                pass
+            Cache.registrar_programa_en_hub(self.hub_id, None)
+            self._prog_hash_hub = None
+            self._ready_event.clear()
+
+        mpy = Cache.programa_cacheado(clave)
+        if mpy is None:
+            self.log("Compilando script...")
+            mpy = await self._compile(script, abi)
+            Cache.guardar_programa(clave, mpy)
+        else:
+            self.log("Usando script compilado en caché.")
+
+        await hub.download_user_program(mpy)
+        Cache.registrar_programa_en_hub(self.hub_id, clave)
+        await hub.start_user_program()
+        await self._expect_ready(prog_hash)
+
+    async def _compile(self, script: str, abi) -> bytes:
+        compilar = getattr(self.hub, "compilar", None)
+        if compilar is not None:
+            return await compilar(script, abi)  # HubSimulado: ejecuta el fuente, sin mpy-cross
+        from pybricksdev.compile import compile_multi_file  # type: ignore
+
+        temp_path = None
+        try:
             with tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False, encoding='utf-8') as tf:
-                tf.write(LISTENER_SCRIPT)
+                tf.write(script)
                 tf.flush()
                 temp_path = tf.name
-
             # Log the temp script path and check existence to help diagnose WinError 2
-            self.log(f"Temp script path: {temp_path} (exists: {os.path.exists(temp_path)})")
+            self.log(f"Temp script path: {temp_path} (exists: {os.path.exists(temp_path)})", Registro.DEBUG)
+            return await compile_multi_file(temp_path, abi)
+        finally:
+            if temp_path:
+                try: os.unlink(temp_path)
+                except: pass
+
+    async def _run_from_source(self, script: str):
+        temp_path = None
+        try:
+            with tempfile.NamedTemporaryFile(mode='w', suffix='.py', delete=False, encoding='utf-8') as tf:
+                tf.write(script)
+                tf.flush()
+                temp_path = tf.name
+            await self.hub.run(temp_path, wait=False, print_output=False, line_handler=False)
+        finally:
+            if temp_path:
+                try: os.unlink(temp_path)
+                except: pass
+
+    async def _wait_ready(self, prog_hash: str, timeout: float) -> bool:
+        # Espera el READY del hub (motores inicializados y escuchando stdin)
+        try:
+            await asyncio.wait_for(self._ready_event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return self._prog_hash_hub == prog_hash
+
+    async def _expect_ready(self, prog_hash: str):
+        if not await self._wait_ready(prog_hash, READY_TIMEOUT):
+            raise RuntimeError("El hub no respondió READY a tiempo")
+
+    async def _runner(self):
+        # Supervisor: una sesión tras otra. Si el enlace cae con el hub ya listo se
+        # reconecta con backoff en este mismo loop, sin intervención del usuario.
+        intento = 0
+        reconectando = False
+        try:
+            while True:
+                self._link_lost = False
+                self._session_ok = False
+                self._session_task = self.loop.create_task(self._session(reconectando))
+                try:
+                    await self._session_task
+                except asyncio.CancelledError:
+                    if self._stopping or not self._link_lost:
+                        raise
+                if self._stopping or not (self._session_ok or reconectando):
+                    break
+                if self._session_ok:
+                    intento = 0
+                reconectando = True
+                self.reconexiones += 1
+                espera = RECONEXION_BACKOFF[min(intento, len(RECONEXION_BACKOFF) - 1)]
+                intento += 1
+                self._set_state("reconectando")
+                self.log(f"Enlace perdido, reconectando en {espera:g} s (intento {intento})...",
+                         Registro.AVISO)
+                await asyncio.sleep(espera)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            task = self._session_task
+            if task and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except BaseException:
+                    pass
+            self._drop_pending()
+            self.running.clear()
+            self._set_state("desconectado")
+            self.log("Sistema cerrado.")
+
+    async def _session(self, restaurar: bool):
+        # Una conexión completa: buscar, conectar, cargar el programa y enviar comandos
+        conn_sub = None
+        try:
+            self.hub = None
+            self._set_state("buscando")
+            self.log(f"Buscando hub '{self.hub_name}'...")
+            try:
+                self.hub_id, self.hub = await self._resolve_hub()
+                self._set_state("conectando")
+                try:
+                    # a la dirección en caché: plazo corto, el escaneo es el plan B
+                    await asyncio.wait_for(self.hub.connect(),
+                                           DIRECTO_TIMEOUT if getattr(self.hub, "directo", False) else None)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    # dirección en caché o escaneo previo obsoletos: escanear de nuevo
+                    self.log(f"Conexión directa fallida ({e or type(e).__name__}), escaneando...",
+                             Registro.AVISO)
+                    Cache.olvidar_dispositivo(self.hub_name)
+                    self._set_state("buscando")
+                    self.hub_id, self.hub = await self.hub_factory(self.hub_name)
+                    self._set_state("conectando")
+                    await self.hub.connect()
+            except asyncio.TimeoutError:
+                self.hub = None
+                self.log("No se encontró hub.", Registro.ERROR)
+                return
+            if getattr(self.hub, "nombre_cache", None):
+                # también por la ruta directa: 'visto' es la última conexión buena
+                Cache.guardar_dispositivo(self.hub.nombre_cache, self.hub_id)
+
+            self.transporte = transporte_de(self.hub)
+            self.write_lat.reset()
+            self.codec.reset()
+            self._start_parser()
+            self._rx.put(None)
+            self.telemetry.clear()
+            self._drop_pending()
+            self.confirmado.clear()
+            self.heading_hold = False
+            self.rapido = False
+            self._ultimo_enviado.clear()
+            self._stdout_sub = self.hub.stdout_observable.subscribe(self._on_stdout)
+            conn_sub = self.hub.connection_state_observable.subscribe(self._on_connection_state)
+            self.log(f"Conectado por {self.transporte.upper()}. Cargando script...")
+            self._set_state("cargando")
+
+            await self._load_program()
+
+            if self.sin_respuesta:
+                self.rapido = (admite_sin_respuesta(self.hub) and self.codec.ack and "NACK" in self.hub_caps
+                               and self.codec.version == PROTO_BINARIO)
+                if self.rapido:
+                    self.log("Modo rápido: writes sin respuesta con reenvío de perdidos")
+                else:
+                    self.log("Modo rápido no disponible con este hub o transporte", Registro.AVISO)
+            if self.codec.ack:
+                self._vigilancia_task = self.loop.create_task(self._vigilar_acks())
 
-            await self.hub.run(temp_path, wait=False, print_output=True)
-            await asyncio.sleep(2) 
-            
             self.running.set()
+            self._session_ok = True
+            if self.telemetry_ms and "TEL" in self.hub_caps:
+                self.queue.put(Comando(f"T{self.telemetry_ms}"))
+            self.lease_hub_ms = 0
+            if "LEASE" in self.hub_caps:
+                self.queue.put(Comando(f"E{self.lease_ms}"))
+                self._heartbeat_task = self.loop.create_task(self._heartbeat())
+            if "PROP" in self.hub_caps:
+                for texto in self._rampas():
+                    self.queue.put(Comando(texto))
+            if restaurar:
+                # tras una caída: volver a la última tracción y dirección pedidas
+                for texto in self._control_state.values():
+                    self.queue.put(Comando(texto))
+                self.log("Reconectado, estado restaurado.")
+            self._set_state("listo")
             self.log("¡Listo para conducir!")
 
             while True:
-                cmd_raw = await self.queue.get() 
-                
+                cmd = await self.queue.get()
+
                 if self.hub and self.running.is_set():
-                    packet = f"{cmd_raw};" 
-                    payload = packet.encode('utf-8')
-                    
-                    try:
-                        await self.hub.write(payload)
-                    except Exception as e:
-                        self.log(f"Error TX: {e}")
+                    await self._write_batch(cmd)
 
         except asyncio.CancelledError:
-            pass
+            raise
         except Exception as e:
         
             tb = traceback.format_exc()
-            self.log(f"Error fatal: {e} ({type(e).__name__})\n{tb}")
+            self.log(f"Error fatal: {e} ({type(e).__name__})", Registro.ERROR)
+            self.log(tb, Registro.DEBUG)
         finally:
-            if temp_path:
-                try: os.unlink(temp_path)
-                except: pass
+            for tarea in (self._heartbeat_task, self._vigilancia_task):
+                if tarea:
+                    tarea.cancel()
+            self._heartbeat_task = None
+            self._vigilancia_task = None
+            # sin avisos de desconexión propios: la sesión ya está cerrando
+            if conn_sub:
+                conn_sub.dispose()
+            if self._stdout_sub:
+                self._stdout_sub.dispose()
+                self._stdout_sub = None
             if self.hub:
                 try:
-                    await self.hub.write(b'S;') 
-                    await self.hub.disconnect()
+                    if not self._link_lost:
+                        await self.hub.write(b'S;') 
+                    await asyncio.wait_for(self.hub.disconnect(), 2.0)
                 except: pass
-            self.running.clear()
-            self.log("Sistema cerrado.")
 
-    def start(self):
-        if not self.thread.is_alive():
+    def _heartbeat_period(self) -> float:
+        if self.heartbeat_ms:
+            return self.heartbeat_ms / 1000
+        return self.lease_ms / LATIDOS_POR_LEASE / 1000
+
+    async def _heartbeat(self):
+        # Latido sólo cuando el enlace está callado: cualquier comando ya renueva el lease
+        while True:
+            periodo = self._heartbeat_period()
+            if not self.lease_ms or periodo <= 0:
+                await asyncio.sleep(0.5)
+                continue
+            espera = self._last_tx + periodo - time.perf_counter()
+            if espera > 0:
+                await asyncio.sleep(espera)
+                continue
+            self.heartbeats += 1
+            self._last_tx = time.perf_counter()  # no volver a encolar hasta que salga
+            self.queue.put(Comando("H"))
+            await asyncio.sleep(periodo)
+
+    def _on_connection_state(self, state):
+        # ConnectionState de pybricksdev (o su nombre en el simulador)
+        if getattr(state, "name", state) == "DISCONNECTED":
+            self.loop.call_soon_threadsafe(self._on_link_lost)
+
+    def _on_link_lost(self):
+        task = self._session_task
+        if task is None or task.done() or self._link_lost or self._stopping:
+            return
+        self._link_lost = True
+        self._drop_pending()
+        task.cancel()
+
+    def _drop_pending(self):
+        for c in self._pending_ack.values():
+            _resolver(c, False)
+        self._pending_ack.clear()
+
+    def _encode(self, cmd: Comando) -> bytes:
+        data = self.codec.codificar(cmd.texto)
+        cmd.seq = self.codec.seq if self.codec.ack else -1
+        return data
+
+    async def _write(self, cmd: Comando):
+        try:
+            await self._write_payload(self._encode(cmd), [cmd])
+        except ValueError as e:
+            _resolver(cmd, False)
+            self.invalidos += 1
+            self.log(f"Comando inválido '{cmd.texto}': {e}", Registro.AVISO)
+
+    def _max_payload(self) -> int:
+        # PybricksHubBLE.write añade 1 byte de cabecera al paquete
+        return getattr(self.hub, "_max_write_size", 20) - 1
+
+    async def _write_batch(self, first: Comando):
+        # Empaqueta en un solo write todos los comandos que quepan
+        limite = self._max_payload()
+        presupuesto = self.batch_budget_ms / 1000
+        lote = bytearray()
+        cmds = []
+        t_limite = self.loop.time() + presupuesto
+        cmd = first
+        while cmd is not None:
+            try:
+                data = self._encode(cmd)
+            except ValueError as e:
+                _resolver(cmd, False)
+                self.invalidos += 1
+                self.log(f"Comando inválido '{cmd.texto}': {e}", Registro.AVISO)
+                data = b""
+            if lote and len(lote) + len(data) > limite:
+                await self._write_payload(lote, cmds)
+                lote = bytearray()
+                cmds = []
+                t_limite = self.loop.time() + presupuesto
+            if data:
+                lote += data
+                cmds.append(cmd)
+
+            cmd = self.queue.get_nowait()
+            if cmd is None and presupuesto > 0 and len(lote) < limite:
+                restante = t_limite - self.loop.time()
+                if restante > 0:
+                    try:
+                        cmd = await asyncio.wait_for(self.queue.get(), restante)
+                    except asyncio.TimeoutError:
+                        cmd = None
+        if lote:
+            await self._write_payload(lote, cmds)
+
+    async def _write_payload(self, payload: bytes, cmds: list):
+        # Sin respuesta sólo si todo el lote es de canal (se puede reenviar el
+        # último); los comandos FIFO (trayectorias, Q...) siempre con respuesta
+        rapido = self.rapido and all(CANALES.get(c.texto[:1]) for c in cmds)
+        t_tx = time.perf_counter()
+        try:
+            if rapido:
+                await self.hub.write_gatt_char(PYBRICKS_COMMAND_EVENT_UUID,
+                                               bytes([CMD_WRITE_STDIN]) + bytes(payload), False)
+            else:
+                await self.hub.write(bytes(payload))
+        except Exception as e:
+            self.tx_errors += 1
+            self.log(f"Error TX: {e}", Registro.ERROR)
+            for c in cmds:
+                _resolver(c, False)
+            return
+        t_fin = time.perf_counter()
+        self.write_lat.registrar((t_fin - t_tx) * 1000)
+        self._last_tx = t_fin
+        self.writes += 1
+        self.cmds_sent += len(cmds)
+        self.bytes_tx += len(payload)
+        for c in cmds:
+            c.t_tx = t_tx
+            c.t_fin_tx = t_fin
+            if self.rapido:
+                canal = CANALES.get(c.texto[:1])
+                if canal:
+                    self._ultimo_enviado[canal] = c
+            if c.seq >= 0:
+                # el seq de 8 bits dio la vuelta sin ack del anterior: ya no llegará
+                previo = self._pending_ack.pop(c.seq, None)
+                if previo is not None:
+                    _resolver(previo, False)
+                self._pending_ack[c.seq] = c
+            else:
+                _resolver(c, True)
+                canal = CANALES.get(c.texto[:1])
+                if canal:
+                    self.confirmado[canal] = c.texto
+
+    async def shutdown(self):
+        """Desde el loop del núcleo: desconecta (S; al hub); start_runner() vuelve a conectar."""
+        # Primero salen los comandos urgentes (S/Z de emergencia) que sigan en cola
+        if self.hub and self.running.is_set():
+            while True:
+                cmd = self.queue.pop_prioridad()
+                if cmd is None:
+                    break
+                try:
+                    await asyncio.wait_for(self._write(cmd), 1.0)
+                except asyncio.TimeoutError:
+                    break
+        # Luego se cancela el runner y se espera su cierre (S; + desconexión)
+        self._stopping = True
+        if self._prescan_task:
+            self._prescan_task.cancel()
+            self._prescan_task = None
+        task = self._runner_task
+        if task and not task.done():
+            task.cancel()
+            try:
+                await asyncio.wait_for(task, 3.0)
+            except (asyncio.CancelledError, asyncio.TimeoutError):
+                pass
+        self.queue.clear()
+        self._control_state.clear()
+
+    def close_reader(self):
+        # Fin del hilo lector de la salida del hub (cierre definitivo)
+        self._rx.put(False)
+
+    def set_telemetry_rate(self, ms: int):
+        # Periodo de telemetría pedido al hub (0 = apagada); el hub lo alarga solo
+        # mientras entran comandos
+        self.telemetry_ms = ms
+        self.send_packet(f"T{ms}")
+
+    def set_lease(self, lease_ms: int, heartbeat_ms: int = None):
+        # Más plazo = menos latidos en el aire, pero el hub tarda más en parar
+        self.lease_ms = lease_ms
+        self.heartbeat_ms = heartbeat_ms
+        if "LEASE" in self.hub_caps:
+            self.send_packet(f"E{lease_ms}")
+
+    def _rampas(self):
+        return [f"{op}{v}" for op, v in (("I", self.acel_max), ("J", self.giro_max)) if v]
+
+    def set_slew_limits(self, acel_max: int = 0, giro_max: int = 0):
+        """Rampas del hub para las consignas proporcionales (U/W): aceleración
+        máxima en °/s² y giro máximo de la dirección en °/s (0 = sin límite)."""
+        self.acel_max = acel_max
+        self.giro_max = giro_max
+        if "PROP" in self.hub_caps:
+            self.send_packet(f"I{acel_max}")
+            self.send_packet(f"J{giro_max}")
+
+    def hold_heading(self, rumbo: int = None):
+        """El hub mantiene el rumbo (el actual, o 'rumbo' en grados de su IMU) y
+        corrige la dirección él solo; la tracción sigue con F/B/S."""
+        if "HDG" not in self.hub_caps:
+            self.log("El hub no admite mantener el rumbo", Registro.AVISO)
+            return
+        self.send_packet("M1" if rumbo is None else f"A{int(rumbo)}")
+
+    def release_heading(self):
+        self.send_packet("M0")
+
+    def request_stats(self):
+        # Pide al hub sus contadores del bucle de escucha (respuesta "STAT")
+        self.send_packet("Q")
+
+    def queue_stats(self) -> dict:
+        return self.queue.stats()
+
+    def estado_confirmado(self, canal: str):
+        return self.confirmado.get(canal)
+
+    def transport_summary(self) -> str:
+        """Transporte activo y duración de sus writes, p. ej. "USB · write p50/p95 0.4/0.9 ms"."""
+        if not self.transporte:
+            return ""
+        if not self.write_lat.n:
+            return self.transporte.upper()
+        return (f"{self.transporte.upper()} · write p50/p95 "
+                f"{self.write_lat.percentil(50):.1f}/{self.write_lat.percentil(95):.1f} ms")
+
+    def latency_summary(self) -> str:
+        return " | ".join(t for t in (self.transport_summary(), self.latency.resumen()) if t)
+
+    def dump_latency_csv(self, path: str):
+        self.latency.dump_csv(path)
+
+    def start_recording(self, path: str):
+        self.stop_recording()
+        self.recorder = Grabador.Grabador(path)
+        self.log(f"Grabando comandos en {path}")
+        return self.recorder
+
+    def stop_recording(self):
+        recorder, self.recorder = self.recorder, None
+        if recorder:
+            recorder.cerrar()
+            omitidos = f" ({recorder.omitidos} omitidos por largos)" if recorder.omitidos else ""
+            self.log(f"Grabación cerrada: {recorder.registros} comandos{omitidos}")
+
+    async def reproducir(self, path: str, velocidad: float = 1.0) -> int:
+        """Reproduce una grabación; devuelve los comandos enviados."""
+        with Grabador.Grabacion(path) as grabacion:
+            self.log(f"Reproduciendo {len(grabacion)} comandos ({grabacion.duracion():.1f} s) x{velocidad:g}")
+            return await Grabador.reproducir(
+                lambda texto, prioridad: self._enqueue(Comando(texto), prioridad),
+                grabacion, velocidad)
+
+    def cancel_trajectory(self):
+        self.send_packet("C", prioridad=True)
+
+    async def upload_trajectory(self, trayectoria, ejecutar: bool = True) -> str:
+        """Sube una Trayectoria al hub por el carril FIFO y la ejecuta allí.
+
+        Devuelve el resultado del hub: "FIN", "ABORT" (la interrumpió un
+        comando en vivo) o "LLENO"; "CARGADA" si ejecutar=False.
+        """
+        if not self.running.is_set() or "TRJ" not in self.hub_caps:
+            raise RuntimeError("el hub no admite trayectorias (o no está conectado)")
+        anterior = self._trj_fin
+        if anterior is not None and not anterior.done():
+            anterior.set_result("ABORT")  # la C de la nueva la cancela en el hub
+        self._trj_fin = fin = self.loop.create_future()
+        for texto in trayectoria.comandos(ejecutar):
+            # se sube en streaming: sin desbordar la FIFO (los comandos no se pierden)
+            while not self.queue.fifo_libre():
+                await asyncio.sleep(0.005)
+            self.queue.put(Comando(texto))
+        if not ejecutar:
+            return "CARGADA"
+        return await fin
+
+    def send_packet(self, text_cmd: str, prioridad: bool = False, fin=None):
+        # prioridad=True: carril urgente (parada), se adelanta a lo pendiente
+        self._enqueue(self._nuevo_comando(text_cmd, prioridad, fin), prioridad)
+
+    def _nuevo_comando(self, text_cmd: str, prioridad: bool, fin=None) -> Comando:
+        # la marca de tiempo se toma aquí, en el hilo que genera el comando
+        cmd = Comando(text_cmd, fin=fin)
+        recorder = self.recorder
+        if recorder:
+            recorder.registrar(text_cmd, prioridad, cmd.t_gui)
+        return cmd
+
+    def _enqueue(self, cmd: Comando, prioridad: bool):
+        canal = CANALES.get(cmd.texto[:1])
+        if canal in CANALES_ESTADO:
+            self._control_state[canal] = cmd.texto
+            if cmd.texto[:1] in ("L", "R", "W"):
+                self._control_state.pop("rumbo", None)  # en el hub, L/R/W anulan el rumbo
+        self.queue.put(cmd, prioridad)
+
+
+class BLEWorker(NucleoHub):
+    """NucleoHub con su propio hilo para código síncrono (GUI, benchmark).
+
+    Sólo añade el hilo del loop y los saltos call_soon_threadsafe; la lógica
+    del enlace es la del núcleo.
+    """
+
+    def __init__(self, log_queue: Queue, *args, loop=None, **opciones):
+        # loop=None: el worker tiene su propio hilo y loop. Con un loop externo
+        # (modo flota) varios workers comparten hilo y loop.
+        self._own_loop = loop is None
+        super().__init__(log_queue, *args, loop=loop or asyncio.new_event_loop(), **opciones)
+        self.thread = threading.Thread(target=self._thread_main, daemon=True) if self._own_loop else None
+
+    def _thread_main(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    async def _close(self):
+        await self.shutdown()
+        self.close_reader()
+        for t in asyncio.all_tasks(self.loop):
+            if t is not asyncio.current_task():
+                t.cancel()
+
+    def _ensure_thread(self):
+        if self._own_loop and not self.thread.is_alive():
             self.thread.start()
 
+    def start(self):
+        self._ensure_thread()
+        self.loop.call_soon_threadsafe(self.start_runner)
+
+    def prescan(self):
+        # Escaneo anticipado (p. ej. mientras arranca la GUI) para que Conectar no espere
+        self._ensure_thread()
+        self.loop.call_soon_threadsafe(self._start_prescan)
+
     def stop(self):
+        # Desconecta; el worker se puede volver a arrancar con start()
         if self.loop.is_running():
-            for task in asyncio.all_tasks(self.loop):
-                task.cancel()
+            asyncio.run_coroutine_threadsafe(self.shutdown(), self.loop)
+
+    def close(self, timeout: float = 5.0):
+        # Cierre definitivo al salir de la aplicación (detiene el hilo si es propio)
+        if not self.loop.is_running():
+            return
+        fut = asyncio.run_coroutine_threadsafe(
+            self._close() if self._own_loop else self.shutdown(), self.loop)
+        try:
+            fut.result(timeout)
+        except Exception:
+            pass
+        if self._own_loop:
+            # fuera de _close(): parado desde dentro, su resultado no llegaría a fut
             self.loop.call_soon_threadsafe(self.loop.stop)
 
-    def send_packet(self, text_cmd: str):
-        if self.loop.is_running():
-            self.loop.call_soon_threadsafe(self.queue.put_nowait, text_cmd)
\ No newline at end of file
+    def replay(self, path: str, velocidad: float = 1.0):
+        """Reproduce una grabación en el loop del worker; devuelve un Future con los comandos enviados."""
+        return asyncio.run_coroutine_threadsafe(self.reproducir(path, velocidad), self.loop)
+
+    def send_trajectory(self, trayectoria, ejecutar: bool = True):
+        """upload_trajectory desde otro hilo: devuelve un concurrent.futures.Future."""
+        return asyncio.run_coroutine_threadsafe(self.upload_trajectory(trayectoria, ejecutar), self.loop)
+
+    def send_packet(self, text_cmd: str, prioridad: bool = False, fin=None):
+        if self._en_loop():
+            super().send_packet(text_cmd, prioridad, fin)  # ya en el loop (flota, gateway): sin salto de hilo
+        elif self.loop.is_running():
+            cmd = self._nuevo_comando(text_cmd, prioridad, fin)
+            self.loop.call_soon_threadsafe(self._enqueue, cmd, prioridad)
+
+    def _en_loop(self) -> bool:
+        try:
+            return asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            return False
@@ -4,14 +4,83 @@
 # "servidor" porque recibe (por stdin vía BLE) los comandos del cliente y
 # controla los motores.
 
+import hashlib
+
 LISTENER_SCRIPT = """
 # Servidor en el Hub: escucha stdin (BLE) y acciona motores
 from pybricks.hubs import PrimeHub
 from pybricks.pupdevices import Motor
 from pybricks.parameters import Port, Color
-from pybricks.tools import wait
+from pybricks.tools import wait, StopWatch
 import usys as sys
 import uselect
+import ustruct
+
+# -- PROTOCOLO --
+# v1 texto:   "F500;"
+# v2 binario: [0xA5][opcode][valor int16 LE][seq][checksum] (6 bytes)
+# Ambos formatos se aceptan a la vez; el PC elige según la línea READY.
+# Ack: se confirma el último seq ejecutado con "K<seq>" (acumulado, como mucho
+# cada ACK_MS mientras entran datos; en texto el seq va tras '@': "F500@12;").
+# Con writes sin respuesta se pueden perder marcos: un salto en el seq binario
+# se avisa con "N <desde> <hasta>" y el PC reenvía lo que siga vigente.
+PROTO_VERSION = 2
+CAPS = "BIN,STAT,TEL,ACK,TRJ,LEASE,HDG,NACK,PROP" # capacidades anunciadas en READY
+PROG_HASH = "__PROG_HASH__" # lo sustituye preparar_script() en el PC
+MARCO_INICIO = 0xA5
+MARCO_LEN = 6
+ACK_MS = 10
+
+# -- INGESTA --
+RING_LEN = 256            # potencia de 2 (máscara en vez de módulo)
+RING_MASK = RING_LEN - 1
+IDLE_MS = 5               # espera sólo cuando stdin está vacío
+
+# -- TELEMETRÍA (hub -> PC) --
+# Línea "~<base64>\\n" con un registro empaquetado de 39 bytes:
+# seq, flags, t_ms, bateria_mv, ángulo A/E/C, velocidad A/E/C, carga A/E/C,
+# rumbo, pitch, roll, bucle máx. (ms, desde el registro anterior) y bytes
+# esperando en el anillo de entrada. Los ángulos de motor son acumulados
+# (int32: a int16 desbordarían en ~33 s a F1000); el rumbo va en ±180 (el de
+# la IMU es acumulado y desbordaría tras ~91 vueltas). Base64 porque stdout
+# pasa por el decodificador de líneas.
+TEL_FMT = "<BBHHiiihhhhhhhhhHB"
+TEL_LEN = 39
+TEL_MIN_MS = 20           # periodo mínimo aceptado
+TEL_FACTOR_MAX = 8        # con comandos entrando, el periodo se alarga hasta x8
+B64 = b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/"
+
+# -- TRAYECTORIA (segmentos temporizados con el reloj del hub) --
+# V<vel> G<ángulo> D<ms> fijan el próximo segmento, P<rampa> lo añade,
+# X lo ejecuta y C lo cancela. Al acabar: "TRJ FIN <n>"; si un comando de
+# tracción en vivo la interrumpe: "TRJ ABORT".
+TRJ_MAX = 32
+
+# -- LEASE (hombre muerto) --
+# E<ms> fija el plazo (0 = sin lease) y el hub responde "LEASE <ms>". Cada
+# comando válido (o el latido H) lo renueva; si vence, se para la tracción y
+# se centra la dirección ("LEASE VENCIDO <n>").
+LEASE_MIN_MS = 50
+
+# -- MANTENER RUMBO (lazo cerrado en el hub) --
+# M1 mantiene el rumbo actual, A<grados> fija el rumbo a mantener y M0 vuelve a
+# manual (también L/R: el piloto toma la dirección). Cada HH_MS se lee el rumbo
+# de la IMU (crece hacia la derecha) y se corrige la dirección (motor C) con un
+# PID; la velocidad la siguen los propios motores A/E con sus encoders (run).
+# El hub responde "MODO <0|1>" al cambiar de modo.
+HH_MS = 10
+HH_KP = 2.0               # grados de dirección por grado de error
+HH_KI = 1.0               # grados de dirección por grado·s de error acumulado
+HH_KD = 0.15              # grados de dirección por °/s de giro
+DIR_MAX = 30              # tope mecánico de la dirección (como L/R)
+
+# -- CONSIGNAS PROPORCIONALES --
+# U<°/s con signo> fija la velocidad y W<grados> el ángulo de la dirección
+# (-DIR_MAX..DIR_MAX). El hub se acerca a ellas cada CONS_MS sin pasar de
+# I<°/s²> de aceleración ni de J<°/s> de giro de la dirección (0 = sin límite).
+# F/B/S y L/R/Z siguen siendo inmediatos y anulan la consigna de su canal;
+# S nunca pasa por la rampa.
+CONS_MS = 10
 
 # -- CONFIGURACIÓN --
 hub = PrimeHub()
@@ -37,62 +106,577 @@ try:
 except Exception: pass
 
 
+# --- TRACCIÓN (común a comandos en vivo y trayectorias) ---
+def mover(speed):
+    global vel_actual
+    vel_actual = speed
+    if motor_der: motor_der.run(speed)
+    if motor_izq: motor_izq.run(-speed)
+
+
+def parar():
+    global vel_actual
+    vel_actual = 0
+    if motor_der: motor_der.stop()
+    if motor_izq: motor_izq.stop()
+
+
+def activar_rumbo(objetivo):
+    # objetivo None: el rumbo actual
+    global hh_modo, hh_obj, hh_ultimo, hh_previo, hh_dir, hh_int
+    try:
+        rumbo = hub.imu.heading()
+    except Exception:
+        rumbo = None
+    if not motor_dir or rumbo is None:
+        print("MODO 0")
+        return
+    hh_obj = rumbo if objetivo is None else objetivo
+    hh_ultimo = reloj.time()
+    hh_previo = rumbo
+    hh_dir = DIR_MAX + 1  # fuerza el primer run_target
+    hh_int = 0
+    if not hh_modo:
+        hh_modo = 1
+        print("MODO 1")
+
+
+def desactivar_rumbo():
+    global hh_modo
+    if hh_modo:
+        hh_modo = 0
+        print("MODO 0")
+
+
+def controlar_rumbo(ahora):
+    global hh_ultimo, hh_previo, hh_dir, hh_int
+    dt = ahora - hh_ultimo
+    if dt < HH_MS:
+        return
+    try:
+        rumbo = hub.imu.heading()
+    except Exception:
+        return
+    error = (hh_obj - rumbo + 180) % 360 - 180
+    giro_s = (rumbo - hh_previo) * 1000 / dt
+    hh_ultimo = ahora
+    hh_previo = rumbo
+    if vel_actual == 0:
+        return # parado la dirección no corrige nada
+    # integral acotada a lo que la dirección puede aportar (sin windup)
+    hh_int = max(-DIR_MAX, min(DIR_MAX, hh_int + HH_KI * error * dt / 1000))
+    giro = HH_KP * error + hh_int - HH_KD * giro_s
+    if vel_actual < 0:
+        giro = -giro # marcha atrás: la dirección actúa al revés
+    giro = int(max(-DIR_MAX, min(DIR_MAX, giro)))
+    if giro != hh_dir:
+        hh_dir = giro
+        try:
+            motor_dir.run_target(800, giro, wait=False)
+        except Exception:
+            pass
+
+
+def abortar_trayectoria():
+    # Sólo corta la que está en marcha: lo cargado y sin arrancar (V/G/D/P
+    # antes de X) sobrevive a S/F/B/U; para vaciarlo está C
+    global tr_i, tr_n
+    if tr_i >= 0:
+        print("TRJ ABORT")
+        tr_i = -1
+        tr_n = 0
+
+
+# --- EJECUCIÓN DE COMANDOS (común a texto y binario) ---
+def ejecutar(action, valor):
+    # action: código ASCII (F, B, S, L, R, Z...); valor: entero ya decodificado
+    global max_loop, tel_periodo, seg_vel, seg_dir, seg_ms, tr_n, lease_ms
+    global cons_vel_on, cons_vel, rampa_vel, cons_dir_on, cons_dir, rampa_dir, lim_acel, lim_dir
+
+    # --- LÓGICA DE TRACCIÓN (F=Forward, B=Back, S=Stop) ---
+    if action == 83: # 'S'
+        abortar_trayectoria()
+        cons_vel_on = False
+        parar()
+        hub.light.on(Color.GREEN)
+
+    elif action == 70 or action == 66: # 'F' / 'B'
+        abortar_trayectoria()
+        cons_vel_on = False
+        speed = valor
+        if action == 66:
+            speed = -speed
+
+        mover(speed)
+        hub.light.on(Color.BLUE)
+
+    # --- DIAGNÓSTICO (Q) ---
+    elif action == 81: # 'Q' -> iteraciones, tiempo máx. de bucle y leases vencidos
+        print("STAT", iteraciones, max_loop, lease_fallos)
+        max_loop = 0
+
+    # --- LEASE (E<ms>) y latido (H: sólo renueva) ---
+    elif action == 69: # 'E'
+        lease_ms = 0 if valor <= 0 else max(LEASE_MIN_MS, valor)
+        print("LEASE", lease_ms)
+    elif action == 72: # 'H'
+        pass
+
+    # --- TELEMETRÍA (T<ms>, 0 = apagada) ---
+    elif action == 84: # 'T'
+        tel_periodo = 0 if valor <= 0 else max(TEL_MIN_MS, valor)
+
+    # --- TRAYECTORIA (V/G/D/P/X/C) ---
+    elif action == 86: # 'V' velocidad del próximo segmento
+        seg_vel = valor
+    elif action == 71: # 'G' dirección del próximo segmento
+        seg_dir = valor
+    elif action == 68: # 'D' duración del próximo segmento (ms)
+        seg_ms = valor if valor > 0 else 0
+    elif action == 80: # 'P' añadir segmento (valor 1 = rampa desde la velocidad previa)
+        if tr_n < TRJ_MAX:
+            tr_vel[tr_n] = seg_vel
+            tr_dir[tr_n] = seg_dir
+            tr_ms[tr_n] = seg_ms
+            tr_rampa[tr_n] = valor & 1
+            tr_n += 1
+        else:
+            print("TRJ LLENO")
+    elif action == 88: # 'X' ejecutar lo cargado
+        if tr_n and tr_i < 0:
+            cons_vel_on = False
+            cons_dir_on = False
+            iniciar_segmento(0, reloj.time())
+            hub.light.on(Color.CYAN)
+    elif action == 67: # 'C' cancelar y vaciar
+        if tr_i >= 0:
+            parar()
+        abortar_trayectoria()
+        tr_n = 0
+
+    # --- CONSIGNAS PROPORCIONALES (U/W) y sus límites (I/J) ---
+    elif action == 85: # 'U' velocidad con signo
+        abortar_trayectoria()
+        if not cons_vel_on:
+            rampa_vel = vel_actual
+        cons_vel = max(-1000, min(1000, valor))
+        cons_vel_on = True
+        hub.light.on(Color.BLUE)
+    elif action == 87: # 'W' ángulo de dirección
+        desactivar_rumbo() # como L/R: el piloto toma la dirección
+        if motor_dir:
+            if not cons_dir_on:
+                try:
+                    rampa_dir = motor_dir.angle()
+                except Exception:
+                    rampa_dir = 0
+            cons_dir = max(-DIR_MAX, min(DIR_MAX, valor))
+            cons_dir_on = True
+    elif action == 73: # 'I' aceleración máxima (°/s²)
+        lim_acel = valor if valor > 0 else 0
+    elif action == 74: # 'J' giro máximo de la dirección (°/s)
+        lim_dir = valor if valor > 0 else 0
+
+    # --- MANTENER RUMBO (M<0|1>, A<grados>) ---
+    elif action == 77: # 'M'
+        cons_dir_on = False
+        if valor:
+            activar_rumbo(None)
+        else:
+            desactivar_rumbo()
+    elif action == 65: # 'A'
+        cons_dir_on = False
+        activar_rumbo(valor)
+
+    # --- LÓGICA DE DIRECCIÓN (Puerto C) ---
+    elif action == 76 or action == 82 or action == 90: # 'L' / 'R' / 'Z'
+        cons_dir_on = False
+        if hh_modo:
+            if action == 90:
+                return # centrada = seguir el rumbo
+            desactivar_rumbo() # L/R: el piloto toma la dirección
+        if motor_dir:
+            try:
+                if action == 76:
+                    motor_dir.run_target(800, -30, wait=False)
+                elif action == 82:
+                    motor_dir.run_target(800, 30, wait=False)
+                else:
+                    motor_dir.run_target(800, 0, wait=False)
+            except Exception:
+                pass
+
+
+def acercar(actual, objetivo, paso):
+    # Un paso hacia el objetivo sin pasarse (paso <= 0: llegar de golpe)
+    if paso <= 0 or abs(objetivo - actual) <= paso:
+        return objetivo
+    return actual + paso if objetivo > actual else actual - paso
+
+
+def seguir_consignas(ahora):
+    global cons_ultimo, cons_vel_on, rampa_vel, cons_dir_on, rampa_dir, cons_dir_act
+    dt = ahora - cons_ultimo
+    if dt < CONS_MS:
+        return
+    cons_ultimo = ahora
+    if dt > 100:
+        dt = CONS_MS # tras un rato sin consignas no se salta la rampa
+    if cons_vel_on:
+        rampa_vel = acercar(rampa_vel, cons_vel, lim_acel * dt / 1000)
+        if rampa_vel == cons_vel:
+            cons_vel_on = False
+            if cons_vel == 0:
+                parar() # llegado a 0: igual que S, sin retener las ruedas
+                hub.light.on(Color.GREEN)
+            else:
+                mover(cons_vel)
+        elif int(rampa_vel) != vel_actual:
+            mover(int(rampa_vel))
+    if cons_dir_on:
+        rampa_dir = acercar(rampa_dir, cons_dir, lim_dir * dt / 1000)
+        if rampa_dir == cons_dir:
+            cons_dir_on = False
+        if int(rampa_dir) != cons_dir_act or not cons_dir_on:
+            cons_dir_act = int(rampa_dir)
+            try:
+                motor_dir.run_target(800, cons_dir_act, wait=False)
+            except Exception:
+                pass
+
+
+def ejecutar_marco(marco):
+    # Decodifica el marco binario a mano: sin strings ni tuplas nuevas
+    if (marco[1] + marco[2] + marco[3] + marco[4]) & 0xFF != marco[5]:
+        return False
+    valor = marco[2] | (marco[3] << 8)
+    if valor > 32767:
+        valor -= 65536
+    ejecutar(marco[1], valor)
+    return True
+
+
+def iniciar_segmento(i, t):
+    global tr_i, tr_t0, tr_v0
+    tr_i = i
+    tr_t0 = t
+    tr_v0 = vel_actual
+    if motor_dir:
+        try:
+            motor_dir.run_target(800, tr_dir[i], wait=False)
+        except Exception:
+            pass
+    if not tr_rampa[i]:
+        mover(tr_vel[i])
+
+
+def avanzar_trayectoria(ahora):
+    global tr_i, tr_n
+    t = ahora - tr_t0
+    dur = tr_ms[tr_i]
+    if t >= dur:
+        if tr_rampa[tr_i]:
+            mover(tr_vel[tr_i])
+        sig = tr_i + 1
+        if sig < tr_n:
+            # el siguiente empieza donde acabó éste: sin deriva acumulada
+            iniciar_segmento(sig, tr_t0 + dur)
+            return
+        tr_i = -1
+        tr_n = 0
+        parar()
+        hub.light.on(Color.GREEN)
+        print("TRJ FIN", sig)
+    elif tr_rampa[tr_i]:
+        v = tr_v0 + (tr_vel[tr_i] - tr_v0) * t // dur
+        if v != vel_actual:
+            mover(v)
+
+
+def vencer_lease():
+    # Sin noticias del PC: parar tracción y centrar la dirección
+    global lease_fallos, lease_vencido, cons_vel_on, cons_dir_on
+    lease_fallos += 1
+    lease_vencido = True
+    abortar_trayectoria()
+    desactivar_rumbo()
+    cons_vel_on = False
+    cons_dir_on = False
+    parar()
+    if motor_dir:
+        try:
+            motor_dir.run_target(800, 0, wait=False)
+        except Exception:
+            pass
+    hub.light.on(Color.RED)
+    print("LEASE VENCIDO", lease_fallos)
+
+
+def leer_motor(m):
+    # Ángulo, velocidad y carga de un motor (ceros si no está conectado)
+    if m:
+        try:
+            return m.angle(), m.speed(), m.load()
+        except Exception:
+            pass
+    return 0, 0, 0
+
+
+def enviar_telemetria(t):
+    global tel_seq, tel_bucle
+    flags = 0
+    if motor_der: flags |= 1
+    if motor_izq: flags |= 2
+    if motor_dir: flags |= 4
+    if hh_modo: flags |= 8
+    a_ang, a_vel, a_car = leer_motor(motor_der)
+    e_ang, e_vel, e_car = leer_motor(motor_izq)
+    c_ang, c_vel, c_car = leer_motor(motor_dir)
+    try:
+        bat = hub.battery.voltage()
+        rumbo = (int(hub.imu.heading()) + 180) % 360 - 180
+        pitch, roll = hub.imu.tilt()
+    except Exception:
+        bat, rumbo, pitch, roll = 0, 0, 0, 0
+    tel_seq = (tel_seq + 1) & 0xFF
+    ustruct.pack_into(TEL_FMT, tel_raw, 0, tel_seq, flags, t & 0xFFFF, bat,
+                      a_ang, e_ang, c_ang, a_vel, e_vel, c_vel,
+                      a_car, e_car, c_car, rumbo, int(pitch), int(roll),
+                      min(tel_bucle, 0xFFFF), min((w - r) & RING_MASK, 255))
+    tel_bucle = 0
+    # base64 sobre el buffer preasignado (TEL_LEN es múltiplo de 3)
+    j = 1
+    for i in range(0, TEL_LEN, 3):
+        n = (tel_raw[i] << 16) | (tel_raw[i + 1] << 8) | tel_raw[i + 2]
+        tel_txt[j] = B64[n >> 18]
+        tel_txt[j + 1] = B64[(n >> 12) & 63]
+        tel_txt[j + 2] = B64[(n >> 6) & 63]
+        tel_txt[j + 3] = B64[n & 63]
+        j += 4
+    salida.write(tel_txt)
+
+
+def motores_ok():
+    m = ""
+    if motor_der: m += "A"
+    if motor_izq: m += "E"
+    if motor_dir: m += "C"
+    return m or "-"
+
+
 hub.light.on(Color.GREEN) # Verde = LISTO
 
-buffer = ""
+entrada = sys.stdin.buffer
+salida = sys.stdout.buffer
+byte = bytearray(1)
+marco = bytearray(MARCO_LEN)
+
+# Anillo preasignado: todo lo disponible en stdin se vuelca aquí de una vez
+ring = bytearray(RING_LEN)
+r = 0 # índice de lectura
+w = 0 # índice de escritura
+
+# Estado del parser de texto (v1), sin construir strings
+t_op = 0
+t_val = 0
+t_neg = False
+t_ok = True
+t_seq = -1  # seq tras '@' (-1: sin seq)
+
+# Ack del último seq ejecutado: "K" + 3 dígitos + "\\n", sin strings nuevos
+ack_seq = -1
+ack_t = 0
+ack_txt = bytearray(b"K000\\n")
+rx_seq = -1 # último seq binario recibido (para detectar marcos perdidos)
+
+# Telemetría: buffers preasignados ("~" + base64 + "\\n")
+tel_periodo = 0
+tel_factor = 1
+tel_ultimo = 0
+tel_seq = 0
+tel_bucle = 0 # bucle máx. desde el último registro (max_loop es de 'Q')
+tel_raw = bytearray(TEL_LEN)
+tel_txt = bytearray(1 + TEL_LEN * 4 // 3 + 1)
+tel_txt[0] = 126 # '~'
+tel_txt[-1] = 10 # '\\n'
+
+poller = uselect.poll()
+poller.register(sys.stdin, uselect.POLLIN)
+
+reloj = StopWatch()
+iteraciones = 0
+max_loop = 0
+
+# Trayectoria: segmentos preasignados
+vel_actual = 0
+seg_vel = 0
+seg_dir = 0
+seg_ms = 0
+tr_vel = [0] * TRJ_MAX
+tr_dir = [0] * TRJ_MAX
+tr_ms = [0] * TRJ_MAX
+tr_rampa = bytearray(TRJ_MAX)
+tr_n = 0    # segmentos cargados
+tr_i = -1   # segmento en curso (-1: ninguno)
+tr_t0 = 0   # inicio del segmento en curso (ms del reloj)
+tr_v0 = 0   # velocidad al empezar el segmento (origen de la rampa)
+
+# Lease: 0 = desactivado hasta que el PC lo negocie con E<ms>
+lease_ms = 0
+lease_ultimo = 0
+lease_vencido = False
+lease_fallos = 0
+
+# Mantener rumbo: 0 = manual
+hh_modo = 0
+hh_obj = 0
+hh_ultimo = 0
+hh_previo = 0
+hh_dir = 0
+hh_int = 0
+
+# Consignas proporcionales: objetivo, punto actual de la rampa y límites (0 = sin límite)
+cons_vel_on = False
+cons_vel = 0
+rampa_vel = 0
+cons_dir_on = False
+cons_dir = 0
+rampa_dir = 0
+cons_dir_act = 0 # último run_target de la rampa de dirección
+cons_ultimo = 0
+lim_acel = 0
+lim_dir = 0
+
+# Handshake: motores listos y a punto de escuchar -> el PC ya puede enviar
+# READY <versión protocolo> <hash programa> <capacidades> <motores>
+print("READY", PROTO_VERSION, PROG_HASH, CAPS, motores_ok())
 
 while True:
-    # Comprobación no bloqueante de datos
-    ready = uselect.select([sys.stdin], [], [], 0)[0]
-    
-    if ready:
-        char = sys.stdin.read(1)
-        
-        if char == ';':
-            # Fin del comando
-            cmd = buffer.strip()
-            buffer = "" 
-            
-            if len(cmd) > 0:
-                action = cmd[0] # F, B, S, L, R, Z
-                
-                # --- LÓGICA DE TRACCIÓN (F=Forward, B=Back, S=Stop) ---
-                if action == 'S':
-                    if motor_der: motor_der.stop()
-                    if motor_izq: motor_izq.stop()
-                    hub.light.on(Color.GREEN)
-                    
-                elif action == 'F' or action == 'B':
-                    try:
-                        val_part = cmd[1:]
-                        if val_part == '': val_part = '0'
-                        speed = int(val_part)
-                        
-                        if action == 'B':
-                            speed = -speed
-                        
-                        if motor_der: motor_der.run(speed)
-                        if motor_izq: motor_izq.run(-speed)
-                        hub.light.on(Color.BLUE)
-                    except ValueError:
-                        pass
-
-                # --- LÓGICA DE DIRECCIÓN (Puerto C) ---
-                elif action in ['L', 'R', 'Z']:
-                    if motor_dir:
-                        try:
-                            if action == 'L':
-                                motor_dir.run_target(800, -30, wait=False)
-                            elif action == 'R':
-                                motor_dir.run_target(800, 30, wait=False)
-                            elif action == 'Z':
-                                motor_dir.run_target(800, 0, wait=False)
-                        except Exception:
-                            pass
+    t0 = reloj.time()
+    iteraciones += 1
+
+    # 1) Drenar todo lo disponible en stdin al anillo
+    leidos = 0
+    while poller.poll(0):
+        if ((w + 1) & RING_MASK) == r:
+            break # anillo lleno: se procesa y se sigue en la próxima vuelta
+        entrada.readinto(byte)
+        ring[w] = byte[0]
+        w = (w + 1) & RING_MASK
+        leidos += 1
+
+    # 2) Procesar todos los comandos completos de esta pasada
+    recibido = False
+    while r != w:
+        b = ring[r]
+
+        if b == MARCO_INICIO:
+            if ((w - r) & RING_MASK) < MARCO_LEN:
+                break # marco incompleto: esperar al resto
+            for i in range(MARCO_LEN):
+                marco[i] = ring[(r + i) & RING_MASK]
+            if ejecutar_marco(marco):
+                s = marco[4]
+                if rx_seq >= 0:
+                    hueco = (s - rx_seq - 1) & 0xFF
+                    if 0 < hueco < 128:
+                        print("N", (rx_seq + 1) & 0xFF, (s - 1) & 0xFF)
+                rx_seq = s
+                ack_seq = s
+                recibido = True
+                r = (r + MARCO_LEN) & RING_MASK
+            else:
+                r = (r + 1) & RING_MASK # checksum inválido: resincronizar
+            continue
+
+        r = (r + 1) & RING_MASK
 
+        if b == 59: # ';' fin de comando de texto
+            if t_op and t_ok:
+                ejecutar(t_op, -t_val if t_neg else t_val)
+                recibido = True
+                if t_seq >= 0:
+                    ack_seq = t_seq
+            t_op = 0
+            t_val = 0
+            t_neg = False
+            t_ok = True
+            t_seq = -1
+        elif b == 10 or b == 13 or b == 32:
+            pass
+        elif t_op == 0:
+            t_op = b
+        elif b == 64: # '@' -> sigue el seq
+            t_seq = 0
+        elif 48 <= b <= 57:
+            if t_seq >= 0:
+                t_seq = (t_seq * 10 + (b - 48)) & 0xFF
+            else:
+                t_val = t_val * 10 + (b - 48)
+        elif b == 45 and t_val == 0:
+            t_neg = True
         else:
-            if char != '\\n' and char != '\\r':
-                buffer += char
-            
-    wait(5)
-"""
\ No newline at end of file
+            t_ok = False # número inválido: se descarta el comando
+
+    # Ack acumulado: confirma todo lo ejecutado hasta este seq. Con la entrada
+    # llena se agrupan (uno cada ACK_MS); la vuelta ociosa siguiente lo envía
+    if ack_seq >= 0 and (leidos == 0 or reloj.time() - ack_t >= ACK_MS):
+        ack_t = reloj.time()
+        ack_txt[1] = 48 + ack_seq // 100
+        ack_txt[2] = 48 + (ack_seq // 10) % 10
+        ack_txt[3] = 48 + ack_seq % 10
+        salida.write(ack_txt)
+        ack_seq = -1
+
+    # Telemetría: nunca compite con la entrada de comandos. Si en esta vuelta
+    # llegaron bytes se aplaza y el periodo efectivo se alarga; en reposo se
+    # vuelve poco a poco al periodo pedido.
+    if tel_periodo:
+        ahora = reloj.time()
+        if ahora - tel_ultimo >= tel_periodo * tel_factor:
+            if leidos:
+                if tel_factor < TEL_FACTOR_MAX:
+                    tel_factor *= 2
+            else:
+                enviar_telemetria(ahora)
+                tel_ultimo = ahora
+                if tel_factor > 1:
+                    tel_factor //= 2
+
+    # Lease: cualquier comando válido lo renueva; vencido una sola vez por silencio
+    if recibido:
+        lease_ultimo = reloj.time()
+        lease_vencido = False
+    elif lease_ms and not lease_vencido and reloj.time() - lease_ultimo > lease_ms:
+        vencer_lease()
+
+    # Trayectoria en curso: tiempos del reloj del hub, no de la llegada por BLE
+    if tr_i >= 0:
+        avanzar_trayectoria(reloj.time())
+    else:
+        if hh_modo:
+            controlar_rumbo(reloj.time())
+        if cons_vel_on or cons_dir_on:
+            seguir_consignas(reloj.time())
+
+    dt = reloj.time() - t0
+    if dt > max_loop:
+        max_loop = dt
+    if dt > tel_bucle:
+        tel_bucle = dt
+
+    # 3) Dormir sólo si no llegó nada (poll despierta en cuanto hay datos);
+    #    con una trayectoria en curso la espera es de 1 ms
+    if leidos == 0:
+        poller.poll(1 if tr_i >= 0 else IDLE_MS)
+"""
+
+
+def preparar_script():
+    """Devuelve (hash, script) con el hash del programa incrustado.
+
+    El hub lo imprime en su línea READY, así el PC puede confirmar
+    que el programa guardado en el hub es esta versión sin volver a descargarlo.
+    """
+    prog_hash = hashlib.sha256(LISTENER_SCRIPT.encode('utf-8')).hexdigest()[:16]
+    return prog_hash, LISTENER_SCRIPT.replace("__PROG_HASH__", prog_hash)
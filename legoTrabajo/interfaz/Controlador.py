@@ -0,0 +1,283 @@
+# Controlador.py
+# Rol arquitectura: CLIENTE (PC) — API asyncio sin GUI sobre el núcleo del
+# enlace (NucleoHub) en el loop de quien llama; la interfaz usa el mismo núcleo
+# a través de BLEWorker, que sólo le añade un hilo. Cada envío es
+# awaitable (True cuando el hub lo confirma) y hay un tope de comandos en
+# vuelo, así un guion no puede llenar la cola más rápido de lo que sale.
+#
+#   async with Controlador("SP-7") as ctl:
+#       await ctl.avanzar(500)
+#       await ctl.girar(-1)
+#       await asyncio.sleep(1.5)
+#       await ctl.parar()
+#
+# También se usa desde la consola para pruebas y CI (ver main()):
+#
+#   python Controlador.py --sim F500 +1.5 L +0.5 S Z
+#   python Controlador.py --hub SP-7 --guion recorrido.txt
+
+import argparse
+import asyncio
+import sys
+import time
+
+import Metricas
+import Registro
+from Conexion import NucleoHub, TRANSPORTES
+
+# Comandos esperando confirmación a la vez; el siguiente envío espera hueco
+MAX_EN_VUELO = 8
+# Sin confirmación en este plazo el envío devuelve False (el comando puede llegar igual)
+ENVIO_TIMEOUT = 2.0
+CONEXION_TIMEOUT = 30.0
+
+
+class Controlador:
+    def __init__(self, hub_name: str = "SP-7", registro=None, hub_factory=None,
+                 max_en_vuelo: int = MAX_EN_VUELO, **opciones_nucleo):
+        # Se crea dentro del loop que lo va a usar
+        self.loop = asyncio.get_running_loop()
+        self.registro = registro if registro is not None else Registro.Registro()
+        self.nucleo = NucleoHub(self.registro, hub_name=hub_name, hub_factory=hub_factory,
+                                loop=self.loop, **opciones_nucleo)
+        self._en_vuelo = asyncio.Semaphore(max_en_vuelo)
+        self._cambio_estado = asyncio.Event()
+        self.nucleo.add_state_listener(lambda _: self._cambio_estado.set())
+
+    # --- conexión ---
+    @property
+    def estado(self) -> str:
+        return self.nucleo.state
+
+    @property
+    def listo(self) -> bool:
+        return self.nucleo.running.is_set()
+
+    async def conectar(self, timeout: float = CONEXION_TIMEOUT):
+        """Busca el hub, carga el programa y espera READY; ConnectionError si falla."""
+        runner = self.nucleo.start_runner()
+        limite = self.loop.time() + timeout
+        while self.nucleo.state != "listo":
+            if runner.done():
+                raise ConnectionError(self._ultimo_error() or f"no se pudo conectar con '{self.nucleo.hub_name}'")
+            restante = limite - self.loop.time()
+            if restante <= 0:
+                await self.desconectar()
+                raise ConnectionError(f"'{self.nucleo.hub_name}' no estuvo listo en {timeout:g} s")
+            self._cambio_estado.clear()
+            try:
+                await asyncio.wait_for(self._cambio_estado.wait(), min(restante, 0.5))
+            except asyncio.TimeoutError:
+                pass
+
+    def _ultimo_error(self):
+        reg = self.registro.ultimo(Registro.ERROR) if hasattr(self.registro, "ultimo") else None
+        return reg[4] if reg else None
+
+    async def desconectar(self):
+        """Parada del hub (S;) y desconexión; se puede volver a conectar()."""
+        await self.nucleo.shutdown()
+
+    async def cerrar(self):
+        await self.desconectar()
+        self.nucleo.stop_recording()
+        self.nucleo.close_reader()
+
+    async def __aenter__(self):
+        await self.conectar()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.cerrar()
+
+    # --- envío ---
+    async def enviar(self, texto: str, prioridad: bool = False, esperar: bool = True,
+                     timeout: float = ENVIO_TIMEOUT) -> bool:
+        """Encola un comando del protocolo (F500, L, T100...).
+
+        Con esperar=True vuelve cuando el hub lo confirma (True) o cuando otro
+        comando del mismo canal lo sustituye, se descarta o vence el plazo
+        (False). Con esperar=False sólo aplica el tope de comandos en vuelo.
+        """
+        if not self.listo:
+            raise ConnectionError("el hub no está conectado")
+        await self._en_vuelo.acquire()
+        fin = self.loop.create_future()
+        fin.add_done_callback(lambda _: self._en_vuelo.release())
+        self.nucleo.send_packet(texto, prioridad, fin=fin)
+        if not esperar:
+            return True
+        try:
+            return await asyncio.wait_for(asyncio.shield(fin), timeout)
+        except asyncio.TimeoutError:
+            return False
+
+    async def avanzar(self, velocidad: int, **kw) -> bool:
+        """Velocidad de tracción en grados/s (negativa = atrás, 0 = parar)."""
+        velocidad = int(velocidad)
+        if velocidad == 0:
+            return await self.enviar("S", **kw)
+        return await self.enviar(f"{'F' if velocidad > 0 else 'B'}{min(abs(velocidad), 1000)}", **kw)
+
+    async def girar(self, sentido: int, **kw) -> bool:
+        """Dirección: -1 izquierda, 0 centro, 1 derecha."""
+        return await self.enviar("L" if sentido < 0 else "R" if sentido > 0 else "Z", **kw)
+
+    async def consigna(self, velocidad: int = None, angulo: int = None, **kw) -> bool:
+        """Consignas proporcionales: velocidad con signo (°/s) y ángulo de dirección
+        (grados, ±30). El hub llega a ellas con sus rampas (ver set_slew_limits)."""
+        envios = []
+        if velocidad is not None:
+            envios.append(self.enviar(f"U{int(velocidad)}", **kw))
+        if angulo is not None:
+            envios.append(self.enviar(f"W{int(angulo)}", **kw))
+        return all(await asyncio.gather(*envios))
+
+    async def parar(self) -> bool:
+        # carril prioritario, igual que la parada de emergencia de la GUI
+        tr, di = await asyncio.gather(self.enviar("S", prioridad=True),
+                                      self.enviar("Z", prioridad=True))
+        return tr and di
+
+    async def mantener_rumbo(self, rumbo: int = None) -> bool:
+        """El hub corrige la dirección él solo para seguir 'rumbo' (grados de su
+        IMU; None = el actual). girar(-1/1) vuelve a dirección manual."""
+        if "HDG" not in self.nucleo.hub_caps:
+            raise RuntimeError("el hub no admite mantener el rumbo")
+        return await self.enviar("M1" if rumbo is None else f"A{int(rumbo)}")
+
+    async def soltar_rumbo(self) -> bool:
+        return await self.enviar("M0")
+
+    async def trayectoria(self, tray, ejecutar: bool = True) -> str:
+        """Sube una Trayectoria y espera el resultado del hub ("FIN", "ABORT"...)."""
+        return await self.nucleo.upload_trajectory(tray, ejecutar)
+
+    # --- lectura ---
+    def telemetria(self):
+        """Último registro de telemetría (dict) o None."""
+        return self.nucleo.telemetry.ultimo()
+
+    async def esperar_telemetria(self, timeout: float = 2.0):
+        """Espera un registro de telemetría más nuevo que el actual."""
+        previo = self.nucleo.telemetry.total
+        limite = self.loop.time() + timeout
+        while self.nucleo.telemetry.total == previo:
+            if self.loop.time() >= limite:
+                return None
+            await asyncio.sleep(0.01)
+        return self.telemetria()
+
+    def confirmado(self, canal: str):
+        return self.nucleo.estado_confirmado(canal)
+
+    def resumen(self) -> dict:
+        p50, p95, p99 = self.nucleo.latency.percentiles("total")
+        return {
+            "hub": self.nucleo.hub_name,
+            "transporte": self.nucleo.transporte or "-",
+            "write_p50_ms": round(self.nucleo.write_lat.percentil(50), 2),
+            "escritos": self.nucleo.cmds_sent,
+            "writes": self.nucleo.writes,
+            "confirmados": self.nucleo.latency.hist["total"].n,
+            "errores_tx": self.nucleo.tx_errors,
+            "reenvios": self.nucleo.reenvios,
+            "lat_total_p50_ms": round(p50, 2),
+            "lat_total_p95_ms": round(p95, 2),
+            "lat_total_p99_ms": round(p99, 2),
+            **{f"cola_{k}": v for k, v in self.nucleo.queue_stats().items()},
+        }
+
+
+def leer_guion(lineas):
+    # Un paso por línea o argumento: comando (F500, L, S...) o "+segundos" de espera
+    pasos = []
+    for linea in lineas:
+        for paso in linea.split("#", 1)[0].split():
+            if paso.startswith("+"):
+                pasos.append(float(paso[1:]))
+            else:
+                pasos.append(paso.upper())
+    return pasos
+
+
+async def ejecutar_guion(ctl: Controlador, pasos, eco: bool = True) -> int:
+    fallos = 0
+    t0 = time.perf_counter()
+    for paso in pasos:
+        if isinstance(paso, float):
+            await asyncio.sleep(paso)
+            continue
+        ok = await ctl.enviar(paso, prioridad=paso in ("S", "Z"))
+        fallos += not ok
+        if eco:
+            print(f"{time.perf_counter() - t0:8.3f} s  {paso:<6} {'ok' if ok else 'SIN CONFIRMAR'}")
+    return fallos
+
+
+async def _main(args) -> int:
+    lineas = list(args.pasos)
+    if args.guion:
+        with open(args.guion, encoding='utf-8') as f:
+            lineas += f.readlines()
+    pasos = leer_guion(lineas)
+
+    factory = None
+    if args.sim:
+        import threading
+        import Simulador
+        cable = threading.Event()
+        if args.transporte == "usb":
+            cable.set()
+        factory = Simulador.fabrica(args.latencia, usb=cable)
+    registro = Registro.Registro(eco=not args.silencio, nivel_archivo=Registro.INFO)
+    exportador = Metricas.Exportador(Metricas.METRICAS, args.metricas).start() if args.metricas else None
+    ctl = Controlador(args.hub, registro, factory, telemetry_ms=args.telemetria,
+                      transporte=args.transporte, sin_respuesta=args.rapido)
+    try:
+        await ctl.conectar(args.timeout)
+    except ConnectionError as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        await ctl.cerrar()
+        if exportador:
+            exportador.stop()
+        registro.cerrar()
+        return 2
+    try:
+        fallos = await ejecutar_guion(ctl, pasos, eco=not args.silencio)
+        await ctl.parar()
+        await asyncio.sleep(0.2)  # últimos acks
+        tel = ctl.telemetria()
+        if tel and not args.silencio:
+            print("telemetría:", {k: v for k, v in tel.items() if k != "t_pc"})
+        for k, v in ctl.resumen().items():
+            print(f"{k:20} {v}")
+    finally:
+        await ctl.cerrar()
+        if exportador:
+            exportador.stop()
+        registro.cerrar()
+    return 1 if fallos else 0
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Control LEGO sin interfaz gráfica (guiones y CI)")
+    ap.add_argument("pasos", nargs="*", help="comandos (F500, L, S...) y esperas (+1.5 = 1,5 s)")
+    ap.add_argument("--guion", help="fichero con un paso por línea (# comentarios)")
+    ap.add_argument("--hub", default="SP-7", help="nombre del hub")
+    ap.add_argument("--transporte", choices=TRANSPORTES, default="auto",
+                    help="auto = USB si hay un hub enchufado, si no BLE")
+    ap.add_argument("--rapido", action="store_true",
+                    help="writes BLE sin respuesta; el hub avisa lo perdido y se reenvía")
+    ap.add_argument("--sim", action="store_true", help="usar el hub simulado en vez de BLE")
+    ap.add_argument("--latencia", type=float, default=15.0, help="ms por write en el simulador")
+    ap.add_argument("--telemetria", type=int, default=200, help="periodo de telemetría (0 = off)")
+    ap.add_argument("--timeout", type=float, default=CONEXION_TIMEOUT, help="espera máxima de conexión (s)")
+    ap.add_argument("--silencio", action="store_true", help="sólo el resumen final")
+    ap.add_argument("--metricas", metavar="RUTA", help="volcar métricas del enlace a .prom o .csv")
+    args = ap.parse_args(argv)
+    return asyncio.run(_main(args))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,147 @@
+# Entradas.py
+# Rol arquitectura: CLIENTE (PC) — fuentes de control proporcional para
+# EstadoControl (Muestreo.py): un pad que se arrastra con el ratón y un mando.
+# Cada fuente da dos ejes normalizados (-1..1) y a_consigna() los convierte en
+# velocidad con signo (U) y ángulo de dirección (W), con zona muerta y
+# cuantizados: sólo hay consigna nueva cuando el cambio se nota, y el hub
+# suaviza el resto con sus rampas (I/J). Bastan unas pocas por segundo.
+#
+# EntradaEjes no depende de Tk ni del mando: se alimenta con mover(x, y) desde
+# un guion o una prueba; PadRaton y Mando sólo le pasan los ejes.
+
+import tkinter as tk
+
+VEL_MAX = 1000      # °/s con el eje a tope
+DIR_MAX = 30        # grados de dirección a tope (= DIR_MAX del hub)
+ZONA_MUERTA = 0.08  # fracción del recorrido alrededor del centro que cuenta como 0
+PASO_VEL = 50       # cuantización de la velocidad (°/s)
+PASO_DIR = 2        # cuantización del ángulo (grados)
+
+# Rampas del hub para las consignas proporcionales (0 = sin límite)
+ACEL_MAX = 2000     # °/s²
+GIRO_MAX = 200      # °/s de la dirección
+
+
+def _eje(v: float, zona: float) -> float:
+    v = max(-1.0, min(1.0, v))
+    if abs(v) <= zona:
+        return 0.0
+    return (abs(v) - zona) / (1 - zona) * (1 if v > 0 else -1)
+
+
+def a_consigna(x: float, y: float, vel_max: int = VEL_MAX, dir_max: int = DIR_MAX,
+               zona: float = ZONA_MUERTA):
+    """(x, y) en -1..1 (x a la derecha, y adelante) -> (velocidad, ángulo) cuantizados."""
+    vel = round(_eje(y, zona) * vel_max / PASO_VEL) * PASO_VEL
+    ang = round(_eje(x, zona) * dir_max / PASO_DIR) * PASO_DIR
+    return int(vel), int(ang)
+
+
+class EntradaEjes:
+    # Fuente proporcional genérica: convierte ejes en consignas de EstadoControl
+    def __init__(self, estado, fuente: str, vel_max: int = VEL_MAX):
+        self.estado = estado
+        self.fuente = fuente
+        self.vel_max = vel_max
+        self.consigna = None  # última (velocidad, ángulo) entregada
+
+    def mover(self, x: float, y: float):
+        consigna = a_consigna(x, y, self.vel_max)
+        if consigna != self.consigna:
+            self.consigna = consigna
+            self.estado.proporcional(self.fuente, *consigna)
+
+    def centrar(self):
+        # Soltar el eje: consigna 0/0 (el hub frena con su rampa, no de golpe)
+        self.mover(0.0, 0.0)
+
+    def soltar(self):
+        # Deja de mandar: las teclas o botones vuelven a decidir (S/Z si no hay nada)
+        self.consigna = None
+        self.estado.soltar(self.fuente)
+
+
+class PadRaton(EntradaEjes):
+    """Ventana con un pad cuadrado: arrastrar desde el centro = acelerar y girar."""
+
+    def __init__(self, master, estado, fuente: str = "pad", lado: int = 220, vel_max: int = VEL_MAX):
+        super().__init__(estado, fuente, vel_max)
+        self.lado = lado
+        self.ventana = tk.Toplevel(master)
+        self.ventana.title("Pad proporcional")
+        self.ventana.resizable(False, False)
+        self.ventana.protocol("WM_DELETE_WINDOW", self.cerrar)
+        self.canvas = tk.Canvas(self.ventana, width=lado, height=lado, bg="#161B22",
+                                highlightthickness=0, cursor="crosshair")
+        self.canvas.pack()
+        c = lado / 2
+        self.canvas.create_line(c, 0, c, lado, fill="#30363D")
+        self.canvas.create_line(0, c, lado, c, fill="#30363D")
+        zona = ZONA_MUERTA * c
+        self.canvas.create_oval(c - zona, c - zona, c + zona, c + zona, outline="#30363D")
+        self._punto = self.canvas.create_oval(c - 8, c - 8, c + 8, c + 8, fill="#1F6FEB", outline="")
+        self.canvas.bind("<ButtonPress-1>", self._arrastrar)
+        self.canvas.bind("<B1-Motion>", self._arrastrar)
+        self.canvas.bind("<ButtonRelease-1>", self._soltar_raton)
+        self.abierto = True
+
+    def _dibujar(self, px: float, py: float):
+        self.canvas.coords(self._punto, px - 8, py - 8, px + 8, py + 8)
+
+    def _arrastrar(self, event):
+        px = max(0, min(self.lado, event.x))
+        py = max(0, min(self.lado, event.y))
+        self._dibujar(px, py)
+        self.mover(2 * px / self.lado - 1, 1 - 2 * py / self.lado)
+
+    def _soltar_raton(self, event=None):
+        self._dibujar(self.lado / 2, self.lado / 2)
+        self.centrar()
+
+    def cerrar(self):
+        self.abierto = False
+        self.soltar()
+        try:
+            self.ventana.destroy()
+        except tk.TclError:
+            pass
+
+
+class Mando(EntradaEjes):
+    """Mando de juegos por pygame (opcional). Se sondea desde el tick de la GUI."""
+
+    def __init__(self, joystick, estado, fuente: str = "mando", eje_x: int = 0, eje_y: int = 1,
+                 vel_max: int = VEL_MAX):
+        super().__init__(estado, fuente, vel_max)
+        self.joystick = joystick
+        self.eje_x = eje_x
+        self.eje_y = eje_y
+        self.nombre = joystick.get_name()
+
+    @classmethod
+    def abrir(cls, estado, indice: int = 0, **kw):
+        """Mando conectado o None (sin pygame o sin mando)."""
+        try:
+            import pygame
+        except ImportError:
+            return None
+        pygame.init()  # event.pump() necesita el sistema de eventos
+        pygame.joystick.init()
+        if pygame.joystick.get_count() <= indice:
+            return None
+        joystick = pygame.joystick.Joystick(indice)
+        joystick.init()
+        return cls(joystick, estado, **kw)
+
+    def sondear(self):
+        import pygame
+        pygame.event.pump()
+        # en los mandos el eje Y crece hacia abajo
+        self.mover(self.joystick.get_axis(self.eje_x), -self.joystick.get_axis(self.eje_y))
+
+    def cerrar(self):
+        self.soltar()
+        try:
+            self.joystick.quit()
+        except Exception:
+            pass
@@ -0,0 +1,339 @@
+# Flota.py
+# Rol arquitectura: CLIENTE (PC) — controla varios hubs a la vez desde un único
+# hilo y loop asyncio. Un solo escaneo BLE busca todos los nombres, las
+# conexiones se hacen en paralelo y cada hub conserva su propio BLEWorker
+# (cola, codec, telemetría, latencias y salud del enlace).
+#
+# Destinos de send_packet():
+#   "*"        todos los hubs
+#   "SP-7"     un hub por nombre
+#   "@grupo"   los hubs de un grupo (p. ej. grupos={"rojos": ["SP-7", "SP-8"]})
+
+import asyncio
+import threading
+import time
+from queue import Queue
+
+import Cache
+from Conexion import BLEWorker, DireccionBLE, hub_ble
+import Grabador
+
+TODOS = "*"
+PREFIJO_GRUPO = "@"
+
+# Escaneo compartido: tiempo máximo buscando los hubs que falten
+SCAN_TIMEOUT = 10.0
+
+
+class EscaneoCompartido:
+    # Un único BleakScanner para todos los nombres; cada hub espera su futuro.
+    # Los hubs con dirección en caché se reconocen por el primer anuncio, sin
+    # esperar al SCAN_RSP con el nombre.
+    def __init__(self, loop, timeout: float = SCAN_TIMEOUT):
+        self.loop = loop
+        self.timeout = timeout
+        self._futuros = {}     # nombre -> Future(BLEDevice)
+        self._direcciones = {} # dirección en caché -> nombre
+        self._tarea = None
+
+    async def buscar(self, nombre: str):
+        fut = self._futuros.get(nombre)
+        if fut is None or fut.done():
+            fut = self.loop.create_future()
+            self._futuros[nombre] = fut
+            cacheado = Cache.dispositivo_cacheado(nombre)
+            if cacheado:
+                self._direcciones[cacheado["address"].upper()] = nombre
+        if self._tarea is None or self._tarea.done():
+            self._tarea = self.loop.create_task(self._escanear())
+        return await fut
+
+    def _pendientes(self):
+        return [n for n, f in self._futuros.items() if not f.done()]
+
+    async def _escanear(self):
+        from bleak import BleakScanner  # type: ignore
+        from pybricksdev.ble.pybricks import PYBRICKS_SERVICE_UUID  # type: ignore
+
+        def detectado(device, adv):
+            if PYBRICKS_SERVICE_UUID not in adv.service_uuids:
+                return
+            nombre = self._direcciones.get(device.address.upper(), adv.local_name)
+            fut = self._futuros.get(nombre)
+            if fut is not None and not fut.done():
+                fut.set_result(device)
+                if adv.local_name == nombre:
+                    Cache.guardar_dispositivo(nombre, device.address)
+
+        scanner = BleakScanner(detectado, service_uuids=[PYBRICKS_SERVICE_UUID])
+        await scanner.start()
+        try:
+            fin = self.loop.time() + self.timeout
+            # los hubs que se piden durante el escaneo se suman a la misma búsqueda
+            while self._pendientes() and self.loop.time() < fin:
+                await asyncio.sleep(0.1)
+        finally:
+            await scanner.stop()
+        for fut in self._futuros.values():
+            if not fut.done():
+                fut.set_exception(asyncio.TimeoutError())
+
+    def fabrica(self):
+        # hub_factory para BLEWorker: (nombre) -> (dirección, PybricksHubBLE).
+        # Como conectar_ble: con dirección en caché, conexión directa sin escanear
+        async def conectar(nombre: str):
+            cacheado = Cache.dispositivo_cacheado(nombre)
+            if cacheado:
+                address = cacheado["address"]
+                return address, hub_ble(nombre, DireccionBLE(address, nombre), directo=True)
+            device = await self.buscar(nombre)
+            return device.address, hub_ble(nombre, device)
+        return conectar
+
+
+class FlotaBLE:
+    # Misma superficie que BLEWorker para la GUI (running, state, telemetry,
+    # send_packet...), más el destino de cada comando
+    def __init__(self, log_queue: Queue, nombres, grupos: dict = None, hub_factory=None,
+                 scan_timeout: float = SCAN_TIMEOUT, **opciones_worker):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self._thread_main, daemon=True)
+        self.log_queue = log_queue
+        self.grupos = {g: list(ns) for g, ns in (grupos or {}).items()}
+        # hub_factory (p. ej. Simulador.fabrica()) sustituye al escaneo compartido
+        self.escaneo = EscaneoCompartido(self.loop, scan_timeout)
+        fabrica = hub_factory or self.escaneo.fabrica()
+        self.workers = {}
+        for nombre in nombres:
+            # un Registro ya etiqueta cada mensaje con su hub; a una Queue se le antepone
+            log = log_queue if hasattr(log_queue, "registrar") else _LogHub(log_queue, nombre)
+            w = BLEWorker(log, hub_name=nombre, hub_factory=fabrica,
+                          loop=self.loop, **opciones_worker)
+            w.add_state_listener(self._on_worker_state)
+            self.workers[nombre] = w
+        self.objetivo = TODOS
+        self.recorder = None  # graba lo que pide la GUI, antes de repartirlo por hub
+        # running: al menos un hub listo para conducir
+        self.running = threading.Event()
+        self.state = "desconectado"
+        self._state_listeners = []
+
+    def log(self, msg: str):
+        if self.log_queue:
+            self.log_queue.put(msg)
+
+    def add_state_listener(self, fn):
+        self._state_listeners.append(fn)
+
+    def _on_worker_state(self, _state):
+        estados = [w.state for w in self.workers.values()]
+        if "listo" in estados:
+            state = "listo"
+            self.running.set()
+        else:
+            self.running.clear()
+            if all(s == "desconectado" for s in estados):
+                state = "desconectado"
+            elif "reconectando" in estados:
+                state = "reconectando"
+            else:
+                state = "conectando"
+        if state == self.state:
+            return
+        self.state = state
+        for fn in list(self._state_listeners):
+            try:
+                fn(state)
+            except Exception:
+                pass
+
+    def _thread_main(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def start(self):
+        # Todos los runners arrancan a la vez en el loop compartido
+        if not self.thread.is_alive():
+            self.thread.start()
+        self.log(f"Conectando flota: {', '.join(self.workers)}")
+        for w in self.workers.values():
+            w.start()
+
+    def prescan(self):
+        # Un único escaneo anticipado para todos los hubs mientras arranca la GUI
+        if not self.thread.is_alive():
+            self.thread.start()
+        for w in self.workers.values():
+            w.prescan()
+
+    def stop(self):
+        if self.loop.is_running():
+            asyncio.run_coroutine_threadsafe(self._shutdown(), self.loop)
+
+    def close(self, timeout: float = 5.0):
+        # Cierre definitivo: desconecta todos los hubs y detiene el hilo compartido
+        if not self.loop.is_running():
+            return
+        fut = asyncio.run_coroutine_threadsafe(self._close(), self.loop)
+        try:
+            fut.result(timeout)
+        except Exception:
+            pass
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+    async def _shutdown(self):
+        await asyncio.gather(*(w.shutdown() for w in self.workers.values()),
+                             return_exceptions=True)
+
+    async def _close(self):
+        await self._shutdown()
+        for w in self.workers.values():
+            w.close_reader()  # fin del hilo lector de cada hub
+
+    # --- destinos ---
+    def destinos(self):
+        """Opciones para el selector de la GUI: todos, grupos y cada hub."""
+        return [TODOS] + [PREFIJO_GRUPO + g for g in self.grupos] + list(self.workers)
+
+    def resolver(self, destino: str = None):
+        destino = self.objetivo if destino is None else destino
+        if destino == TODOS:
+            return list(self.workers.values())
+        if destino.startswith(PREFIJO_GRUPO):
+            nombres = self.grupos.get(destino[1:], [])
+            return [self.workers[n] for n in nombres if n in self.workers]
+        w = self.workers.get(destino)
+        return [w] if w else []
+
+    def set_objetivo(self, destino: str):
+        self.objetivo = destino
+
+    def send_packet(self, text_cmd: str, prioridad: bool = False, destino: str = None):
+        # Cada hub recibe el comando en su propia cola; uno desconectado no frena al resto
+        recorder = self.recorder
+        if recorder:
+            recorder.registrar(text_cmd, prioridad)
+        self._repartir(text_cmd, prioridad, destino)
+
+    def send_trajectory(self, trayectoria, ejecutar: bool = True, destino: str = None):
+        # La misma maniobra en cada hub destino; cada uno la ejecuta con su reloj
+        return {w.hub_name: w.send_trajectory(trayectoria, ejecutar)
+                for w in self.resolver(destino) if w.running.is_set()}
+
+    def cancel_trajectory(self, destino: str = None):
+        self.send_packet("C", prioridad=True, destino=destino)
+
+    def emergency_stop(self):
+        # Parada a todos los hubs, sea cual sea el destino elegido en la GUI
+        self.send_packet("S", prioridad=True, destino=TODOS)
+        self.send_packet("Z", prioridad=True, destino=TODOS)
+
+    def start_recording(self, path: str):
+        self.stop_recording()
+        self.recorder = Grabador.Grabador(path)
+        self.log(f"Grabando comandos de la flota en {path}")
+        return self.recorder
+
+    def stop_recording(self):
+        recorder, self.recorder = self.recorder, None
+        if recorder:
+            recorder.cerrar()
+            omitidos = f" ({recorder.omitidos} omitidos por largos)" if recorder.omitidos else ""
+            self.log(f"Grabación cerrada: {recorder.registros} comandos{omitidos}")
+
+    def replay(self, path: str, velocidad: float = 1.0, destino: str = None):
+        # Se reparte al destino indicado (o al objetivo actual) como si viniera de la GUI
+        async def _replay():
+            with Grabador.Grabacion(path) as grabacion:
+                return await Grabador.reproducir(
+                    lambda texto, prioridad: self._repartir(texto, prioridad, destino),
+                    grabacion, velocidad)
+        return asyncio.run_coroutine_threadsafe(_replay(), self.loop)
+
+    def _repartir(self, text_cmd: str, prioridad: bool, destino: str = None):
+        for w in self.resolver(destino):
+            if w.running.is_set():
+                w.send_packet(text_cmd, prioridad)
+
+    def set_telemetry_rate(self, ms: int):
+        for w in self.resolver():
+            w.set_telemetry_rate(ms)
+
+    def request_stats(self):
+        for w in self.resolver():
+            w.request_stats()
+
+    def set_slew_limits(self, acel_max: int = 0, giro_max: int = 0):
+        for w in self.resolver():
+            w.set_slew_limits(acel_max, giro_max)
+
+    def hold_heading(self, rumbo: int = None):
+        # cada hub con su propia IMU: "mantener el rumbo actual" vale para todos
+        for w in self.resolver():
+            if w.running.is_set():
+                w.hold_heading(rumbo)
+
+    def release_heading(self):
+        self._repartir("M0", False)
+
+    # --- lecturas (del hub enfocado: el objetivo si es un solo hub, si no el primero listo) ---
+    def _enfocado(self):
+        candidatos = self.resolver()
+        for w in candidatos:
+            if w.running.is_set():
+                return w
+        return candidatos[0] if candidatos else next(iter(self.workers.values()))
+
+    @property
+    def telemetry(self):
+        return self._enfocado().telemetry
+
+    @property
+    def latency(self):
+        return self._enfocado().latency
+
+    @property
+    def heading_hold(self):
+        return self._enfocado().heading_hold
+
+    def latency_summary(self) -> str:
+        w = self._enfocado()
+        resumen = w.latency_summary()
+        return f"{w.hub_name}: {resumen}" if resumen and len(self.workers) > 1 else resumen
+
+    def dump_latency_csv(self, path: str):
+        self._enfocado().dump_latency_csv(path)
+
+    def estado_confirmado(self, canal: str):
+        # Confirmado sólo si todos los hubs destino listos tienen el mismo comando
+        estados = {w.estado_confirmado(canal) for w in self.resolver() if w.running.is_set()}
+        return estados.pop() if len(estados) == 1 else None
+
+    def queue_stats(self) -> dict:
+        return {n: w.queue_stats() for n, w in self.workers.items()}
+
+    def salud(self) -> dict:
+        """Estado de cada hub: conexión, cola, errores de TX y tiempo desde el último ack."""
+        ahora = time.perf_counter()
+        return {
+            n: {
+                "estado": w.state,
+                "cola": len(w.queue),
+                "writes": w.writes,
+                "errores_tx": w.tx_errors,
+                "ultimo_ack_s": round(ahora - w.last_ack, 2) if w.last_ack else None,
+                "telemetria_perdida": w.telemetry.perdidos,
+            }
+            for n, w in self.workers.items()
+        }
+
+
+class _LogHub:
+    # Antepone el nombre del hub a cada mensaje del worker
+    def __init__(self, log_queue: Queue, nombre: str):
+        self._cola = log_queue
+        self._nombre = nombre
+
+    def put(self, msg: str):
+        if self._cola:
+            self._cola.put(f"[{self._nombre}] {msg}")
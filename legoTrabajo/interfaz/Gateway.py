@@ -0,0 +1,567 @@
+# Gateway.py
+# Rol arquitectura: CLIENTE (PC) — un proceso es dueño del enlace BLE
+# (Controlador) y lo comparte por TCP en localhost con varios clientes: la GUI,
+# scripts de prueba, paneles... Nadie más paga la conexión ni pelea por el enlace.
+#
+#   python Gateway.py --hub SP-7 --conectar         # servidor en 127.0.0.1:8765
+#   python Main.py --gateway 127.0.0.1:8765         # la GUI como cliente
+#
+# Protocolo de líneas UTF-8 (cliente -> gateway):
+#   HOLA <nombre>        identificarse (respuesta: HOLA <hub> <estado>)
+#   CONECTAR             conectar el hub si no lo está
+#   DESCONECTAR          desconectar el hub (sólo quien tiene el control, o si está libre)
+#   TOMAR / SOLTAR       pedir / ceder el control de la conducción
+#   PARAR                S + Z urgentes; cualquier cliente, siempre
+#   TEL <ms>             telemetría cada <ms> (0 = no enviar)
+#   ESTADO / STATS       estado del enlace / resumen de envíos y latencias
+#   <cmd>                comando del hub (F500, L, T100...): requiere el control,
+#                        que se asigna solo si está libre. "?<cmd>" responde
+#                        OK/NOK <cmd> al confirmarlo el hub; "!<cmd>" va por el
+#                        carril prioritario.
+# Gateway -> cliente: ESTADO <estado>, CONTROL <nombre|->, CONF <canal> <cmd>,
+#   TEL <v1>,<v2>... (orden de Telemetria.CAMPOS), LOG <nivel> <msg>,
+#   OK/NOK <cmd>, ERR <motivo>, STATS k=v...
+#
+# Contrapresión por cliente: cada uno tiene su cola de salida acotada (si no lee,
+# se pierde su telemetría, y si ni así se vacía se le desconecta) y su propio
+# tope de comandos en vuelo (al llegar a él se deja de leer su socket): la
+# ráfaga de un cliente no frena a los demás. El tope del Controlador queda sólo
+# como límite de seguridad del hub.
+
+import argparse
+import asyncio
+import sys
+import threading
+import time
+
+import Metricas
+import Registro
+import Telemetria
+import Grabador
+from Conexion import CANALES, CANALES_ESTADO
+from Controlador import Controlador
+
+HOST = "127.0.0.1"
+PUERTO = 8765
+
+COLA_CLIENTE = 64          # líneas pendientes de enviar a un cliente
+MAX_EN_VUELO_CLIENTE = 8   # comandos de un cliente esperando confirmación del hub
+MAX_EN_VUELO_HUB = 32      # tope del Controlador: todos los clientes juntos
+CONTROL_INACTIVO_S = 5.0   # sin comandos en este plazo, otro cliente puede TOMAR
+DIFUSION_MS = 50           # periodo de CONF/LOG/TEL hacia los clientes
+TEL_MIN_MS = 50
+
+# Mensajes que se pueden perder si el cliente va lento (se repiten o caducan)
+_DESECHABLES = ("TEL", "CONF", "LOG")
+
+
+class _Cliente:
+    def __init__(self, reader, writer, n: int):
+        self.reader = reader
+        self.writer = writer
+        self.nombre = f"cliente{n}"
+        self.salida = asyncio.Queue(COLA_CLIENTE)
+        self.en_vuelo = asyncio.Semaphore(MAX_EN_VUELO_CLIENTE)
+        self.tel_ms = 0
+        self._t_tel = 0.0
+        self.ultimo_cmd = 0.0
+        self.descartados = 0
+        self.cerrado = False
+
+    def enviar(self, linea: str) -> bool:
+        if self.cerrado:
+            return False
+        try:
+            self.salida.put_nowait(linea)
+            return True
+        except asyncio.QueueFull:
+            if linea.startswith(_DESECHABLES):
+                self.descartados += 1
+                return False
+            # ni las respuestas caben: cliente atascado
+            self.cerrar()
+            return False
+
+    def cerrar(self):
+        if not self.cerrado:
+            self.cerrado = True
+            self.writer.close()
+
+    async def escritor(self):
+        try:
+            while not self.cerrado:
+                linea = await self.salida.get()
+                self.writer.write((linea + "\n").encode('utf-8'))
+                await self.writer.drain()
+        except (ConnectionError, OSError):
+            self.cerrar()
+
+
+class Gateway:
+    def __init__(self, controlador: Controlador, registro=None):
+        self.ctl = controlador
+        self.registro = registro or controlador.registro
+        self.clientes = []
+        self.control = None
+        self._n = 0
+        self._conf = {}
+        self._log_seq = self.registro.seq if hasattr(self.registro, "seq") else 0
+        self._conectando = None
+        self._difusor = None
+        self.servidor = None
+        controlador.nucleo.add_state_listener(self._on_estado)
+        Metricas.METRICAS.funcion("lego_gateway_clientes", lambda: len(self.clientes),
+                                  "clientes TCP conectados al gateway")
+        Metricas.METRICAS.funcion("lego_gateway_descartados_total",
+                                  lambda: sum(c.descartados for c in self.clientes),
+                                  "líneas desechables no enviadas a clientes lentos", "counter")
+
+    def log(self, msg: str, nivel: int = Registro.INFO):
+        registrar = getattr(self.registro, "registrar", None)
+        if registrar:
+            registrar(msg, nivel, "gateway")
+
+    async def iniciar(self, host: str = HOST, puerto: int = PUERTO):
+        self.servidor = await asyncio.start_server(self._atender, host, puerto)
+        self._difusor = asyncio.get_running_loop().create_task(self._difundir())
+        self.log(f"Gateway escuchando en {host}:{puerto}")
+        return self.servidor
+
+    async def cerrar(self):
+        if self._difusor:
+            self._difusor.cancel()
+        if self.servidor:
+            self.servidor.close()
+            await self.servidor.wait_closed()
+        for c in list(self.clientes):
+            c.cerrar()
+        await self.ctl.cerrar()
+
+    # --- difusión ---
+    def _difundir_linea(self, linea: str):
+        for c in list(self.clientes):
+            c.enviar(linea)
+
+    def _on_estado(self, estado: str):
+        self._difundir_linea(f"ESTADO {estado}")
+
+    def _set_control(self, cliente):
+        if cliente is not self.control:
+            self.control = cliente
+            self._difundir_linea(f"CONTROL {cliente.nombre if cliente else '-'}")
+
+    async def _difundir(self):
+        while True:
+            await asyncio.sleep(DIFUSION_MS / 1000)
+            # confirmaciones del hub: cada cliente sabe en qué estado está el coche
+            for canal in CANALES_ESTADO:
+                cmd = self.ctl.confirmado(canal)
+                if cmd and self._conf.get(canal) != cmd:
+                    self._conf[canal] = cmd
+                    self._difundir_linea(f"CONF {canal} {cmd}")
+            if hasattr(self.registro, "recientes"):
+                for seq, _, nivel, origen, msg, _ in self.registro.recientes(20, Registro.INFO):
+                    if seq > self._log_seq:
+                        self._log_seq = seq
+                        if origen != "gateway":
+                            self._difundir_linea(f"LOG {nivel} {msg}")
+            reg = self.ctl.telemetria()
+            if reg:
+                ahora = time.monotonic()
+                linea = None
+                for c in self.clientes:
+                    if c.tel_ms and ahora - c._t_tel >= c.tel_ms / 1000:
+                        c._t_tel = ahora
+                        linea = linea or "TEL " + ",".join(str(reg[k]) for k in Telemetria.CAMPOS)
+                        c.enviar(linea)
+
+    # --- clientes ---
+    async def _atender(self, reader, writer):
+        self._n += 1
+        c = _Cliente(reader, writer, self._n)
+        self.clientes.append(c)
+        escritor = asyncio.get_running_loop().create_task(c.escritor())
+        self.log(f"{c.nombre} conectado ({len(self.clientes)} clientes)")
+        try:
+            while not c.cerrado:
+                raw = await reader.readline()
+                if not raw:
+                    break
+                linea = raw.decode('utf-8', 'replace').strip()
+                if linea:
+                    await self._procesar(c, linea)
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            self.clientes.remove(c)
+            if self.control is c:
+                # quien conducía se fue: el coche no sigue solo
+                self._parar()
+                self._set_control(None)
+            c.cerrar()
+            escritor.cancel()
+            self.log(f"{c.nombre} desconectado ({len(self.clientes)} clientes)")
+
+    def _parar(self):
+        if self.ctl.listo:
+            for cmd in ("S", "Z"):
+                self.ctl.nucleo.send_packet(cmd, prioridad=True)
+
+    def _tomar(self, c) -> bool:
+        dueño = self.control
+        if dueño is None or dueño is c or time.monotonic() - dueño.ultimo_cmd > CONTROL_INACTIVO_S:
+            self._set_control(c)
+            return True
+        c.enviar(f"ERR ocupado {dueño.nombre}")
+        return False
+
+    async def _procesar(self, c, linea: str):
+        orden, _, arg = linea.partition(" ")
+        o = orden.upper()
+        if o == "HOLA":
+            c.nombre = arg.strip() or c.nombre
+            c.enviar(f"HOLA {self.ctl.nucleo.hub_name} {self.ctl.estado}")
+            c.enviar(f"CONTROL {self.control.nombre if self.control else '-'}")
+            for canal, cmd in self._conf.items():
+                c.enviar(f"CONF {canal} {cmd}")
+        elif o == "CONECTAR":
+            self._conectar()
+        elif o == "DESCONECTAR":
+            if self.control in (None, c):
+                await self.ctl.desconectar()
+                self._set_control(None)
+            else:
+                c.enviar(f"ERR ocupado {self.control.nombre}")
+        elif o == "TOMAR":
+            self._tomar(c)
+            c.ultimo_cmd = time.monotonic()
+        elif o == "SOLTAR":
+            if self.control is c:
+                self._set_control(None)
+        elif o == "PARAR":
+            self._parar()
+        elif o == "TEL":
+            try:
+                c.tel_ms = max(TEL_MIN_MS, int(arg)) if int(arg) > 0 else 0
+            except ValueError:
+                c.enviar("ERR TEL <ms>")
+        elif o == "ESTADO":
+            c.enviar(f"ESTADO {self.ctl.estado}")
+        elif o == "STATS":
+            c.enviar("STATS " + " ".join(f"{k}={v}" for k, v in self.ctl.resumen().items()))
+        else:
+            await self._comando(c, orden)
+
+    async def _comando(self, c, orden: str):
+        confirmar = orden.startswith("?")
+        prioridad = orden.startswith("!")
+        cmd = orden.lstrip("?!").upper()
+        if not cmd:
+            return
+        if not self.ctl.listo:
+            c.enviar(f"NOK {cmd}" if confirmar else "ERR hub no conectado")
+            return
+        if cmd[0] not in ("S", "Z", "Q") and not self._tomar(c):
+            if confirmar:
+                c.enviar(f"NOK {cmd}")
+            return
+        c.ultimo_cmd = time.monotonic()
+        # se deja de leer al cliente mientras tenga su tope de comandos en vuelo
+        await c.en_vuelo.acquire()
+        asyncio.get_running_loop().create_task(self._enviar(c, cmd, prioridad, confirmar))
+
+    async def _enviar(self, c, cmd: str, prioridad: bool, confirmar: bool):
+        try:
+            ok = await self.ctl.enviar(cmd, prioridad)
+        except ConnectionError:
+            ok = False
+        finally:
+            c.en_vuelo.release()
+        if confirmar:
+            c.enviar(f"{'OK' if ok else 'NOK'} {cmd}")
+
+    def _conectar(self):
+        if self.ctl.estado != "desconectado":
+            return
+        if self._conectando and not self._conectando.done():
+            return
+
+        async def conectar():
+            try:
+                await self.ctl.conectar()
+            except ConnectionError as e:
+                self._difundir_linea(f"ERR {e}")
+        self._conectando = asyncio.get_running_loop().create_task(conectar())
+
+
+# cliente con la interfaz de BLEWorker que usa la GUI (running, send_packet,
+# estado_confirmado, telemetry...), hablando con un Gateway en su propio hilo
+class ClienteGateway:
+    def __init__(self, log_queue, host: str = HOST, puerto: int = PUERTO, nombre: str = "gui"):
+        self.host = host
+        self.puerto = puerto
+        self.nombre = nombre
+        self.hub_name = f"{host}:{puerto}"
+        self.log_queue = log_queue
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self._thread_main, daemon=True)
+        self.running = threading.Event()
+        self.state = "desconectado"
+        self.estado_hub = "desconectado"  # estado real del hub en el gateway
+        self._state_listeners = []
+        self._writer = None
+        self._tarea = None
+        self._quiere_hub = False
+        self.control = "-"
+        self.confirmado = {}
+        self.telemetry = Telemetria.BufferTelemetria()
+        self.stats = {}
+        self.recorder = None
+
+    def log(self, msg: str, nivel: int = Registro.INFO):
+        registrar = getattr(self.log_queue, "registrar", None)
+        if registrar:
+            registrar(msg, nivel, "gateway")
+        elif self.log_queue and nivel >= Registro.INFO:
+            self.log_queue.put(msg)
+
+    def add_state_listener(self, fn):
+        self._state_listeners.append(fn)
+
+    def _set_state(self, state: str):
+        # para la GUI sólo está conectado si ha pedido conducir (start)
+        if not self._quiere_hub:
+            state = "desconectado"
+        if state == self.state:
+            return
+        self.state = state
+        if state in ("listo", "reconectando"):
+            self.running.set()
+        else:
+            self.running.clear()
+        for fn in list(self._state_listeners):
+            try:
+                fn(state)
+            except Exception:
+                pass
+
+    def _thread_main(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def _ensure_thread(self):
+        if not self.thread.is_alive():
+            self.thread.start()
+
+    # --- sesión TCP ---
+    async def _sesion(self):
+        try:
+            reader, self._writer = await asyncio.open_connection(self.host, self.puerto)
+        except OSError as e:
+            self.log(f"No se pudo abrir el gateway {self.hub_name}: {e}", Registro.ERROR)
+            self._set_state("desconectado")
+            return
+        self._escribir(f"HOLA {self.nombre}")
+        self._escribir("TEL 200")
+        if self._quiere_hub:
+            self._escribir("CONECTAR")
+            self._escribir("TOMAR")
+        try:
+            while True:
+                raw = await reader.readline()
+                if not raw:
+                    break
+                self._on_linea(raw.decode('utf-8', 'replace').strip())
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            self._writer = None
+            self.estado_hub = "desconectado"
+            self.log("Gateway desconectado.", Registro.AVISO)
+            self._set_state("desconectado")
+
+    def _on_linea(self, linea: str):
+        orden, _, arg = linea.partition(" ")
+        if orden in ("HOLA", "ESTADO"):
+            self.estado_hub = arg.split()[-1] if arg else "desconectado"
+            self._set_state(self.estado_hub)
+        elif orden == "CONTROL":
+            self.control = arg
+        elif orden == "CONF":
+            canal, _, cmd = arg.partition(" ")
+            self.confirmado[canal] = cmd
+        elif orden == "OK":
+            canal = CANALES.get(arg[:1])
+            if canal:
+                self.confirmado[canal] = arg
+        elif orden == "TEL":
+            try:
+                self.telemetry.append([int(v) for v in arg.split(",")])
+            except ValueError:
+                pass
+        elif orden == "LOG":
+            nivel, _, msg = arg.partition(" ")
+            self.log(msg, int(nivel) if nivel.isdigit() else Registro.INFO)
+        elif orden == "STATS":
+            self.stats = dict(p.split("=", 1) for p in arg.split() if "=" in p)
+        elif orden == "ERR":
+            self.log(f"Gateway: {arg}", Registro.AVISO)
+
+    def _escribir(self, linea: str):
+        if self._writer is not None:
+            self._writer.write((linea + "\n").encode('utf-8'))
+
+    def _abrir(self):
+        if self._tarea is None or self._tarea.done():
+            self._tarea = self.loop.create_task(self._sesion())
+        elif self._quiere_hub:
+            self._escribir("CONECTAR")
+            self._escribir("TOMAR")
+            self._set_state(self.estado_hub)
+
+    # --- interfaz de BLEWorker ---
+    def prescan(self):
+        # abrir el socket mientras se dibuja la ventana
+        self._ensure_thread()
+        self.loop.call_soon_threadsafe(self._abrir)
+
+    def start(self):
+        self._quiere_hub = True
+        self._ensure_thread()
+        self.loop.call_soon_threadsafe(self._abrir)
+
+    def stop(self):
+        # ceder el control; el hub sigue conectado para los demás clientes
+        self._quiere_hub = False
+        if self.loop.is_running():
+            self.loop.call_soon_threadsafe(self._escribir, "SOLTAR")
+            self.loop.call_soon_threadsafe(self._set_state, "desconectado")
+
+    def close(self, timeout: float = 5.0):
+        self.stop_recording()
+        if not self.loop.is_running():
+            return
+
+        async def _cerrar():
+            writer = self._writer
+            if writer is not None:
+                writer.close()
+                try:
+                    await asyncio.wait_for(writer.wait_closed(), 1.0)
+                except (asyncio.TimeoutError, OSError):
+                    pass
+            if self._tarea:
+                self._tarea.cancel()
+                try:
+                    await self._tarea
+                except BaseException:
+                    pass
+            self.loop.stop()
+        asyncio.run_coroutine_threadsafe(_cerrar(), self.loop)
+        self.thread.join(timeout)
+
+    def send_packet(self, text_cmd: str, prioridad: bool = False):
+        if not self.loop.is_running():
+            return
+        recorder = self.recorder
+        if recorder:
+            recorder.registrar(text_cmd, prioridad)
+        # los comandos de estado piden confirmación: llega como OK y alimenta estado_confirmado
+        prefijo = "!" if prioridad else "?" if CANALES.get(text_cmd[:1]) in CANALES_ESTADO else ""
+        self.loop.call_soon_threadsafe(self._escribir, prefijo + text_cmd)
+
+    def estado_confirmado(self, canal: str):
+        return self.confirmado.get(canal)
+
+    def request_stats(self):
+        self.loop.call_soon_threadsafe(self._escribir, "STATS")
+
+    def set_slew_limits(self, acel_max: int = 0, giro_max: int = 0):
+        self.send_packet(f"I{acel_max}")
+        self.send_packet(f"J{giro_max}")
+
+    def hold_heading(self, rumbo: int = None):
+        self.send_packet("M1" if rumbo is None else f"A{int(rumbo)}")
+
+    def release_heading(self):
+        self.send_packet("M0")
+
+    @property
+    def heading_hold(self) -> bool:
+        # bit 3 de los flags de telemetría del hub
+        reg = self.telemetry.ultimo()
+        return bool(reg and reg["flags"] & 8)
+
+    def set_telemetry_rate(self, ms: int):
+        self.send_packet(f"T{ms}")
+
+    def latency_summary(self) -> str:
+        if self.loop.is_running() and self._writer is not None:
+            self.request_stats()  # la respuesta se verá en el siguiente refresco
+        if not self.stats:
+            return f"Gateway {self.hub_name} (control: {self.control})"
+        return (f"Gateway · p50 {self.stats.get('lat_total_p50_ms', '-')} ms · "
+                f"p95 {self.stats.get('lat_total_p95_ms', '-')} ms · control: {self.control}")
+
+    def dump_latency_csv(self, path: str):
+        raise RuntimeError("las latencias se miden en el gateway")
+
+    def start_recording(self, path: str):
+        self.stop_recording()
+        self.recorder = Grabador.Grabador(path)
+        self.log(f"Grabando comandos en {path}")
+        return self.recorder
+
+    def stop_recording(self):
+        recorder, self.recorder = self.recorder, None
+        if recorder:
+            recorder.cerrar()
+            omitidos = f" ({recorder.omitidos} omitidos por largos)" if recorder.omitidos else ""
+            self.log(f"Grabación cerrada: {recorder.registros} comandos{omitidos}")
+
+
+async def _main(args) -> int:
+    factory = None
+    if args.sim:
+        import Simulador
+        factory = Simulador.fabrica(args.latencia)
+    registro = Registro.Registro(eco=True, nivel_archivo=Registro.INFO)
+    ctl = Controlador(args.hub, registro, factory, telemetry_ms=args.telemetria,
+                      max_en_vuelo=MAX_EN_VUELO_HUB)
+    gw = Gateway(ctl, registro)
+    exportador = Metricas.Exportador(Metricas.METRICAS, args.metricas).start() if args.metricas else None
+    servidor = await gw.iniciar(args.host, args.puerto)
+    if args.conectar:
+        gw._conectar()
+    try:
+        async with servidor:
+            await servidor.serve_forever()
+    except asyncio.CancelledError:
+        pass
+    finally:
+        await gw.cerrar()
+        if exportador:
+            exportador.stop()
+        registro.cerrar()
+    return 0
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Gateway TCP: comparte un hub entre varios clientes")
+    ap.add_argument("--hub", default="SP-7", help="nombre del hub")
+    ap.add_argument("--host", default=HOST)
+    ap.add_argument("--puerto", type=int, default=PUERTO)
+    ap.add_argument("--conectar", action="store_true", help="conectar el hub al arrancar")
+    ap.add_argument("--sim", action="store_true", help="usar el hub simulado en vez de BLE")
+    ap.add_argument("--latencia", type=float, default=15.0, help="ms por write en el simulador")
+    ap.add_argument("--telemetria", type=int, default=100, help="periodo de telemetría del hub (ms)")
+    ap.add_argument("--metricas", metavar="RUTA", help="volcar métricas cada 5 s a .prom o .csv")
+    args = ap.parse_args(argv)
+    try:
+        return asyncio.run(_main(args))
+    except KeyboardInterrupt:
+        return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,132 @@
+# Grabador.py
+# Rol arquitectura: CLIENTE (PC) — graba el flujo de comandos que pasa por
+# BLEWorker.send_packet y lo reproduce con sus tiempos originales.
+#
+# Formato (little endian; abrir un Grabador sobre un fichero existente lo
+# trunca: los tiempos son perf_counter de una sola sesión y no se mezclan):
+#   cabecera: "LGRB" + versión (1 byte) + 3 bytes de relleno
+#   registro: t (double, perf_counter) + flags (1 byte, bit0 = prioridad)
+#             + comando ASCII (7 bytes, relleno con NUL) = 16 bytes
+# Se lee con mmap: una sesión larga no ocupa RAM, sólo las páginas que se tocan.
+
+import asyncio
+import mmap
+import os
+import struct
+import threading
+import time
+
+MAGIC = b"LGRB"
+VERSION = 1
+_CABECERA = struct.Struct("<4sB3x")
+_REGISTRO = struct.Struct("<dB7s")
+CABECERA_LEN = _CABECERA.size
+REGISTRO_LEN = _REGISTRO.size
+
+FLAG_PRIORIDAD = 1
+
+
+class Grabador:
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._f = open(path, 'wb')
+        self._f.write(_CABECERA.pack(MAGIC, VERSION))
+        self.registros = 0
+        self.omitidos = 0  # comandos de más de 7 bytes (no caben en el registro)
+
+    def registrar(self, texto: str, prioridad: bool = False, t: float = None):
+        # Desde cualquier hilo (dentro de send_packet: nunca debe fallar el envío);
+        # el buffer del fichero agrupa las escrituras
+        raw = texto.encode('ascii', 'replace')
+        if len(raw) > 7:
+            self.omitidos += 1
+            return
+        registro = _REGISTRO.pack(time.perf_counter() if t is None else t,
+                                  FLAG_PRIORIDAD if prioridad else 0, raw)
+        with self._lock:
+            if self._f:
+                self._f.write(registro)
+                self.registros += 1
+
+    def cerrar(self):
+        with self._lock:
+            if self._f:
+                self._f.close()
+                self._f = None
+
+
+def _leer_cabecera(path: str):
+    with open(path, 'rb') as f:
+        cab = f.read(CABECERA_LEN)
+    if len(cab) < CABECERA_LEN:
+        raise ValueError(f"{path}: grabación sin cabecera")
+    magic, version = _CABECERA.unpack(cab)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"{path}: no es una grabación de comandos v{VERSION}")
+
+
+class Grabacion:
+    # Acceso aleatorio sobre el fichero mapeado en memoria
+    def __init__(self, path: str):
+        _leer_cabecera(path)
+        self.path = path
+        self._f = open(path, 'rb')
+        tam = os.path.getsize(path)
+        # un registro a medias al final (corte de luz, etc.) se ignora
+        self._n = (tam - CABECERA_LEN) // REGISTRO_LEN
+        self._mm = mmap.mmap(self._f.fileno(), 0, access=mmap.ACCESS_READ) if self._n else None
+
+    def __len__(self):
+        return self._n
+
+    def __getitem__(self, i: int):
+        """(t, comando, prioridad) del registro i."""
+        if i < 0:
+            i += self._n
+        if not 0 <= i < self._n:
+            raise IndexError(i)
+        t, flags, raw = _REGISTRO.unpack_from(self._mm, CABECERA_LEN + i * REGISTRO_LEN)
+        return t, raw.rstrip(b"\0").decode('ascii'), bool(flags & FLAG_PRIORIDAD)
+
+    def __iter__(self):
+        for i in range(self._n):
+            yield self[i]
+
+    def duracion(self) -> float:
+        return self[-1][0] - self[0][0] if self._n else 0.0
+
+    def cerrar(self):
+        if self._mm:
+            self._mm.close()
+            self._mm = None
+        self._f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cerrar()
+
+
+async def reproducir(enviar, grabacion: Grabacion, velocidad: float = 1.0) -> int:
+    """Vuelve a emitir los comandos con sus tiempos (velocidad 2.0 = el doble de rápido).
+
+    enviar(comando, prioridad) se llama en el loop; los tiempos se calculan sobre
+    el instante de inicio, así un retraso puntual no se acumula.
+    """
+    if velocidad <= 0:
+        raise ValueError("velocidad debe ser > 0")
+    if not len(grabacion):
+        return 0
+    loop = asyncio.get_running_loop()
+    t_primero = grabacion[0][0]
+    inicio = loop.time()
+    enviados = 0
+    for t, texto, prioridad in grabacion:
+        espera = inicio + (t - t_primero) / velocidad - loop.time()
+        if espera > 0:
+            await asyncio.sleep(espera)
+        enviar(texto, prioridad)
+        enviados += 1
+    return enviados
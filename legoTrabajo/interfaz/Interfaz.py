@@ -1,21 +1,74 @@
 # interfaz.py
 
+import os
+import queue
+import threading
+import time
 import tkinter as tk
 import customtkinter as ctk
-from queue import Queue, Empty
-from Conexion import BLEWorker
+import Cache
+import Metricas
+import Registro
+from Conexion import BLEWorker, precargar_pila_ble
+from Flota import FlotaBLE
+from Gateway import ClienteGateway
+from Muestreo import Muestreador, MUESTREO_MS
+from Entradas import PadRaton, Mando, ACEL_MAX, GIRO_MAX
+
+# Refresco de las lecturas de telemetría (independiente de la tasa del hub)
+TELEMETRIA_REFRESH_MS = 250
+LATENCIA_REFRESH_MS = 1000
+# La barra de estado sólo muestra el registro más reciente en cada tick
+LOG_REFRESH_MS = 150
+# Retraso del loop de Tk: un after() cada LAG_MS; se publica el peor de cada segundo
+LAG_MS = 100
 
 class LegoGUI(ctk.CTk):
-    def __init__(self):
+    def __init__(self, hubs=None, grupos=None, tick_ms: int = MUESTREO_MS, precargar: bool = True,
+                 gateway=None, transporte: str = "auto", sin_respuesta: bool = False,
+                 acel_max: int = ACEL_MAX, giro_max: int = GIRO_MAX, metricas: str = None):
         super().__init__()
         
-        self.title("Control LEGO Spike Prime - SP 7")
-        self.geometry("500x650")
+        # hubs: lista de nombres -> modo flota (un loop y un escaneo para todos)
+        # gateway: (host, puerto) -> cliente de un Gateway que ya tiene el enlace BLE
+        self.flota = not gateway and bool(hubs) and len(hubs) > 1
+        self.title("Control LEGO Spike Prime - " + (", ".join(hubs) if hubs else "SP 7"))
+        self.geometry("500x690")
         self.resizable(False, False)
 
-        self.log_queue = Queue()
-        self.worker = BLEWorker(self.log_queue)
+        # Registro compartido con los workers: anillo acotado + escritura a disco en segundo plano
+        self.registro = Registro.Registro(archivo=os.path.join(Cache.cache_dir(), "control.log"), eco=True)
+        self._log_seq = None
+        if gateway:
+            self.worker = ClienteGateway(self.registro, *gateway)
+        elif self.flota:
+            self.worker = FlotaBLE(self.registro, hubs, grupos, acel_max=acel_max, giro_max=giro_max)
+        else:
+            # rampas del hub para el pad y el mando (se vuelven a fijar al reconectar)
+            self.worker = BLEWorker(self.registro, hub_name=hubs[0] if hubs else "SP-7",
+                                    transporte=transporte, sin_respuesta=sin_respuesta,
+                                    acel_max=acel_max, giro_max=giro_max)
+        # Cambios de estado desde el hilo BLE: cola + despertar inmediato de Tk
+        self._estados = queue.SimpleQueue()
+        self.worker.add_state_listener(self._on_worker_state)
         self.emergency = False
+
+        # Estado de control muestreado a periodo fijo: teclas, botones y slider sólo
+        # lo modifican; el tick envía lo que el hub aún no ha confirmado
+        self.muestreo = Muestreador(self.worker, tick_ms)
+        # Entradas proporcionales (Entradas.py): pad de ratón y mando, si se abren
+        self.pad = None
+        self.mando = None
+
+        # Métricas: retraso del loop de Tk y envíos del muestreo; metricas = fichero
+        # .prom/.csv donde se vuelcan (las del enlace las registra el worker)
+        self._m_lag = Metricas.METRICAS.medidor("lego_tk_lag_ms",
+                                                "peor retraso del loop de Tk en el último segundo (ms)")
+        Metricas.METRICAS.funcion("lego_gui_envios_total", lambda: self.muestreo.enviados,
+                                  "comandos enviados por el muestreo de la GUI", "counter")
+        self._lag_max = 0.0
+        self._lag_n = 0
+        self.exportador = Metricas.Exportador(Metricas.METRICAS, metricas).start() if metricas else None
         
         # --- RASTREADOR DE ESTADO PARA EVITAR DELAY ---
         # Esto guarda si una tecla ya está siendo presionada
@@ -35,7 +88,28 @@ class LegoGUI(ctk.CTk):
         self.bind_all("<KeyRelease>", self._on_key_release)
         self.focus_set()
 
+        # Ctrl+L: exportar latencias medidas a CSV
+        self.bind_all("<Control-l>", self._dump_latency)
+        # Ctrl+G: empezar/terminar la grabación de comandos
+        self.bind_all("<Control-g>", self._toggle_recording)
+        # Ctrl+H: el hub mantiene el rumbo actual (A/D vuelven a dirección manual)
+        self.bind_all("<Control-h>", self._toggle_heading)
+        # Ctrl+P: pad proporcional con el ratón; Ctrl+J: mando (pygame)
+        self.bind_all("<Control-p>", self._toggle_pad)
+        self.bind_all("<Control-j>", self._toggle_mando)
+
+        # <<EstadoConexion>> lo genera el hilo BLE; _tkinter (con hilos) lo pasa al de Tk
+        self.bind("<<EstadoConexion>>", self._atender_estados)
+
         self._poll_logs()
+        self._tick_control()
+        self._refresh_telemetry()
+        self._refresh_latency()
+        self._medir_lag(time.perf_counter())
+
+        # Tras el primer frame: importar la pila BLE y buscar el hub en segundo plano
+        if precargar:
+            self.after_idle(self._precargar)
 
     def _build_ui(self):
         # Header
@@ -63,6 +137,16 @@ class LegoGUI(ctk.CTk):
                                          command=self.toggle_connection)
         self.btn_connect.pack(side="left")
 
+        # Selector de destino (sólo en modo flota): todos, un grupo o un hub
+        if self.flota:
+            destino_frame = ctk.CTkFrame(self, fg_color="transparent")
+            destino_frame.pack(fill="x", padx=20)
+            ctk.CTkLabel(destino_frame, text="Destino:", font=ctk.CTkFont(size=12)).pack(side="left")
+            self.opt_destino = ctk.CTkOptionMenu(destino_frame, values=self.worker.destinos(),
+                                                 width=140, command=self.worker.set_objetivo)
+            self.opt_destino.set(self.worker.objetivo)
+            self.opt_destino.pack(side="left", padx=10)
+
         # PANEL D-PAD
         self.main_frame = ctk.CTkFrame(self, fg_color="transparent")
         self.main_frame.pack(expand=True, fill="both", padx=20, pady=10)
@@ -82,15 +166,15 @@ class LegoGUI(ctk.CTk):
         self.btn_up = tk.Button(dpad_container, text="▲\nAdelante", bg=self.color_green, 
                                 activebackground="#268c3b", width=14, height=4, **btn_style)
         self.btn_up.grid(row=0, column=1, pady=10)
-        self.btn_up.bind("<ButtonPress-1>", lambda e: self.cmd_move("F"))
-        self.btn_up.bind("<ButtonRelease-1>", lambda e: self.cmd_stop_traction())
+        self.btn_up.bind("<ButtonPress-1>", lambda e: self.cmd_move("F", "btn_up"))
+        self.btn_up.bind("<ButtonRelease-1>", lambda e: self.cmd_release("btn_up"))
 
         # IZQUIERDA
         self.btn_left = tk.Button(dpad_container, text="◀", bg=self.color_blue,
                                   activebackground="#1a5cbf", width=8, height=4, **btn_style)
         self.btn_left.grid(row=1, column=0, padx=10)
-        self.btn_left.bind("<ButtonPress-1>", lambda e: self.cmd_steer("L"))
-        self.btn_left.bind("<ButtonRelease-1>", lambda e: self.cmd_steer("Z"))
+        self.btn_left.bind("<ButtonPress-1>", lambda e: self.cmd_steer("L", "btn_left"))
+        self.btn_left.bind("<ButtonRelease-1>", lambda e: self.cmd_release("btn_left"))
 
         # STOP
         self.btn_stop = tk.Button(dpad_container, text="STOP", bg=self.color_red,
@@ -102,15 +186,15 @@ class LegoGUI(ctk.CTk):
         self.btn_right = tk.Button(dpad_container, text="▶", bg=self.color_blue,
                                    activebackground="#1a5cbf", width=8, height=4, **btn_style)
         self.btn_right.grid(row=1, column=2, padx=10)
-        self.btn_right.bind("<ButtonPress-1>", lambda e: self.cmd_steer("R"))
-        self.btn_right.bind("<ButtonRelease-1>", lambda e: self.cmd_steer("Z"))
+        self.btn_right.bind("<ButtonPress-1>", lambda e: self.cmd_steer("R", "btn_right"))
+        self.btn_right.bind("<ButtonRelease-1>", lambda e: self.cmd_release("btn_right"))
 
         # ATRAS
         self.btn_down = tk.Button(dpad_container, text="▼\nAtrás", bg=self.color_yellow,
                                   activebackground="#71751f", width=14, height=4, **btn_style)
         self.btn_down.grid(row=2, column=1, pady=10)
-        self.btn_down.bind("<ButtonPress-1>", lambda e: self.cmd_move("B"))
-        self.btn_down.bind("<ButtonRelease-1>", lambda e: self.cmd_stop_traction())
+        self.btn_down.bind("<ButtonPress-1>", lambda e: self.cmd_move("B", "btn_down"))
+        self.btn_down.bind("<ButtonRelease-1>", lambda e: self.cmd_release("btn_down"))
         
         self._orig_btn_colors = {
             'up': self.btn_up.cget('bg'),
@@ -135,6 +219,11 @@ class LegoGUI(ctk.CTk):
         self.lbl_speed_val.pack(side="top") 
         self.slider.configure(command=lambda v: self.lbl_speed_val.configure(text=f"{int(v)}%"))
 
+        # Lecturas en vivo del hub (telemetría)
+        self.lbl_telemetria = ctk.CTkLabel(self.bottom_frame, text="Telemetría: -",
+                                           text_color="gray", font=ctk.CTkFont(size=11))
+        self.lbl_telemetria.pack(pady=(8, 0))
+
         self.btn_emergencia = ctk.CTkButton(self.bottom_frame, text="PARADA DE EMERGENCIA",
                                             fg_color="transparent", border_color=self.color_red, border_width=2,
                                             text_color=self.color_red, hover_color=self.color_red,
@@ -146,6 +235,11 @@ class LegoGUI(ctk.CTk):
                                      font=ctk.CTkFont(size=11), text_color="gray")
         self.status_bar.pack(side="bottom", fill="x")
 
+        # Latencia extremo a extremo (p50/p95/p99) en la barra de estado
+        self.status_latencia = ctk.CTkLabel(self, text="", anchor="e", padx=10,
+                                            font=ctk.CTkFont(size=11), text_color="gray")
+        self.status_latencia.place(in_=self.status_bar, relx=1.0, rely=0.5, anchor="e")
+
     def _set_controls_enabled(self, enabled: bool):
         state = "normal" if enabled else "disabled"
         try:
@@ -162,22 +256,30 @@ class LegoGUI(ctk.CTk):
         except:
             pass
 
-    def cmd_steer(self, action):
+    def cmd_steer(self, action, fuente="boton"):
             # CLIENTE: capa de presentación + generación de comandos
-        if self.worker.running.is_set() and not self.emergency:
-            self.worker.send_packet(action)
-
-    def cmd_move(self, direction):
-        pct = self.slider.get()
-        speed = int(pct * 10)
-        cmd = f"{direction}{speed}"
-        if self.worker.running.is_set():
-            self.worker.send_packet(cmd)
-                    # Transporte cliente -servidor (BLE): canal para enviar comandos al hub
-            self.worker = BLEWorker(self.log_queue)
-    def cmd_stop_traction(self, event=None):
-        if self.worker.running.is_set():
-            self.worker.send_packet("S")
+        if not self.emergency:
+            self.muestreo.estado.pulsar(fuente, action)
+
+    def cmd_move(self, direction, fuente="boton"):
+        if not self.emergency:
+            self.muestreo.estado.pulsar(fuente, direction)
+
+    def cmd_release(self, fuente):
+        self.muestreo.estado.soltar(fuente)
+
+    def _tick_control(self):
+        # Periodo fijo: la velocidad se lee del slider en cada tick (cambia en marcha)
+        try:
+            self.muestreo.estado.velocidad = int(self.slider.get() * 10)
+            if self.mando and not self.emergency:
+                self.mando.sondear()
+            if not self.emergency:
+                # Transporte cliente -servidor (BLE): sólo los cambios pendientes de confirmar
+                self.muestreo.tick()
+        except Exception:
+            pass
+        self.after(self.muestreo.periodo_ms, self._tick_control)
 
     # TECLADO OPTIMIZADO PARA EVITAR LAG
     def _on_key_press(self, event):
@@ -195,16 +297,16 @@ class LegoGUI(ctk.CTk):
                 self.pressed_keys[key] = True
 
             if key == "w":
-                self.cmd_move("F")
+                self.cmd_move("F", "tecla_w")
                 self.btn_up.configure(bg=self.btn_up.cget('activebackground'), relief='sunken')
             elif key == "s":
-                self.cmd_move("B")
+                self.cmd_move("B", "tecla_s")
                 self.btn_down.configure(bg=self.btn_down.cget('activebackground'), relief='sunken')
             elif key == "a":
-                self.cmd_steer("L")
+                self.cmd_steer("L", "tecla_a")
                 self.btn_left.configure(bg=self.btn_left.cget('activebackground'), relief='sunken')
             elif key == "d":
-                self.cmd_steer("R")
+                self.cmd_steer("R", "tecla_d")
                 self.btn_right.configure(bg=self.btn_right.cget('activebackground'), relief='sunken')
         except Exception:
             pass
@@ -219,15 +321,14 @@ class LegoGUI(ctk.CTk):
             # LIBERAR BLOQUEO: Permitir que se vuelva a detectar la pulsación más adelante
             if key in self.pressed_keys:
                 self.pressed_keys[key] = False
+                self.cmd_release(f"tecla_{key}")
 
             if key in ("w", "s"):
-                self.cmd_stop_traction()
                 if key == 'w':
                     self.btn_up.configure(bg=self._orig_btn_colors['up'], relief='flat')
                 else:
                     self.btn_down.configure(bg=self._orig_btn_colors['down'], relief='flat')
             elif key in ("a", "d"):
-                self.cmd_steer("Z")
                 if key == 'a':
                     self.btn_left.configure(bg=self._orig_btn_colors['left'], relief='flat')
                 else:
@@ -238,11 +339,19 @@ class LegoGUI(ctk.CTk):
     def cmd_emergency_stop(self):
         # Activate emergency stop state
         self.emergency = True
+        self.muestreo.reset()
+        for entrada in (self.pad, self.mando):
+            if entrada:
+                entrada.consigna = None  # la próxima consigna vuelve a entrar en el estado
         # Send immediate stop commands if connected
         try:
             if self.worker.running.is_set():
-                self.worker.send_packet("S")
-                self.worker.send_packet("Z")
+                # carril prioritario: se envían antes que cualquier comando pendiente
+                if self.flota:
+                    self.worker.emergency_stop()  # todos los hubs, no sólo el destino
+                else:
+                    self.worker.send_packet("S", prioridad=True)
+                    self.worker.send_packet("Z", prioridad=True)
                 # stop BLE worker to prevent further commands
                 self.worker.stop()
         except:
@@ -277,21 +386,51 @@ class LegoGUI(ctk.CTk):
         self.btn_connect.configure(state="disabled")
         self.worker.start()
 
-        def wait_ready():
-            if self.worker.running.is_set():
-                self.lbl_status.configure(text="Conectado", text_color=self.color_green)
-                self.status_indicator.configure(fg_color=self.color_green)
-                self.btn_connect.configure(text="Desconectar", state="normal", fg_color=self.color_red)
-                # Clear emergency state and re-enable controls
-                self.emergency = False
-                try:
-                    self._set_controls_enabled(True)
-                except:
-                    pass
-                self._log("¡Sistema Listo!")
-            else:
-                self.after(200, wait_ready)
-        wait_ready()
+    def _precargar(self):
+        if not isinstance(self.worker, ClienteGateway):
+            threading.Thread(target=precargar_pila_ble, daemon=True).start()
+        self.worker.prescan()
+
+    def _on_worker_state(self, state):
+        # Llamado desde el hilo BLE: sólo se encola el estado y se despierta a Tk
+        self._estados.put(state)
+        try:
+            self.event_generate("<<EstadoConexion>>", when="tail")
+        except Exception:
+            pass  # ventana cerrándose: lo recoge el tick de _poll_logs si sigue viva
+
+    def _atender_estados(self, event=None):
+        while True:
+            try:
+                state = self._estados.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                self._on_estado_conexion(state)
+            except Exception:
+                pass
+
+    def _on_estado_conexion(self, state):
+        if state == "listo":
+            self.lbl_status.configure(text="Conectado", text_color=self.color_green)
+            self.status_indicator.configure(fg_color=self.color_green)
+            self.btn_connect.configure(text="Desconectar", state="normal", fg_color=self.color_red)
+            # Clear emergency state and re-enable controls
+            self.emergency = False
+            try:
+                self._set_controls_enabled(True)
+            except:
+                pass
+            self._log("¡Sistema Listo!")
+        elif state == "reconectando":
+            # caída del enlace: el worker reconecta solo y restaura tracción/dirección
+            self.lbl_status.configure(text="Reconectando...", text_color="yellow")
+            self.status_indicator.configure(fg_color=self.color_yellow)
+        elif state == "desconectado":
+            if not self.emergency:
+                self.lbl_status.configure(text="Desconectado", text_color="gray")
+                self.status_indicator.configure(fg_color=self.color_red)
+            self.btn_connect.configure(text="Conectar", state="normal", fg_color=self.color_gray)
 
     def on_disconnect(self):
         self.worker.stop()
@@ -301,17 +440,96 @@ class LegoGUI(ctk.CTk):
         self._log("Desconectado.")
 
     def _log(self, msg: str):
+        self.registro.registrar(msg, origen="gui")
+
+    def _refresh_telemetry(self):
+        try:
+            reg = self.worker.telemetry.ultimo() if self.worker.running.is_set() else None
+            if reg:
+                self.lbl_telemetria.configure(
+                    text=(f"Bat {reg['bateria_mv'] / 1000:.2f} V | "
+                          f"Vel A/E {reg['vel_a']}/{reg['vel_e']} °/s | "
+                          f"Dir {reg['ang_c']}° | Carga {reg['carga_a']}/{reg['carga_e']} | "
+                          f"Rumbo {reg['rumbo']}°{' (fijo)' if reg['flags'] & 8 else ''}"),
+                    text_color="white")
+            else:
+                self.lbl_telemetria.configure(text="Telemetría: -", text_color="gray")
+        except: pass
+        self.after(TELEMETRIA_REFRESH_MS, self._refresh_telemetry)
+
+    def _refresh_latency(self):
         try:
-            self.status_bar.configure(text=msg)
-            print(f"[LOG] {msg}")
+            self.status_latencia.configure(text=self.worker.latency_summary())
         except: pass
+        self.after(LATENCIA_REFRESH_MS, self._refresh_latency)
+
+    def _medir_lag(self, previsto: float):
+        ahora = time.perf_counter()
+        self._lag_max = max(self._lag_max, (ahora - previsto) * 1000)
+        self._lag_n += 1
+        if self._lag_n * LAG_MS >= 1000:
+            self._m_lag.set(round(self._lag_max, 1))
+            self._lag_max = 0.0
+            self._lag_n = 0
+        self.after(LAG_MS, self._medir_lag, ahora + LAG_MS / 1000)
+
+    def _dump_latency(self, event=None):
+        path = time.strftime("latencias_%Y%m%d_%H%M%S.csv")
+        try:
+            self.worker.dump_latency_csv(path)
+            self._log(f"Latencias exportadas a {path}")
+        except Exception as e:
+            self._log(f"No se pudo exportar latencias: {e}")
+
+    def _toggle_recording(self, event=None):
+        try:
+            if self.worker.recorder:
+                self.worker.stop_recording()
+            else:
+                self.worker.start_recording(time.strftime("sesion_%Y%m%d_%H%M%S.lgr"))
+        except Exception as e:
+            self._log(f"No se pudo grabar: {e}")
+
+    def _toggle_heading(self, event=None):
+        try:
+            if not self.worker.running.is_set():
+                return
+            if self.worker.heading_hold:
+                self.worker.release_heading()
+            else:
+                self.worker.hold_heading()
+        except Exception as e:
+            self._log(f"No se pudo cambiar el modo de rumbo: {e}")
+
+    def _toggle_pad(self, event=None):
+        if self.pad and self.pad.abierto:
+            self.pad.cerrar()
+            self.pad = None
+        else:
+            self.pad = PadRaton(self, self.muestreo.estado)
+
+    def _toggle_mando(self, event=None):
+        if self.mando:
+            self.mando.cerrar()
+            self.mando = None
+            self._log("Mando desactivado.")
+            return
+        try:
+            self.mando = Mando.abrir(self.muestreo.estado)
+        except Exception as e:
+            self._log(f"No se pudo abrir el mando: {e}")
+            return
+        self._log(f"Mando: {self.mando.nombre}" if self.mando else "No hay mando (¿pygame instalado?)")
 
     def _poll_logs(self):
+        self._atender_estados()  # por si se perdió algún despertar
+        # Un solo configure por tick aunque hayan llegado cientos de registros
         try:
-            while True:
-                try:
-                    msg = self.log_queue.get_nowait()
-                    self._log(msg)
-                except Empty: break
+            reg = self.registro.ultimo(Registro.INFO)
+            if reg and (reg[0], reg[5]) != self._log_seq:
+                self._log_seq = (reg[0], reg[5])
+                color = {Registro.AVISO: self.color_yellow, Registro.ERROR: self.color_red}.get(reg[2], "gray")
+                texto = reg[4] if reg[5] == 1 else f"{reg[4]} (x{reg[5]})"
+                self.status_bar.configure(text=texto, text_color=color)
         except: pass
-        self.after(150, self._poll_logs)
\ No newline at end of file
+        self.after(LOG_REFRESH_MS, self._poll_logs)
\ No newline at end of file
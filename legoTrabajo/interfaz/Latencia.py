@@ -0,0 +1,103 @@
+# Latencia.py
+# Rol arquitectura: CLIENTE (PC) — mide cuánto tarda cada comando en cada etapa
+# del enlace, desde la GUI hasta el ack del hub:
+#   gui   : send_packet() en el hilo de Tk -> encolado en el loop BLE
+#   cola  : encolado -> sale de la cola
+#   gatt  : duración del write al hub
+#   ack   : fin del write -> ack "K<seq>" del hub
+#   total : send_packet() -> ack
+# Los tiempos usan time.perf_counter() (monotónico y de alta resolución;
+# time.monotonic() en Windows sólo resuelve ~15 ms).
+
+import csv
+import math
+import threading
+from collections import deque
+
+ETAPAS = ("gui", "cola", "gatt", "ack", "total")
+
+# Cubetas logarítmicas: 0.05 ms .. ~11 s con ~8 % de resolución
+_MIN_MS = 0.05
+_FACTOR = 1.08
+_N_CUBETAS = 160
+_LOG_FACTOR = math.log(_FACTOR)
+
+
+class Histograma:
+    def __init__(self):
+        self.cubetas = [0] * _N_CUBETAS
+        self.n = 0
+        self.max = 0.0
+
+    def registrar(self, ms: float):
+        if ms <= _MIN_MS:
+            i = 0
+        else:
+            i = min(_N_CUBETAS - 1, int(math.log(ms / _MIN_MS) / _LOG_FACTOR) + 1)
+        self.cubetas[i] += 1
+        self.n += 1
+        if ms > self.max:
+            self.max = ms
+
+    def percentil(self, p: float) -> float:
+        """Límite superior (ms) de la cubeta que contiene el percentil p (0-100)."""
+        if not self.n:
+            return 0.0
+        objetivo = math.ceil(self.n * p / 100)
+        acumulado = 0
+        for i, c in enumerate(self.cubetas):
+            acumulado += c
+            if acumulado >= objetivo:
+                return min(_MIN_MS * _FACTOR ** i, self.max)
+        return self.max
+
+    def reset(self):
+        self.cubetas = [0] * _N_CUBETAS
+        self.n = 0
+        self.max = 0.0
+
+
+class RegistroLatencias:
+    # Histogramas por etapa + las últimas muestras por comando para exportar a CSV
+    def __init__(self, max_muestras: int = 4096):
+        self.hist = {e: Histograma() for e in ETAPAS}
+        self.muestras = deque(maxlen=max_muestras)
+        self._lock = threading.Lock()
+
+    def registrar(self, seq: int, cmd: str, etapas: dict):
+        with self._lock:
+            for e, ms in etapas.items():
+                self.hist[e].registrar(ms)
+            self.muestras.append((seq, cmd, *(round(etapas.get(e, 0.0), 3) for e in ETAPAS)))
+
+    def percentiles(self, etapa: str = "total"):
+        with self._lock:
+            h = self.hist[etapa]
+            return h.percentil(50), h.percentil(95), h.percentil(99)
+
+    def resumen(self) -> str:
+        with self._lock:
+            if not self.hist["total"].n:
+                return ""
+        p50, p95, p99 = self.percentiles("total")
+        return f"Latencia p50/p95/p99: {p50:.0f}/{p95:.0f}/{p99:.0f} ms"
+
+    def reset(self):
+        with self._lock:
+            for h in self.hist.values():
+                h.reset()
+            self.muestras.clear()
+
+    def dump_csv(self, path: str):
+        with self._lock:
+            filas = list(self.muestras)
+            resumen = [(e, h.n, h.percentil(50), h.percentil(95), h.percentil(99), h.max)
+                       for e, h in self.hist.items()]
+        with open(path, 'w', newline='', encoding='utf-8') as f:
+            w = csv.writer(f)
+            w.writerow(["seq", "cmd", *(f"{e}_ms" for e in ETAPAS)])
+            w.writerows(filas)
+            w.writerow([])
+            w.writerow(["etapa", "n", "p50_ms", "p95_ms", "p99_ms", "max_ms"])
+            for fila in resumen:
+                w.writerow([fila[0], fila[1], *(round(x, 3) for x in fila[2:])])
@@ -1,19 +1,83 @@
 # main.py
 
+import time
+T_INICIO = time.perf_counter()  # antes de cualquier import pesado (ver --medir-arranque)
+
+import argparse
+import os
 import customtkinter as ctk
+import Cache
 from Interfaz import LegoGUI
+from Muestreo import MUESTREO_MS
+from Conexion import TRANSPORTES
+from Entradas import ACEL_MAX, GIRO_MAX
+T_IMPORTS = time.perf_counter()
 
 # Configuración global de CustomTkinter
 ctk.set_appearance_mode("Dark")
 ctk.set_default_color_theme("blue")
 
+
+def _medir_y_salir(app):
+    # Primer frame dibujado: se informa el tiempo y se cierra (lo usa medir_arranque.py)
+    app.update_idletasks()
+    imports_ms = (T_IMPORTS - T_INICIO) * 1000
+    frame_ms = (time.perf_counter() - T_INICIO) * 1000
+    print(f"ARRANQUE imports_ms={imports_ms:.0f} primer_frame_ms={frame_ms:.0f}", flush=True)
+    app.after(0, app.destroy)
+
+
 if __name__ == '__main__':
-    app = LegoGUI()
+    ap = argparse.ArgumentParser(description="Control LEGO Spike Prime")
+    ap.add_argument("--flota", help="hubs a controlar a la vez, separados por comas (p. ej. SP-7,SP-8)")
+    ap.add_argument("--grupo", action="append", default=[],
+                    help="grupo de la flota: nombre=HUB1,HUB2 (repetible)")
+    ap.add_argument("--tick-ms", dest="tick_ms", type=int, default=MUESTREO_MS,
+                    help="periodo de muestreo del control (ms)")
+    ap.add_argument("--transporte", choices=TRANSPORTES, default="auto",
+                    help="auto = USB si hay un hub enchufado, si no BLE")
+    ap.add_argument("--rapido", action="store_true",
+                    help="writes BLE sin respuesta (más comandos/s; lo perdido se reenvía)")
+    ap.add_argument("--acel-max", dest="acel_max", type=int, default=ACEL_MAX,
+                    help="aceleración máxima del hub con el pad o el mando (°/s², 0 = sin límite)")
+    ap.add_argument("--giro-max", dest="giro_max", type=int, default=GIRO_MAX,
+                    help="velocidad máxima de la dirección con el pad o el mando (°/s, 0 = sin límite)")
+    ap.add_argument("--gateway", metavar="HOST:PUERTO",
+                    help="conducir a través de un Gateway.py (el hub lo comparten varios clientes)")
+    ap.add_argument("--metricas", metavar="RUTA",
+                    default=os.path.join(Cache.cache_dir(), "metricas.prom"),
+                    help="métricas del enlace cada 5 s: .prom (Prometheus) o .csv (rotado)")
+    ap.add_argument("--sin-metricas", dest="sin_metricas", action="store_true",
+                    help="no volcar métricas a disco")
+    ap.add_argument("--medir-arranque", dest="medir_arranque", action="store_true",
+                    help="imprime el tiempo hasta el primer frame y sale")
+    args = ap.parse_args()
+
+    hubs = [h.strip() for h in args.flota.split(",") if h.strip()] if args.flota else None
+    grupos = {}
+    for g in args.grupo:
+        nombre, _, miembros = g.partition("=")
+        grupos[nombre] = [m.strip() for m in miembros.split(",") if m.strip()]
+
+    gateway = None
+    if args.gateway:
+        host, _, puerto = args.gateway.rpartition(":")
+        gateway = (host or "127.0.0.1", int(puerto))
+
+    app = LegoGUI(hubs, grupos, args.tick_ms, precargar=not args.medir_arranque, gateway=gateway,
+                  transporte=args.transporte, sin_respuesta=args.rapido,
+                  acel_max=args.acel_max, giro_max=args.giro_max,
+                  metricas=None if args.sin_metricas or args.medir_arranque else args.metricas)
+    if args.medir_arranque:
+        app.after_idle(_medir_y_salir, app)
     try:
         app.mainloop()
     finally:
         # Cierre limpio
         try:
-            app.worker.stop()
+            app.worker.close()
         except Exception:
-            pass
\ No newline at end of file
+            pass
+        if app.exportador:
+            app.exportador.stop()
+        app.registro.cerrar()
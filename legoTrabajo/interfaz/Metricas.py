@@ -0,0 +1,220 @@
+# Metricas.py
+# Rol arquitectura: CLIENTE (PC) — registro de métricas del enlace (contadores
+# y medidores) con volcado periódico a disco, para ver la salud del enlace en
+# campo sin perfilador. El camino caliente no paga casi nada: un contador es
+# un "+= n" sobre un atributo, y lo que ya se cuenta en otro sitio (cola,
+# writes, histogramas...) se registra como función y sólo se lee al exportar.
+#
+#   m = Metricas.METRICAS.contador("ble_bytes_tx", "bytes escritos", hub="SP-7")
+#   m.inc(20)
+#   Metricas.METRICAS.funcion("cola_profundidad", lambda: len(cola), hub="SP-7")
+#   Metricas.Exportador(Metricas.METRICAS, "metricas.prom").start()
+#
+# Formatos (por la extensión del fichero):
+#   .prom  texto de Prometheus, reescrito entero en cada volcado (atómico, para
+#          el textfile collector de node_exporter)
+#   .csv   una fila por métrica y volcado (t, metrica, etiquetas, valor); al
+#          superar max_bytes se rota a .1, .2... (COPIAS ficheros antiguos)
+
+import os
+import threading
+import time
+
+PERIODO_S = 5.0
+MAX_BYTES = 1 << 20
+COPIAS = 3
+
+
+class Contador:
+    __slots__ = ("nombre", "ayuda", "etiquetas", "valor")
+    tipo = "counter"
+
+    def __init__(self, nombre: str, ayuda: str = "", etiquetas: tuple = ()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = etiquetas
+        self.valor = 0
+
+    def inc(self, n=1):
+        self.valor += n
+
+    def leer(self):
+        return self.valor
+
+
+class Medidor(Contador):
+    __slots__ = ()
+    tipo = "gauge"
+
+    def set(self, valor):
+        self.valor = valor
+
+
+class _Funcion:
+    # Métrica calculada al exportar (coste cero fuera del volcado)
+    __slots__ = ("nombre", "ayuda", "etiquetas", "tipo", "fn")
+
+    def __init__(self, nombre: str, fn, ayuda: str, etiquetas: tuple, tipo: str):
+        self.nombre = nombre
+        self.fn = fn
+        self.ayuda = ayuda
+        self.etiquetas = etiquetas
+        self.tipo = tipo
+
+    def leer(self):
+        return self.fn()
+
+
+class RegistroMetricas:
+    def __init__(self):
+        self._metricas = {}  # (nombre, etiquetas) -> métrica
+        self._lock = threading.Lock()
+
+    def _obtener(self, clase, nombre, ayuda, etiquetas):
+        clave = (nombre, tuple(sorted(etiquetas.items())))
+        with self._lock:
+            m = self._metricas.get(clave)
+            if m is None or type(m) is not clase:
+                m = clase(nombre, ayuda, clave[1])
+                self._metricas[clave] = m
+            return m
+
+    def contador(self, nombre: str, ayuda: str = "", **etiquetas) -> Contador:
+        """Contador creciente; si ya existe con esas etiquetas se reutiliza."""
+        return self._obtener(Contador, nombre, ayuda, etiquetas)
+
+    def medidor(self, nombre: str, ayuda: str = "", **etiquetas) -> Medidor:
+        return self._obtener(Medidor, nombre, ayuda, etiquetas)
+
+    def funcion(self, nombre: str, fn, ayuda: str = "", tipo: str = "gauge", **etiquetas):
+        """Métrica leída con fn() en cada volcado; una nueva con las mismas etiquetas la sustituye."""
+        clave = (nombre, tuple(sorted(etiquetas.items())))
+        with self._lock:
+            self._metricas[clave] = _Funcion(nombre, fn, ayuda, clave[1], tipo)
+
+    def quitar(self, **etiquetas):
+        # Quita todas las métricas con estas etiquetas (p. ej. las de un hub que ya no está)
+        buscadas = set(etiquetas.items())
+        with self._lock:
+            for clave in [c for c in self._metricas if buscadas <= set(c[1])]:
+                del self._metricas[clave]
+
+    def muestra(self):
+        """[(métrica, valor)] ordenado por nombre; las funciones que fallan se omiten."""
+        with self._lock:
+            metricas = sorted(self._metricas.values(), key=lambda m: (m.nombre, m.etiquetas))
+        filas = []
+        for m in metricas:
+            try:
+                valor = m.leer()
+            except Exception:
+                continue
+            if valor is not None:
+                filas.append((m, valor))
+        return filas
+
+    def prometheus(self) -> str:
+        lineas = []
+        previo = None
+        for m, valor in self.muestra():
+            if m.nombre != previo:
+                previo = m.nombre
+                if m.ayuda:
+                    lineas.append(f"# HELP {m.nombre} {m.ayuda}")
+                lineas.append(f"# TYPE {m.nombre} {m.tipo}")
+            lineas.append(f"{m.nombre}{_etiquetas(m.etiquetas)} {_numero(valor)}")
+        return "\n".join(lineas) + "\n"
+
+
+def _escapar(valor) -> str:
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _etiquetas(etiquetas: tuple) -> str:
+    if not etiquetas:
+        return ""
+    pares = ",".join(f'{k}="{_escapar(v)}"' for k, v in etiquetas)
+    return "{" + pares + "}"
+
+
+def _numero(valor) -> str:
+    if isinstance(valor, float):
+        return f"{valor:.3f}".rstrip("0").rstrip(".")
+    return str(int(valor))
+
+
+# Registro compartido por Conexion, Interfaz, Flota...
+METRICAS = RegistroMetricas()
+
+
+class Exportador:
+    """Vuelca un RegistroMetricas cada periodo_s desde un hilo propio."""
+
+    def __init__(self, registro: RegistroMetricas, path: str, periodo_s: float = PERIODO_S,
+                 max_bytes: int = MAX_BYTES, copias: int = COPIAS):
+        self.registro = registro
+        self.path = path
+        self.periodo_s = periodo_s
+        self.max_bytes = max_bytes
+        self.copias = copias
+        self.csv = path.lower().endswith(".csv")
+        self.volcados = 0
+        self.errores = 0
+        self._fin = threading.Event()
+        self._hilo = None
+
+    def start(self):
+        if self._hilo is None:
+            self._hilo = threading.Thread(target=self._bucle, daemon=True)
+            self._hilo.start()
+        return self
+
+    def stop(self, timeout: float = 2.0):
+        self._fin.set()
+        if self._hilo:
+            self._hilo.join(timeout)
+            self._hilo = None
+        self.volcar()  # último estado al cerrar
+
+    def _bucle(self):
+        while not self._fin.wait(self.periodo_s):
+            self.volcar()
+
+    def volcar(self):
+        try:
+            if self.csv:
+                self._volcar_csv()
+            else:
+                self._volcar_prometheus()
+            self.volcados += 1
+        except OSError:
+            self.errores += 1  # disco lleno o sin permiso: se reintenta en el próximo
+
+    def _volcar_prometheus(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.registro.prometheus())
+        os.replace(tmp, self.path)
+
+    def _volcar_csv(self):
+        self._rotar()
+        nuevo = not os.path.exists(self.path)
+        t = time.strftime("%Y-%m-%dT%H:%M:%S")
+        with open(self.path, "a", encoding="utf-8") as f:
+            if nuevo:
+                f.write("t,metrica,etiquetas,valor\n")
+            for m, valor in self.registro.muestra():
+                etiquetas = ";".join(f"{k}={v}" for k, v in m.etiquetas)
+                f.write(f"{t},{m.nombre},{etiquetas},{_numero(valor)}\n")
+
+    def _rotar(self):
+        try:
+            if os.path.getsize(self.path) < self.max_bytes:
+                return
+        except OSError:
+            return
+        for i in range(self.copias - 1, 0, -1):
+            origen = f"{self.path}.{i}"
+            if os.path.exists(origen):
+                os.replace(origen, f"{self.path}.{i + 1}")
+        os.replace(self.path, f"{self.path}.1")
@@ -0,0 +1,93 @@
+# Muestreo.py
+# Rol arquitectura: CLIENTE (PC) — modelo del estado de control (tracción,
+# sentido y dirección) que alimentan teclas, botones y el slider. Un tick de
+# periodo fijo lo muestrea y sólo envía lo que difiere del último estado que el
+# hub confirmó (ack). El tráfico depende del periodo, no de lo rápido que se
+# pulsen las teclas, y mover el slider en marcha cambia la velocidad.
+# Las fuentes proporcionales (Entradas.py: pad, mando) dan consignas U/W; las
+# teclas y botones pulsados tienen preferencia sobre ellas.
+
+import time
+
+# Periodo de muestreo por defecto (ms)
+MUESTREO_MS = 50
+# Sin ack en este tiempo, el comando en vuelo se vuelve a enviar
+REENVIO_S = 0.3
+
+
+class EstadoControl:
+    # Entradas activas por fuente ("tecla_w", "btn_up"...): la última pulsada manda
+    def __init__(self):
+        self._traccion = {}   # fuente -> "F" / "B"
+        self._direccion = {}  # fuente -> "L" / "R"
+        self._proporcional = {}  # fuente -> (velocidad con signo, ángulo)
+        self.velocidad = 500  # 0..1000 (grados/s)
+
+    def pulsar(self, fuente: str, accion: str):
+        destino = self._traccion if accion in ("F", "B") else self._direccion
+        destino.pop(fuente, None)
+        destino[fuente] = accion
+
+    def proporcional(self, fuente: str, velocidad: int, angulo: int):
+        self._proporcional.pop(fuente, None)
+        self._proporcional[fuente] = (int(velocidad), int(angulo))
+
+    def soltar(self, fuente: str):
+        self._traccion.pop(fuente, None)
+        self._direccion.pop(fuente, None)
+        self._proporcional.pop(fuente, None)
+
+    def reset(self):
+        self._traccion.clear()
+        self._direccion.clear()
+        self._proporcional.clear()
+
+    def comandos(self) -> dict:
+        """Comando deseado por canal, p. ej. {"traccion": "F500", "direccion": "Z"}."""
+        prop = next(reversed(self._proporcional.values())) if self._proporcional else None
+        if self._traccion:
+            sentido = next(reversed(self._traccion.values()))
+            traccion = f"{sentido}{self.velocidad}" if self.velocidad > 0 else "S"
+        elif prop:
+            traccion = f"U{prop[0]}"
+        else:
+            traccion = "S"
+        if self._direccion:
+            direccion = next(reversed(self._direccion.values()))
+        elif prop:
+            direccion = f"W{prop[1]}"
+        else:
+            direccion = "Z"
+        return {"traccion": traccion, "direccion": direccion}
+
+
+class Muestreador:
+    def __init__(self, worker, periodo_ms: int = MUESTREO_MS, reenvio_s: float = REENVIO_S):
+        self.worker = worker
+        self.periodo_ms = periodo_ms
+        self.reenvio_s = reenvio_s
+        self.estado = EstadoControl()
+        self._en_vuelo = {}  # canal -> (comando, instante de envío)
+        self.ticks = 0
+        self.enviados = 0
+
+    def reset(self):
+        self.estado.reset()
+        self._en_vuelo.clear()
+
+    def tick(self):
+        self.ticks += 1
+        if not self.worker.running.is_set():
+            self._en_vuelo.clear()
+            return
+        ahora = time.monotonic()
+        for canal, deseado in self.estado.comandos().items():
+            if self.worker.estado_confirmado(canal) == deseado:
+                self._en_vuelo.pop(canal, None)
+                continue
+            vuelo = self._en_vuelo.get(canal)
+            if vuelo and vuelo[0] == deseado and ahora - vuelo[1] < self.reenvio_s:
+                continue  # ya enviado, esperando el ack
+            self.worker.send_packet(deseado)
+            self._en_vuelo[canal] = (deseado, ahora)
+            self.enviados += 1
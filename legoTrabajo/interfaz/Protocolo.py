@@ -0,0 +1,76 @@
+# Protocolo.py
+# Rol arquitectura: codificación de los comandos CLIENTE → SERVIDOR (PC → Hub).
+# El hub entiende dos formatos:
+#   v1 (texto):   "F500;"  -> acción + valor ASCII terminado en ';'
+#   v2 (binario): marco fijo de 6 bytes, sin strings en el hub
+#                 [0xA5][opcode][valor int16 LE][seq][checksum]
+# Con la capacidad ACK el hub confirma el último seq procesado ("K<seq>");
+# en texto el seq va tras '@': "F500@12;".
+# El hub anuncia su versión en la línea READY y el PC elige el formato.
+
+import struct
+
+PROTO_TEXTO = 1
+PROTO_BINARIO = 2
+
+MARCO_INICIO = 0xA5
+_MARCO = struct.Struct("<BBhB")  # inicio, opcode, valor, seq
+MARCO_LEN = _MARCO.size + 1      # + checksum
+
+VALOR_MIN = -32768
+VALOR_MAX = 32767
+
+
+def parse_texto(cmd: str):
+    """Convierte "F500" en (ord('F'), 500). Lanza ValueError si no es válido.
+
+    Un valor fuera de int16 no se recorta: el parser de texto del hub no lo
+    hace, y el mismo comando debe mover igual el coche en los dos formatos.
+    """
+    cmd = cmd.strip()
+    if not cmd:
+        raise ValueError("comando vacío")
+    val_part = cmd[1:]
+    valor = int(val_part) if val_part else 0
+    if not VALOR_MIN <= valor <= VALOR_MAX:
+        raise ValueError(f"valor fuera de rango en {cmd!r}")
+    return ord(cmd[0]), valor
+
+
+def checksum(op: int, valor: int, seq: int) -> int:
+    lo = valor & 0xFF
+    hi = (valor >> 8) & 0xFF
+    return (op + lo + hi + seq) & 0xFF
+
+
+def codificar_marco(op: int, valor: int, seq: int) -> bytes:
+    seq &= 0xFF
+    return _MARCO.pack(MARCO_INICIO, op, valor, seq) + bytes([checksum(op, valor, seq)])
+
+
+def codificar_texto(cmd: str) -> bytes:
+    return f"{cmd};".encode('utf-8')
+
+
+class Codificador:
+    # Traduce los comandos de texto de la GUI al formato negociado con el hub
+    def __init__(self):
+        self.version = PROTO_TEXTO
+        self.ack = False
+        self.seq = 0
+
+    def reset(self):
+        self.version = PROTO_TEXTO
+        self.ack = False
+        self.seq = 0
+
+    def codificar(self, cmd: str) -> bytes:
+        # Tras codificar, self.seq es el número de secuencia del comando
+        if self.version < PROTO_BINARIO:
+            if not self.ack:
+                return codificar_texto(cmd)
+            self.seq = (self.seq + 1) & 0xFF
+            return codificar_texto(f"{cmd}@{self.seq}")
+        op, valor = parse_texto(cmd)
+        self.seq = (self.seq + 1) & 0xFF
+        return codificar_marco(op, valor, self.seq)
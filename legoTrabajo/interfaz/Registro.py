@@ -0,0 +1,141 @@
+# Registro.py
+# Rol arquitectura: CLIENTE (PC) — registro estructurado compartido por la GUI y
+# los workers BLE. Registrar es barato desde cualquier hilo (se añade a un anillo
+# acotado); la escritura a disco y el eco a consola se hacen por lotes en un hilo
+# aparte, y la GUI sólo lee el registro más reciente en cada tick.
+#
+# Compatible con la Queue que usaban los workers: registro.put(msg).
+
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+DEBUG = 10
+INFO = 20
+AVISO = 30
+ERROR = 40
+NOMBRES = {DEBUG: "DEBUG", INFO: "INFO", AVISO: "AVISO", ERROR: "ERROR"}
+
+# Escritura en segundo plano
+PERIODO_ESCRITURA_S = 0.5
+MAX_LINEAS_S = 200           # tope por segundo en disco/consola; el resto se cuenta
+MAX_BYTES_ARCHIVO = 1 << 20  # al abrir, si el log supera 1 MB se rota a .1
+
+
+class Registro:
+    def __init__(self, capacidad: int = 1000, archivo: str = None, eco: bool = False,
+                 nivel_archivo: int = DEBUG):
+        # Cada registro: [seq, t, nivel, origen, msg, repeticiones]
+        self._anillo = deque(maxlen=capacidad)
+        self._ultimo_nivel = {}  # nivel -> último registro (no lo desaloja una ráfaga de DEBUG)
+        self._pendientes = deque(maxlen=capacidad)  # aún sin escribir a disco/consola
+        self._lock = threading.Lock()
+        self.seq = 0
+        self.perdidos = 0       # registros que no llegaron a escribirse (anillo lleno o tope)
+        self.archivo = archivo
+        self.eco = eco
+        self.nivel_archivo = nivel_archivo
+        self._despertar = threading.Event()
+        self._fin = False
+        self._hilo = None
+        if archivo or eco:
+            self._hilo = threading.Thread(target=self._escritor, daemon=True)
+            self._hilo.start()
+
+    # --- productores (cualquier hilo) ---
+    def registrar(self, msg: str, nivel: int = INFO, origen: str = ""):
+        with self._lock:
+            ultimo = self._anillo[-1] if self._anillo else None
+            if ultimo and ultimo[4] == msg and ultimo[2] == nivel and ultimo[3] == origen:
+                # tormenta de mensajes iguales: se cuentan en vez de repetirse
+                ultimo[5] += 1
+                ultimo[1] = time.time()
+                return
+            self.seq += 1
+            reg = [self.seq, time.time(), nivel, origen, msg, 1]
+            self._anillo.append(reg)
+            self._ultimo_nivel[nivel] = reg
+            if self._hilo and nivel >= self.nivel_archivo:
+                if len(self._pendientes) == self._pendientes.maxlen:
+                    self.perdidos += 1
+                self._pendientes.append(reg)
+        if nivel >= ERROR:
+            self._despertar.set()
+
+    def put(self, msg: str):
+        self.registrar(msg)
+
+    # --- consumidores ---
+    def ultimo(self, nivel_min: int = INFO):
+        """Registro más reciente con nivel >= nivel_min (o None)."""
+        with self._lock:
+            regs = [r for n, r in self._ultimo_nivel.items() if n >= nivel_min]
+            return tuple(max(regs, key=lambda r: r[0])) if regs else None
+
+    def recientes(self, n: int = 50, nivel_min: int = DEBUG):
+        with self._lock:
+            regs = [tuple(r) for r in self._anillo if r[2] >= nivel_min]
+        return regs[-n:]
+
+    @staticmethod
+    def formatear(reg) -> str:
+        seq, t, nivel, origen, msg, rep = reg
+        marca = time.strftime("%H:%M:%S", time.localtime(t)) + f".{int(t * 1000) % 1000:03d}"
+        texto = f"{marca} {NOMBRES.get(nivel, nivel):5} {f'[{origen}] ' if origen else ''}{msg}"
+        return texto + (f" (x{rep})" if rep > 1 else "")
+
+    # --- escritura en segundo plano ---
+    def _abrir(self):
+        if not self.archivo:
+            return None
+        try:
+            if os.path.getsize(self.archivo) > MAX_BYTES_ARCHIVO:
+                os.replace(self.archivo, self.archivo + ".1")
+        except OSError:
+            pass
+        try:
+            return open(self.archivo, 'a', encoding='utf-8')
+        except OSError:
+            return None
+
+    def _escritor(self):
+        f = self._abrir()
+        while True:
+            self._despertar.wait(PERIODO_ESCRITURA_S)
+            self._despertar.clear()
+            with self._lock:
+                lote = list(self._pendientes)
+                self._pendientes.clear()
+                omitidos = max(0, len(lote) - int(MAX_LINEAS_S * PERIODO_ESCRITURA_S))
+                if omitidos:
+                    self.perdidos += omitidos
+                    # se conservan los errores y los más recientes
+                    errores = [r for r in lote[:omitidos] if r[2] >= ERROR]
+                    lote = errores + lote[omitidos:]
+            if lote:
+                lineas = "\n".join(self.formatear(tuple(r)) for r in lote) + "\n"
+                if omitidos:
+                    lineas += f"... {omitidos} registros omitidos\n"
+                if f:
+                    try:
+                        f.write(lineas)
+                        f.flush()
+                    except OSError:
+                        pass
+                if self.eco and sys.stdout:  # sin consola en el .exe (windowed)
+                    try:
+                        sys.stdout.write(lineas)
+                    except (OSError, ValueError):
+                        pass
+            if self._fin:
+                break
+        if f:
+            f.close()
+
+    def cerrar(self):
+        if self._hilo and self._hilo.is_alive():
+            self._fin = True
+            self._despertar.set()
+            self._hilo.join(2.0)
@@ -0,0 +1,573 @@
+# Simulador.py
+# Rol arquitectura: HUB SIMULADO (PC) — sustituto local del hub SP-7 para
+# probar BLEWorker y el LISTENER_SCRIPT sin hardware ni BLE.
+#
+# - HubSimulado implementa la parte de PybricksHubBLE que usa BLEWorker
+#   (connect, run, write, disconnect, stdout_observable...).
+# - El LISTENER_SCRIPT se ejecuta con CPython en un hilo propio, con módulos
+#   pybricks / usys / uselect / ustruct simulados (sin tocar sys.modules, así
+#   pueden convivir varios hubs simulados).
+# - El enlace tiene latencia, MTU y pérdida configurables. write_gatt_char sin
+#   respuesta vuelve en cuanto el paquete sale (SIN_RESPUESTA_POR_INTERVALO
+#   paquetes por latencia) y llega al hub media latencia después.
+# - HubSimuladoUSB hace de hub enchufado por cable (write sin GATT, paquete de
+#   64 bytes); con fabrica(usb=evento) el "cable" se enchufa y desenchufa
+#   poniendo y quitando el evento, para probar la selección de transporte.
+#
+# Uso:
+#   worker = BLEWorker(log_queue, hub_factory=Simulador.fabrica(latencia_ms=15))
+
+import asyncio
+import builtins
+import math
+import random
+import struct
+import threading
+import time
+import types
+from collections import deque
+
+
+class _Detener(BaseException):
+    # Se lanza dentro del script simulado para terminarlo
+    pass
+
+
+class Sujeto:
+    # Mínimo equivalente a reactivex Subject/BehaviorSubject (subscribe/on_next/value)
+    def __init__(self, valor=None):
+        self.value = valor
+        self._subs = []
+
+    def subscribe(self, fn):
+        self._subs.append(fn)
+        sujeto = self
+
+        class _Suscripcion:
+            def dispose(self):
+                if fn in sujeto._subs:
+                    sujeto._subs.remove(fn)
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                self.dispose()
+
+        return _Suscripcion()
+
+    def on_next(self, valor):
+        self.value = valor
+        for fn in list(self._subs):
+            fn(valor)
+
+
+# --- HARDWARE SIMULADO ---
+
+class MotorSimulado:
+    def __init__(self, port):
+        self.port = port
+        self._lock = threading.Lock()
+        self._angulo = 0.0
+        self._vel = 0.0        # °/s actual
+        self._objetivo = None  # ángulo objetivo de run_target
+        self._t = time.perf_counter()
+        self.comandos = 0      # llamadas que cambian la consigna
+
+    def _avanzar(self):
+        ahora = time.perf_counter()
+        dt = ahora - self._t
+        self._t = ahora
+        if self._objetivo is not None:
+            paso = abs(self._vel) * dt
+            falta = self._objetivo - self._angulo
+            if abs(falta) <= paso:
+                self._angulo = self._objetivo
+                self._objetivo = None
+                self._vel = 0.0
+            else:
+                self._angulo += paso if falta > 0 else -paso
+        else:
+            self._angulo += self._vel * dt
+
+    def run(self, speed):
+        with self._lock:
+            self._avanzar()
+            self._objetivo = None
+            self._vel = float(speed)
+            self.comandos += 1
+
+    def stop(self):
+        with self._lock:
+            self._avanzar()
+            self._objetivo = None
+            self._vel = 0.0
+            self.comandos += 1
+
+    brake = stop
+    hold = stop
+
+    def run_target(self, speed, target_angle, then=None, wait=True):
+        with self._lock:
+            self._avanzar()
+            self._objetivo = float(target_angle)
+            self._vel = abs(float(speed))
+            self.comandos += 1
+
+    def reset_angle(self, angle=0):
+        with self._lock:
+            self._avanzar()
+            self._angulo = float(angle)
+
+    def angle(self):
+        with self._lock:
+            self._avanzar()
+            return int(self._angulo)
+
+    def speed(self):
+        with self._lock:
+            self._avanzar()
+            if self._objetivo is not None:
+                return int(self._vel if self._objetivo >= self._angulo else -self._vel)
+            return int(self._vel)
+
+    def load(self):
+        return 0
+
+
+class _Luz:
+    def __init__(self):
+        self.color = None
+
+    def on(self, color):
+        self.color = color
+
+    def off(self):
+        self.color = None
+
+
+class _Bateria:
+    def voltage(self):
+        return 8200
+
+    def current(self):
+        return 150
+
+
+# Cinemática del coche para la IMU simulada (modelo de bicicleta)
+RUEDA_MM = 56          # diámetro de rueda SPIKE
+ENTRE_EJES_MM = 120
+
+
+class _IMU:
+    # El rumbo se integra con la velocidad de A y el ángulo de la dirección (C).
+    # deriva: °/s de giro parásito (ruedas desiguales, suelo inclinado...)
+    def __init__(self, motores: dict = None, deriva: float = 0.0):
+        self._motores = motores if motores is not None else {}
+        self.deriva = deriva
+        self._rumbo = 0.0
+        self._tasa = 0.0
+        self._t = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def _avanzar(self):
+        ahora = time.perf_counter()
+        dt = ahora - self._t
+        self._t = ahora
+        traccion = self._motores.get("A")
+        direccion = self._motores.get("C")
+        tasa = 0.0
+        if traccion is not None:
+            v_mm = traccion.speed() / 360 * math.pi * RUEDA_MM
+            angulo = math.radians(direccion.angle()) if direccion is not None else 0.0
+            tasa = math.degrees(v_mm / ENTRE_EJES_MM * math.tan(angulo))
+            if v_mm:
+                tasa += self.deriva
+        self._tasa = tasa
+        self._rumbo += tasa * dt
+
+    def heading(self):
+        with self._lock:
+            self._avanzar()
+            return self._rumbo
+
+    def reset_heading(self, angle):
+        with self._lock:
+            self._avanzar()
+            self._rumbo = float(angle)
+
+    def tilt(self):
+        return 0, 0
+
+    def angular_velocity(self, axis=None):
+        with self._lock:
+            self._avanzar()
+            # eje Z antihorario positivo, al revés que el rumbo
+            return -self._tasa if axis is not None else (0.0, 0.0, -self._tasa)
+
+
+class PrimeHubSimulado:
+    def __init__(self, motores: dict = None, deriva: float = 0.0):
+        self.light = _Luz()
+        self.battery = _Bateria()
+        self.imu = _IMU(motores, deriva)
+
+
+class _StopWatch:
+    def __init__(self):
+        self._t0 = time.perf_counter()
+        self._pausa = None
+
+    def time(self):
+        fin = self._pausa if self._pausa is not None else time.perf_counter()
+        return int((fin - self._t0) * 1000)
+
+    def reset(self):
+        self._t0 = time.perf_counter()
+        if self._pausa is not None:
+            self._pausa = self._t0
+
+    def pause(self):
+        if self._pausa is None:
+            self._pausa = time.perf_counter()
+
+    def resume(self):
+        if self._pausa is not None:
+            self._t0 += time.perf_counter() - self._pausa
+            self._pausa = None
+
+
+# --- STDIO SIMULADO ---
+
+class _Entrada:
+    # stdin del hub: tubería de bytes alimentada por HubSimulado.write()
+    def __init__(self, detener: threading.Event):
+        self._datos = bytearray()
+        self._cond = threading.Condition()
+        self._detener = detener
+        self.buffer = self
+        self.llegadas = deque()  # instantes de llegada, para medir la latencia de parseo
+
+    def alimentar(self, data: bytes):
+        with self._cond:
+            self._datos.extend(data)
+            self.llegadas.append(time.perf_counter())
+            self._cond.notify_all()
+
+    def despertar(self):
+        with self._cond:
+            self._cond.notify_all()
+
+    def disponible(self, timeout_ms=0) -> bool:
+        if self._detener.is_set():
+            raise _Detener()
+        with self._cond:
+            if not self._datos and timeout_ms:
+                self._cond.wait(timeout_ms / 1000)
+            if self._detener.is_set():
+                raise _Detener()
+            return bool(self._datos)
+
+    def readinto(self, buf):
+        with self._cond:
+            n = min(len(buf), len(self._datos))
+            buf[:n] = self._datos[:n]
+            del self._datos[:n]
+            return n
+
+    def read(self, n=-1):
+        with self._cond:
+            if n < 0:
+                n = len(self._datos)
+            data = bytes(self._datos[:n])
+            del self._datos[:n]
+        return data
+
+
+class _Salida:
+    # stdout del hub: cada write se entrega al PC por el enlace simulado
+    def __init__(self, entregar):
+        self._entregar = entregar
+        self.buffer = self
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        self._entregar(bytes(data))
+        return len(data)
+
+
+class _Poll:
+    def __init__(self, entrada):
+        self._entrada = entrada
+
+    def register(self, *args):
+        pass
+
+    def poll(self, timeout=-1):
+        if self._entrada.disponible(max(0, timeout)):
+            return [(self._entrada, 1)]
+        return []
+
+    ipoll = poll
+
+
+def _modulos(hub_sim, entrada, salida, detener):
+    # Módulos que el LISTENER_SCRIPT importa en el hub, versión CPython
+    def wait(ms):
+        if detener.wait(ms / 1000):
+            raise _Detener()
+
+    hubs = types.ModuleType("pybricks.hubs")
+    hubs.PrimeHub = lambda *a, **k: hub_sim.prime
+    pupdevices = types.ModuleType("pybricks.pupdevices")
+
+    def motor(port, *a, **k):
+        m = MotorSimulado(port)
+        hub_sim.motores[port] = m
+        return m
+
+    pupdevices.Motor = motor
+    parameters = types.ModuleType("pybricks.parameters")
+    parameters.Port = types.SimpleNamespace(**{p: p for p in "ABCDEF"})
+    parameters.Color = types.SimpleNamespace(**{c: c for c in (
+        "RED", "ORANGE", "YELLOW", "GREEN", "CYAN", "BLUE", "VIOLET", "MAGENTA", "WHITE", "NONE")})
+    parameters.Stop = types.SimpleNamespace(COAST="COAST", BRAKE="BRAKE", HOLD="HOLD")
+    parameters.Axis = types.SimpleNamespace(X="X", Y="Y", Z="Z")
+    tools = types.ModuleType("pybricks.tools")
+    tools.wait = wait
+    tools.StopWatch = _StopWatch
+    pybricks = types.ModuleType("pybricks")
+    pybricks.hubs, pybricks.pupdevices, pybricks.parameters, pybricks.tools = hubs, pupdevices, parameters, tools
+
+    usys = types.ModuleType("usys")
+    usys.stdin = entrada
+    usys.stdout = salida
+    uselect = types.ModuleType("uselect")
+    uselect.POLLIN = 1
+    uselect.poll = lambda: _Poll(entrada)
+    uselect.select = lambda r, w, x, t=0: ([r[0]] if entrada.disponible(t or 0) else [], [], [])
+
+    return {
+        "pybricks": pybricks, "pybricks.hubs": hubs, "pybricks.pupdevices": pupdevices,
+        "pybricks.parameters": parameters, "pybricks.tools": tools,
+        "usys": usys, "uselect": uselect, "ustruct": struct,
+    }
+
+
+# --- HUB SIMULADO (superficie de PybricksHubBLE) ---
+
+# Enlace USB simulado: transferencia bulk de ~1 ms y endpoint de 64 bytes
+USB_LATENCIA_MS = 1.0
+USB_MTU = 64
+# HubCapabilityFlag.USER_PROG_MULTI_FILE_MPY6_1_NATIVE (pybricksdev.ble.pybricks)
+CAP_MPY6_1_NATIVE = 1 << 2
+# Writes sin respuesta que caben en lo que dura un write con respuesta
+SIN_RESPUESTA_POR_INTERVALO = 2
+
+
+class HubSimulado:
+    transporte = "ble"
+
+    def __init__(self, device=None, latencia_ms: float = 0.0, mtu: int = 20, perdida: float = 0.0,
+                 semilla: int = None, deriva: float = 0.0, flash: dict = None, mpy_abi: int = 0):
+        self.device = device
+        self.latencia = latencia_ms / 1000
+        self.perdida = perdida
+        self._rnd = random.Random(semilla)
+        self.connection_state_observable = Sujeto("DISCONNECTED")
+        self.stdout_observable = Sujeto()
+        self.fw_version = "sim"
+        # Perfil actual (ABI 0): BLEWorker compila con compilar(), descarga y
+        # arranca el programa guardado. mpy_abi=6 imita un firmware antiguo (run()).
+        self._mpy_abi_version = mpy_abi
+        self._capability_flags = 0 if mpy_abi else CAP_MPY6_1_NATIVE
+        # flash: el programa guardado sobrevive a las reconexiones si fabrica()
+        # pasa el mismo dict a cada hub con ese nombre
+        self.flash = {} if flash is None else flash
+        self.descargas = 0
+        self._max_write_size = mtu
+        self.motores = {}
+        self.prime = PrimeHubSimulado(self.motores, deriva)
+        # estadísticas del enlace / del hub
+        self.writes = 0
+        self.bytes_rx = 0
+        self.perdidos = 0
+        self.latencias_parseo = deque(maxlen=100000)  # ms: llegada a stdin -> ack del hub
+        self._loop = None
+        self._hilo = None
+        self._detener = threading.Event()
+        self._entrada = None
+
+    # --- conexión ---
+    async def connect(self):
+        self._loop = asyncio.get_running_loop()
+        self.connection_state_observable.on_next("CONNECTING")
+        await asyncio.sleep(self.latencia)
+        self.connection_state_observable.on_next("CONNECTED")
+
+    async def disconnect(self):
+        self._parar_programa()
+        if self.connection_state_observable.value == "CONNECTED":
+            self.connection_state_observable.on_next("DISCONNECTED")
+
+    def cortar_enlace(self):
+        # Simula una caída del enlace (el programa sigue corriendo en el hub)
+        self.connection_state_observable.on_next("DISCONNECTED")
+
+    # --- programa ---
+    async def run(self, py_path=None, wait=True, print_output=True, line_handler=True):
+        if py_path is not None:
+            with open(py_path, encoding='utf-8') as f:
+                self.flash["programa"] = f.read()
+            self.descargas += 1
+        self._arrancar(self.flash["programa"])
+        if wait:
+            while self._hilo and self._hilo.is_alive():
+                await asyncio.sleep(0.05)
+
+    async def compilar(self, script: str, abi) -> bytes:
+        # Sustituye a mpy-cross: el "mpy" del hub simulado es el propio fuente
+        return script.encode('utf-8')
+
+    async def download_user_program(self, program: bytes):
+        self.flash["programa"] = program.decode('utf-8')
+        self.descargas += 1
+
+    async def start_user_program(self, slot=None):
+        # sin programa guardado el hub no hace nada (el PC no verá READY)
+        fuente = self.flash.get("programa")
+        if fuente is not None:
+            self._arrancar(fuente)
+
+    async def stop_user_program(self):
+        self._parar_programa()
+
+    def _arrancar(self, fuente: str):
+        self._parar_programa()
+        self._detener = threading.Event()
+        self._entrada = _Entrada(self._detener)
+        salida = _Salida(self._entregar)
+        modulos = _modulos(self, self._entrada, salida, self._detener)
+        import_real = builtins.__import__
+
+        def importar(name, globals=None, locals=None, fromlist=(), level=0):
+            if name in modulos:
+                if fromlist or "." not in name:
+                    return modulos[name]
+                return modulos[name.split(".")[0]]
+            return import_real(name, globals, locals, fromlist, level)
+
+        def imprimir(*args, sep=" ", end="\n", file=None, flush=False):
+            salida.write(sep.join(str(a) for a in args) + end)
+
+        mis_builtins = dict(builtins.__dict__)
+        mis_builtins["__import__"] = importar
+        mis_builtins["print"] = imprimir
+        codigo = compile(fuente, "<listener>", "exec")
+
+        def principal():
+            try:
+                exec(codigo, {"__name__": "__main__", "__builtins__": mis_builtins})
+            except _Detener:
+                pass
+
+        self._hilo = threading.Thread(target=principal, daemon=True, name="hub-simulado")
+        self._hilo.start()
+
+    def _parar_programa(self):
+        if self._hilo and self._hilo.is_alive():
+            self._detener.set()
+            self._entrada.despertar()
+            self._hilo.join(1.0)
+        self._hilo = None
+
+    # --- stdio ---
+    def _comprobar(self, data: bytes):
+        if len(data) + 1 > self._max_write_size:
+            raise ValueError(f"data is too big, limited to {self._max_write_size - 1} bytes")
+        if self.connection_state_observable.value != "CONNECTED":
+            raise RuntimeError("not connected")
+
+    def _recibir(self, data: bytes):
+        self.writes += 1
+        if self.perdida and self._rnd.random() < self.perdida:
+            self.perdidos += 1
+            return
+        self.bytes_rx += len(data)
+        if self._entrada:
+            self._entrada.alimentar(data)
+
+    async def write(self, data: bytes):
+        self._comprobar(data)
+        # write con respuesta: ida y vuelta del enlace antes de volver
+        await asyncio.sleep(self.latencia)
+        self._recibir(data)
+
+    async def write_gatt_char(self, uuid: str, data, response: bool):
+        # Sólo el comando WRITE_STDIN (byte 0) del servicio Pybricks: lo que
+        # usa el modo rápido de BLEWorker
+        data = bytes(data[1:])
+        if response:
+            return await self.write(data)
+        self._comprobar(data)
+        await asyncio.sleep(self.latencia / SIN_RESPUESTA_POR_INTERVALO)
+        if self.latencia:
+            self._loop.call_later(self.latencia / 2, self._recibir, data)
+        else:
+            self._recibir(data)
+
+    def _entregar(self, data: bytes):
+        # Desde el hilo del hub: mide el parseo (llegada -> ack) y entrega al loop del PC
+        if data[:1] == b"K" and self._entrada:
+            ahora = time.perf_counter()
+            llegadas = self._entrada.llegadas
+            while llegadas:
+                self.latencias_parseo.append((ahora - llegadas.popleft()) * 1000)
+        loop = self._loop
+        if loop is None or loop.is_closed():
+            return
+        if self.latencia:
+            loop.call_soon_threadsafe(loop.call_later, self.latencia / 2,
+                                      self.stdout_observable.on_next, data)
+        else:
+            loop.call_soon_threadsafe(self.stdout_observable.on_next, data)
+
+
+class HubSimuladoUSB(HubSimulado):
+    # Mismo hub, por cable: sin pérdidas y con la latencia de una transferencia USB
+    transporte = "usb"
+
+    def __init__(self, device=None, latencia_ms: float = USB_LATENCIA_MS, mtu: int = USB_MTU,
+                 semilla: int = None, deriva: float = 0.0, flash: dict = None):
+        super().__init__(device, latencia_ms=latencia_ms, mtu=mtu, semilla=semilla, deriva=deriva,
+                         flash=flash)
+
+
+def fabrica(latencia_ms: float = 0.0, mtu: int = 20, perdida: float = 0.0, semilla: int = None,
+            hubs: dict = None, usb=None, deriva: float = 0.0):
+    """hub_factory para BLEWorker que crea HubSimulado en vez de escanear BLE.
+
+    hubs: dict opcional donde se guarda cada hub creado por nombre (para inspeccionarlo).
+    usb: threading.Event opcional = cable USB enchufado. Como conectar_auto, si
+    está puesto en cada conexión se crea un HubSimuladoUSB en vez del BLE.
+    deriva: °/s de giro parásito del coche simulado (para probar mantener rumbo).
+    Cada nombre tiene su flash: lo descargado sigue ahí al reconectar (por BLE o USB).
+    """
+    flashes = {}
+
+    async def conectar(nombre: str):
+        flash = flashes.setdefault(nombre, {})
+        if usb is not None and usb.is_set():
+            device = types.SimpleNamespace(name=nombre, address=f"SIM-USB-{nombre}")
+            hub = HubSimuladoUSB(device, semilla=semilla, deriva=deriva, flash=flash)
+            if hubs is not None:
+                hubs[nombre] = hub
+            return device.address, hub
+        device = types.SimpleNamespace(name=nombre, address=f"SIM-{nombre}")
+        hub = HubSimulado(device, latencia_ms=latencia_ms, mtu=mtu, perdida=perdida, semilla=semilla,
+                          deriva=deriva, flash=flash)
+        if hubs is not None:
+            hubs[nombre] = hub
+        return device.address, hub
+    return conectar
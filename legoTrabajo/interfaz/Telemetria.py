@@ -0,0 +1,98 @@
+# Telemetria.py
+# Rol arquitectura: CLIENTE (PC) — decodifica la telemetría que emite el hub
+# (líneas "~<base64>") y la guarda en un buffer circular de tamaño fijo
+# respaldado por array, sin crecer con la duración de la sesión.
+
+import base64
+import binascii
+import struct
+import threading
+import time
+from array import array
+
+PREFIJO = "~"
+
+# Debe coincidir con TEL_FMT del LISTENER_SCRIPT
+_FMT = struct.Struct("<BBHHiiihhhhhhhhhHB")
+
+CAMPOS = (
+    "seq", "flags", "t_ms", "bateria_mv",
+    "ang_a", "ang_e", "ang_c",
+    "vel_a", "vel_e", "vel_c",
+    "carga_a", "carga_e", "carga_c",
+    "rumbo", "pitch", "roll",
+    "bucle_ms", "entrada_bytes",
+)
+_IDX = {c: i for i, c in enumerate(CAMPOS)}
+
+
+def decodificar(linea: str):
+    """Devuelve la tupla de CAMPOS o None si la línea no es válida."""
+    if not linea.startswith(PREFIJO):
+        return None
+    try:
+        raw = base64.b64decode(linea[1:], validate=True)
+    except (binascii.Error, ValueError):
+        return None
+    if len(raw) != _FMT.size:
+        return None
+    return _FMT.unpack(raw)
+
+
+class BufferTelemetria:
+    # Un array plano por campo (int32) + marca de tiempo del PC (double)
+    def __init__(self, capacidad: int = 1024):
+        self.capacidad = capacidad
+        self._datos = array('l', [0]) * (capacidad * len(CAMPOS))
+        self._t_pc = array('d', [0.0]) * capacidad
+        self._pos = 0       # próxima posición a escribir
+        self.total = 0      # registros recibidos en la sesión
+        self.perdidos = 0   # huecos detectados por el seq del hub
+        self._ultimo_seq = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return min(self.total, self.capacidad)
+
+    def clear(self):
+        with self._lock:
+            self._pos = 0
+            self.total = 0
+            self.perdidos = 0
+            self._ultimo_seq = None
+
+    def append(self, valores, t_pc: float = None):
+        n = len(CAMPOS)
+        with self._lock:
+            seq = valores[0]
+            if self._ultimo_seq is not None:
+                salto = (seq - self._ultimo_seq) & 0xFF
+                if salto > 1:
+                    self.perdidos += salto - 1
+            self._ultimo_seq = seq
+            base = self._pos * n
+            self._datos[base:base + n] = array('l', valores)
+            self._t_pc[self._pos] = time.monotonic() if t_pc is None else t_pc
+            self._pos = (self._pos + 1) % self.capacidad
+            self.total += 1
+
+    def ultimo(self):
+        """Último registro como dict (con 't_pc'), o None si aún no hay datos."""
+        with self._lock:
+            if not self.total:
+                return None
+            i = (self._pos - 1) % self.capacidad
+            n = len(CAMPOS)
+            reg = dict(zip(CAMPOS, self._datos[i * n:(i + 1) * n]))
+            reg["t_pc"] = self._t_pc[i]
+            return reg
+
+    def serie(self, campo: str, n: int = None):
+        """Los últimos n valores de un campo, del más antiguo al más nuevo."""
+        k = _IDX[campo]
+        ncampos = len(CAMPOS)
+        with self._lock:
+            disponibles = min(self.total, self.capacidad)
+            n = disponibles if n is None else min(n, disponibles)
+            inicio = (self._pos - n) % self.capacidad
+            return [self._datos[((inicio + j) % self.capacidad) * ncampos + k] for j in range(n)]
@@ -0,0 +1,100 @@
+# Trayectoria.py
+# Rol arquitectura: CLIENTE (PC) — describe una maniobra como segmentos
+# temporizados que el hub ejecuta con su propio reloj (ver TRAYECTORIA en el
+# LISTENER_SCRIPT). El jitter de BLE sólo afecta a la subida, no al movimiento.
+#
+#   t = Trayectoria().avanzar(600, 1.2).girar(-30).rampa(0, 0.5)
+#   worker.send_trajectory(t)
+#
+# Comandos: V<vel> G<ángulo> D<ms> fijan el segmento, P<rampa> lo añade,
+# X ejecuta lo cargado y C cancela y vacía el buffer del hub.
+
+TRJ_MAX = 32          # debe coincidir con TRJ_MAX del LISTENER_SCRIPT
+MAX_SEGMENTO_MS = 32767  # el valor viaja como int16
+
+
+class Segmento:
+    __slots__ = ("velocidad", "direccion", "ms", "rampa")
+
+    def __init__(self, velocidad: int, direccion: int, ms: int, rampa: bool = False):
+        self.velocidad = velocidad
+        self.direccion = direccion
+        self.ms = ms
+        self.rampa = rampa
+
+    def __repr__(self):
+        tipo = "rampa" if self.rampa else "vel"
+        return f"Segmento({tipo} {self.velocidad}, dir {self.direccion}, {self.ms} ms)"
+
+
+class Trayectoria:
+    def __init__(self):
+        self.segmentos = []
+        self._velocidad = 0
+        self._direccion = 0
+
+    def __len__(self):
+        return len(self.segmentos)
+
+    def _agregar(self, velocidad: int, segundos: float, rampa: bool):
+        ms = int(round(segundos * 1000))
+        if ms < 0:
+            raise ValueError("duración negativa")
+        inicio = self._velocidad
+        nuevos = []
+        while True:
+            tramo = min(ms, MAX_SEGMENTO_MS)
+            if rampa and ms > tramo:
+                # rampa larga partida en tramos: cada uno llega a su velocidad intermedia
+                destino = inicio + (velocidad - inicio) * tramo // ms
+            else:
+                destino = velocidad
+            nuevos.append(Segmento(int(destino), self._direccion, tramo, rampa))
+            inicio = destino
+            ms -= tramo
+            if ms <= 0:
+                break
+        # si no cabe, la trayectoria queda como estaba (se puede seguir subiendo)
+        if len(self.segmentos) + len(nuevos) > TRJ_MAX:
+            raise ValueError(f"más de {TRJ_MAX} segmentos")
+        self.segmentos.extend(nuevos)
+        self._velocidad = velocidad
+        return self
+
+    def avanzar(self, velocidad: int, segundos: float):
+        """Velocidad constante (grados/s, negativa = atrás) durante 'segundos'."""
+        return self._agregar(int(velocidad), segundos, False)
+
+    def rampa(self, velocidad: int, segundos: float):
+        """Variación lineal desde la velocidad anterior hasta 'velocidad'."""
+        return self._agregar(int(velocidad), segundos, True)
+
+    def esperar(self, segundos: float):
+        return self._agregar(self._velocidad, segundos, False)
+
+    def girar(self, angulo: int):
+        """Ángulo de dirección para los segmentos siguientes (se aplica al empezar cada uno)."""
+        self._direccion = int(angulo)
+        return self
+
+    def duracion(self) -> float:
+        return sum(s.ms for s in self.segmentos) / 1000
+
+    def comandos(self, ejecutar: bool = True):
+        """Comandos de texto para subirla; V/G/D sólo cuando cambian respecto al segmento previo."""
+        cmds = ["C"]
+        vel = dir_ = ms = None
+        for s in self.segmentos:
+            if s.velocidad != vel:
+                cmds.append(f"V{s.velocidad}")
+                vel = s.velocidad
+            if s.direccion != dir_:
+                cmds.append(f"G{s.direccion}")
+                dir_ = s.direccion
+            if s.ms != ms:
+                cmds.append(f"D{s.ms}")
+                ms = s.ms
+            cmds.append(f"P{1 if s.rampa else 0}")
+        if ejecutar:
+            cmds.append("X")
+        return cmds
@@ -0,0 +1,178 @@
+# benchmark.py
+# Banco de pruebas del enlace de control contra el hub simulado (Simulador.py):
+# mide comandos/s, latencia de parseo en el hub, latencia extremo a extremo y
+# crecimiento de la cola bajo cargas sintéticas. Corre en cualquier PC, sin hub.
+#
+#   python benchmark.py                        # todas las cargas, enlace por defecto
+#   python benchmark.py --latencia 30 --perdida 0.02 --json resultados.json
+#   python benchmark.py --min-cps 50 --max-p95 120   # falla (exit 1) si hay regresión
+#   python benchmark.py --carga grabacion --grabacion sesion.lgr --velocidad 4
+#   python benchmark.py --usb                  # hub simulado por cable USB
+#   python benchmark.py --rapido --perdida 0.05  # writes sin respuesta + reenvíos
+
+import argparse
+import json
+import statistics
+import sys
+import threading
+import time
+from queue import Queue
+
+import Simulador
+from Conexion import BLEWorker
+
+
+def carga_teclas(worker, duracion: float, periodo_ms: float) -> int:
+    # Pulsar/soltar W A S D lo más rápido posible (como una tecla con autorepetición)
+    secuencia = ("F500", "L", "S", "Z", "B500", "R", "S", "Z")
+    enviados = 0
+    fin = time.perf_counter() + duracion
+    while time.perf_counter() < fin:
+        worker.send_packet(secuencia[enviados % len(secuencia)])
+        enviados += 1
+        time.sleep(periodo_ms / 1000)
+    return enviados
+
+
+def carga_slider(worker, duracion: float, periodo_ms: float) -> int:
+    # Barrido continuo de velocidad 0 -> 1000 -> 0 (slider arrastrado)
+    enviados = 0
+    valor, paso = 0, 10
+    fin = time.perf_counter() + duracion
+    while time.perf_counter() < fin:
+        worker.send_packet(f"F{valor}")
+        enviados += 1
+        valor += paso
+        if valor >= 1000 or valor <= 0:
+            paso = -paso
+        time.sleep(periodo_ms / 1000)
+    return enviados
+
+
+def carga_grabacion(worker, duracion: float, periodo_ms: float, path: str = None,
+                    velocidad: float = 1.0) -> int:
+    # Sesión real grabada con Grabador (duracion/periodo no aplican)
+    if not path:
+        raise SystemExit("--carga grabacion necesita --grabacion FICHERO")
+    return worker.replay(path, velocidad).result()
+
+
+CARGAS = {"teclas": carga_teclas, "slider": carga_slider, "grabacion": carga_grabacion}
+
+
+def _percentil(valores, p):
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p / 100))]
+
+
+def ejecutar(nombre: str, args) -> dict:
+    hubs = {}
+    cable = threading.Event()
+    if args.usb:
+        cable.set()
+    worker = BLEWorker(Queue(), batch_budget_ms=args.lote_ms, telemetry_ms=args.telemetria,
+                       sin_respuesta=args.rapido,
+                       hub_factory=Simulador.fabrica(args.latencia, args.mtu, args.perdida,
+                                                     semilla=1, hubs=hubs, usb=cable))
+    worker.start()
+    limite = time.perf_counter() + 10
+    while not worker.running.is_set():
+        if time.perf_counter() > limite:
+            worker.stop()
+            raise RuntimeError("el hub simulado no llegó a READY")
+        time.sleep(0.01)
+    hub = hubs[worker.hub_name]
+
+    t0 = time.perf_counter()
+    if nombre == "grabacion":
+        enviados = carga_grabacion(worker, args.duracion, args.periodo, args.grabacion, args.velocidad)
+    else:
+        enviados = CARGAS[nombre](worker, args.duracion, args.periodo)
+    duracion = time.perf_counter() - t0
+    time.sleep(max(0.3, 4 * args.latencia / 1000))  # dejar llegar los últimos acks
+
+    cola = worker.queue_stats()
+    p50, p95, p99 = worker.latency.percentiles("total")
+    parseo = list(hub.latencias_parseo)
+    confirmados = worker.latency.hist["total"].n
+    resultado = {
+        "carga": nombre,
+        "transporte": worker.transporte,
+        "write_p50_ms": round(worker.write_lat.percentil(50), 2),
+        "enviados": enviados,
+        "escritos": worker.cmds_sent,
+        "confirmados": confirmados,
+        "writes": worker.writes,
+        "cmds_por_write": round(worker.cmds_sent / worker.writes, 2) if worker.writes else 0,
+        "cmds_por_s": round(confirmados / duracion, 1),
+        "bytes_hub": hub.bytes_rx,
+        "perdidos_enlace": hub.perdidos,
+        "reenvios": worker.reenvios,
+        # el último estado pedido de cada canal acabó confirmado por el hub
+        "estado_final_ok": all(worker.confirmado.get(c) == t for c, t in worker._control_state.items()),
+        "lat_total_p50_ms": round(p50, 2),
+        "lat_total_p95_ms": round(p95, 2),
+        "lat_total_p99_ms": round(p99, 2),
+        "parseo_p50_ms": round(_percentil(parseo, 50), 3),
+        "parseo_p95_ms": round(_percentil(parseo, 95), 3),
+        "parseo_media_ms": round(statistics.fmean(parseo), 3) if parseo else 0.0,
+        "cola_max": cola["max_profundidad"],
+        "coalescidos": cola["coalescidos"],
+        "descartados": cola["descartados"],
+    }
+    worker.stop()
+    time.sleep(0.2)
+    return resultado
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Benchmark del enlace PC -> hub con hub simulado")
+    ap.add_argument("--carga", choices=sorted(CARGAS), action="append",
+                    help="carga a ejecutar (por defecto teclas y slider)")
+    ap.add_argument("--duracion", type=float, default=3.0, help="segundos por carga")
+    ap.add_argument("--periodo", type=float, default=2.0, help="ms entre comandos generados")
+    ap.add_argument("--latencia", type=float, default=15.0, help="ms por write con respuesta")
+    ap.add_argument("--mtu", type=int, default=20, help="tamaño máximo de write (bytes)")
+    ap.add_argument("--perdida", type=float, default=0.0, help="probabilidad de perder un write")
+    ap.add_argument("--usb", action="store_true", help="hub simulado por USB en vez de BLE")
+    ap.add_argument("--rapido", action="store_true",
+                    help="writes BLE sin respuesta (seq + reenvío de lo perdido)")
+    ap.add_argument("--lote-ms", dest="lote_ms", type=float, default=0.0,
+                    help="presupuesto de agrupación de BLEWorker")
+    ap.add_argument("--telemetria", type=int, default=200, help="periodo de telemetría (0 = off)")
+    ap.add_argument("--grabacion", help="grabación (.lgr) para la carga 'grabacion'")
+    ap.add_argument("--velocidad", type=float, default=1.0, help="factor de velocidad al reproducir")
+    ap.add_argument("--json", help="guardar resultados en este fichero")
+    ap.add_argument("--min-cps", type=float, help="falla si cmds/s queda por debajo")
+    ap.add_argument("--max-p95", type=float, help="falla si la latencia total p95 (ms) la supera")
+    args = ap.parse_args(argv)
+
+    cargas = args.carga or (["grabacion"] if args.grabacion else ["slider", "teclas"])
+    resultados = [ejecutar(nombre, args) for nombre in cargas]
+
+    claves = list(resultados[0])
+    ancho = max(len(k) for k in claves)
+    for k in claves:
+        print(k.ljust(ancho), *(str(r[k]).rjust(10) for r in resultados))
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({"parametros": vars(args), "resultados": resultados}, f, indent=2)
+
+    fallos = []
+    for r in resultados:
+        if args.min_cps is not None and r["cmds_por_s"] < args.min_cps:
+            fallos.append(f"{r['carga']}: {r['cmds_por_s']} cmds/s < {args.min_cps}")
+        if args.max_p95 is not None and r["lat_total_p95_ms"] > args.max_p95:
+            fallos.append(f"{r['carga']}: p95 {r['lat_total_p95_ms']} ms > {args.max_p95}")
+        if args.rapido and not r["estado_final_ok"]:
+            fallos.append(f"{r['carga']}: el hub no quedó en el último estado pedido")
+    for f in fallos:
+        print(f"REGRESIÓN: {f}", file=sys.stderr)
+    return 1 if fallos else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
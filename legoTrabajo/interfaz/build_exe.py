@@ -1,9 +1,19 @@
+import argparse
 import subprocess
 import sys
 import os
 import shutil
 import time
 
+# Perfiles:
+#   completo (por defecto) -> un único ControlLego.exe (--onefile); se descomprime
+#                             entero en %TEMP% en cada arranque.
+#   rapido                 -> carpeta dist/ControlLego/ (--onedir): arranca sin
+#                             descomprimir y sólo incluye lo que se importa.
+parser = argparse.ArgumentParser(description="Compila ControlLego con PyInstaller")
+parser.add_argument("--perfil", choices=("completo", "rapido"), default="completo")
+perfil = parser.parse_args().perfil
+
 # --- Configuración Inicial ---
 script_dir = os.path.dirname(os.path.abspath(__file__))
 main_py = os.path.join(script_dir, "Main.py")
@@ -30,24 +40,18 @@ def limpiar_directorios():
 limpiar_directorios()
 
 # --- 2. Comando PyInstaller ---
-cmd = [
+comunes = [
     sys.executable, "-m", "PyInstaller",
     "--noconfirm",
-    "--onefile",
     "--clean",
     "--console", 
     "--name", "ControlLego",
     "--distpath", dist_dir,
     "--workpath", work_dir,
-    
-    # Recolección de paquetes
-    "--collect-all=bleak",
-    "--collect-all=pybricksdev",
-    "--collect-all=winsdk",
-    "--collect-all=mpy_cross_v6",
-    "--collect-all=mpy_cross_v5",
-    
-    # Importaciones ocultas
+]
+
+# Importaciones ocultas (los módulos propios y la pila BLE se importan tarde)
+ocultas = [
     "--hidden-import=bleak.backends.winrt",
     "--hidden-import=winsdk.windows.devices.bluetooth",
     "--hidden-import=winsdk.windows.devices.bluetooth.genericattributeprofile",
@@ -58,11 +62,45 @@ cmd = [
     "--hidden-import=Interfaz",
     "--hidden-import=mpy_cross_v6",
     "--hidden-import=mpy_cross_v5",
-    
-    main_py
 ]
 
-print(f"\nCompilando {main_py}...\n")
+if perfil == "completo":
+    cmd = comunes + [
+        "--onefile",
+
+        # Recolección de paquetes
+        "--collect-all=bleak",
+        "--collect-all=pybricksdev",
+        "--collect-all=winsdk",
+        "--collect-all=mpy_cross_v6",
+        "--collect-all=mpy_cross_v5",
+    ] + ocultas + [main_py]
+else:
+    cmd = comunes + [
+        "--onedir",
+
+        # Sólo los submódulos que se usan; mpy-cross necesita sus binarios
+        "--collect-submodules=bleak",
+        "--collect-submodules=pybricksdev.ble",
+        "--collect-submodules=pybricksdev.connections",
+        "--collect-all=mpy_cross_v6",
+        "--collect-all=mpy_cross_v5",
+        "--hidden-import=winsdk.windows.devices.enumeration",
+        "--hidden-import=winsdk.windows.foundation",
+        "--hidden-import=winsdk.windows.foundation.collections",
+        "--hidden-import=winsdk.windows.storage.streams",
+        # transporte USB: pyusb carga su backend por nombre
+        "--hidden-import=usb.backend.libusb1",
+
+        # Dependencias de la CLI de pybricksdev que el control no usa.
+        # tqdm NO: pybricksdev.connections.pybricks lo importa al cargar.
+        "--exclude-module=PIL",
+        "--exclude-module=prompt_toolkit",
+        "--exclude-module=questionary",
+        "--exclude-module=pybricksdev.cli",
+    ] + ocultas + [main_py]
+
+print(f"\nCompilando {main_py} (perfil {perfil})...\n")
 
 try:
     # Agregamos una pequeña pausa para que Windows suelte los archivos
@@ -70,7 +108,11 @@ try:
     subprocess.run(cmd, check=True)
     print(f"\n" + "="*30)
     print(f"✓ ¡Compilación exitosa!")
-    print(f"Ejecutable en: {os.path.join(dist_dir, 'ControlLego.exe')}")
+    if perfil == "completo":
+        print(f"Ejecutable en: {os.path.join(dist_dir, 'ControlLego.exe')}")
+    else:
+        print(f"Ejecutable en: {os.path.join(dist_dir, 'ControlLego', 'ControlLego.exe')}")
+        print("Medir el arranque: python medir_arranque.py --exe <ruta>")
     print("="*30)
 except subprocess.CalledProcessError as e:
     print(f"\n✗ Error durante la ejecución de PyInstaller: {e}")
@@ -0,0 +1,107 @@
+# medir_arranque.py
+# Mide el arranque de ControlLego: tiempo hasta el primer frame (en frío y en
+# caliente) y el coste de importar cada módulo (python -X importtime).
+#
+#   python medir_arranque.py                          # Main.py con este intérprete
+#   python medir_arranque.py --exe dist/ControlLego/ControlLego.exe
+#   python medir_arranque.py --presupuesto-ms 1500    # falla (exit 1) si se supera
+#
+# "Frío" = primera ejecución tras borrar __pycache__ (o el primer lanzamiento
+# del .exe); "caliente" = las siguientes, con bytecode y disco ya en caché.
+
+import argparse
+import os
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+
+DIR = os.path.dirname(os.path.abspath(__file__))
+_ARRANQUE = re.compile(r"ARRANQUE imports_ms=(\d+) primer_frame_ms=(\d+)")
+_IMPORTTIME = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def lanzar(cmd):
+    # -> (ms de pared hasta salir, imports_ms, primer_frame_ms)
+    t0 = time.perf_counter()
+    proc = subprocess.run(cmd, cwd=DIR, capture_output=True, text=True, timeout=120)
+    pared = (time.perf_counter() - t0) * 1000
+    m = _ARRANQUE.search(proc.stdout)
+    if not m:
+        raise RuntimeError(f"sin línea ARRANQUE (¿hay pantalla?):\n{proc.stdout}\n{proc.stderr}")
+    return pared, int(m.group(1)), int(m.group(2))
+
+
+def limpiar_bytecode():
+    for raiz, dirs, _ in os.walk(DIR):
+        if "__pycache__" in dirs:
+            shutil.rmtree(os.path.join(raiz, "__pycache__"), ignore_errors=True)
+            dirs.remove("__pycache__")
+
+
+def importtime(codigo: str):
+    """[(módulo, profundidad, propio_ms, acumulado_ms)] de cada import de 'codigo'."""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", codigo],
+                          cwd=DIR, capture_output=True, text=True, timeout=120)
+    filas = []
+    for linea in proc.stderr.splitlines():
+        m = _IMPORTTIME.match(linea)
+        if m:
+            propio, acumulado, sangria, modulo = m.groups()
+            filas.append((modulo, len(sangria), int(propio) / 1000, int(acumulado) / 1000))
+    return filas
+
+
+def informe_imports(titulo: str, codigo: str, top: int):
+    filas = importtime(codigo)
+    if not filas:
+        print(f"\n{titulo}: sin datos")
+        return 0.0
+    nivel_min = min(f[1] for f in filas)
+    raiz = [f for f in filas if f[1] == nivel_min]
+    total = sum(f[3] for f in raiz)
+    print(f"\n{titulo}: {total:.0f} ms")
+    for modulo, _, propio, acumulado in sorted(filas, key=lambda f: -f[3])[:top]:
+        print(f"  {acumulado:8.1f} ms acumulado  {propio:7.1f} ms propio  {modulo}")
+    return total
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description="Tiempo de arranque e imports de ControlLego")
+    ap.add_argument("--exe", help="medir un ejecutable de PyInstaller en vez de Main.py")
+    ap.add_argument("--repeticiones", type=int, default=5, help="arranques en caliente")
+    ap.add_argument("--top", type=int, default=15, help="módulos más lentos a listar")
+    ap.add_argument("--sin-imports", dest="sin_imports", action="store_true",
+                    help="no desglosar los imports")
+    ap.add_argument("--presupuesto-ms", dest="presupuesto_ms", type=float,
+                    help="falla si el primer frame en caliente (mediana) lo supera")
+    args = ap.parse_args(argv)
+
+    cmd = [args.exe] if args.exe else [sys.executable, "Main.py"]
+    cmd.append("--medir-arranque")
+
+    if not args.exe:
+        limpiar_bytecode()
+    frio = lanzar(cmd)
+    calientes = [lanzar(cmd) for _ in range(args.repeticiones)]
+
+    print(f"{'':10} {'pared':>9} {'imports':>9} {'1er frame':>10}")
+    print(f"{'frío':10} {frio[0]:8.0f}ms {frio[1]:8d}ms {frio[2]:9d}ms")
+    med = [statistics.median(c[i] for c in calientes) for i in range(3)]
+    print(f"{'caliente':10} {med[0]:8.0f}ms {med[1]:8.0f}ms {med[2]:9.0f}ms  (mediana de {len(calientes)})")
+
+    if not args.sin_imports and not args.exe:
+        informe_imports("Imports hasta la ventana (Main -> Interfaz)", "import Interfaz", args.top)
+        informe_imports("Pila BLE (en segundo plano tras el primer frame)",
+                        "import Conexion; Conexion.precargar_pila_ble()", args.top)
+
+    if args.presupuesto_ms is not None and med[2] > args.presupuesto_ms:
+        print(f"PRESUPUESTO SUPERADO: {med[2]:.0f} ms > {args.presupuesto_ms:.0f} ms", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,54 @@
+# Los módulos de interfaz/ se importan por nombre (import Conexion, ...), como
+# cuando se ejecutan Main.py o benchmark.py desde su carpeta
+import os
+import sys
+import time
+from queue import Queue
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Simulador  # noqa: E402
+from Conexion import BLEWorker  # noqa: E402
+
+
+def esperar(condicion, timeout: float = 3.0, paso: float = 0.01) -> bool:
+    limite = time.perf_counter() + timeout
+    while not condicion():
+        if time.perf_counter() > limite:
+            return False
+        time.sleep(paso)
+    return True
+
+
+@pytest.fixture(autouse=True)
+def cache_aislada(tmp_path, monkeypatch):
+    # Cache.py escribe en %LOCALAPPDATA%/ControlLego: nunca en la del usuario
+    monkeypatch.setenv("LOCALAPPDATA", str(tmp_path / "cache"))
+
+
+@pytest.fixture
+def conectar():
+    """conectar(**opciones_worker, **opciones_simulador) -> (worker listo, hub simulado).
+
+    Con hub_factory y hubs se reutiliza una fabrica() (la flash del hub simulado
+    se conserva entre conexiones).
+    """
+    workers = []
+
+    def _conectar(latencia_ms: float = 5, perdida: float = 0.0, semilla: int = 1,
+                  hub_factory=None, hubs: dict = None, **opciones):
+        hubs = {} if hubs is None else hubs
+        if hub_factory is None:
+            hub_factory = Simulador.fabrica(latencia_ms, perdida=perdida, semilla=semilla, hubs=hubs)
+        opciones.setdefault("telemetry_ms", 0)
+        w = BLEWorker(Queue(), hub_factory=hub_factory, **opciones)
+        workers.append(w)
+        w.start()
+        assert esperar(w.running.is_set), "el hub simulado no llegó a READY"
+        return w, w.hub
+
+    yield _conectar
+    for w in workers:
+        w.close()
@@ -0,0 +1,68 @@
+# Caché de dispositivos BLE: conexión directa a la dirección guardada y
+# escaneo sólo como plan B (la fábrica imita a Conexion.conectar_ble)
+import asyncio
+
+import Cache
+import Conexion
+import Simulador
+
+
+class _HubApagado(Simulador.HubSimulado):
+    # La dirección en caché ya no responde (hub apagado o de otro)
+    async def connect(self):
+        await asyncio.sleep(60)
+
+
+def _fabrica(escaneos: list, direccion_viva: bool = True):
+    async def conectar(nombre: str):
+        cacheado = Cache.dispositivo_cacheado(nombre)
+        if cacheado:
+            hub = (Simulador.HubSimulado if direccion_viva else _HubApagado)(latencia_ms=5)
+            hub.directo = True
+            address = cacheado["address"]
+        else:
+            escaneos.append(nombre)
+            hub = Simulador.HubSimulado(latencia_ms=5)
+            address = "AA:BB:CC:00:00:07"
+        hub.nombre_cache = nombre
+        return address, hub
+    return conectar
+
+
+def test_guardar_y_olvidar():
+    assert Cache.dispositivo_cacheado("SP-7") is None
+    Cache.guardar_dispositivo("SP-7", "AA:BB:CC:00:00:07")
+    entrada = Cache.dispositivo_cacheado("SP-7")
+    assert entrada["address"] == "AA:BB:CC:00:00:07" and entrada["visto"] > 0
+    Cache.olvidar_dispositivo("SP-7")
+    assert Cache.dispositivo_cacheado("SP-7") is None
+
+
+def test_sin_cache_escanea_y_guarda(conectar):
+    escaneos = []
+    w, _ = conectar(hub_factory=_fabrica(escaneos))
+    assert escaneos == ["SP-7"]
+    assert Cache.dispositivo_cacheado("SP-7")["address"] == "AA:BB:CC:00:00:07"
+
+
+def test_conexion_directa_refresca_visto(conectar):
+    Cache._escribir_json("dispositivos.json", {"SP-7": {"address": "11:22:33:44:55:66", "visto": 0}})
+    escaneos = []
+    w, _ = conectar(hub_factory=_fabrica(escaneos))
+    assert escaneos == []
+    entrada = Cache.dispositivo_cacheado("SP-7")
+    assert entrada["address"] == "11:22:33:44:55:66" and entrada["visto"] > 0
+
+
+def test_direccion_muerta_vuelve_al_escaneo(conectar, monkeypatch):
+    monkeypatch.setattr(Conexion, "DIRECTO_TIMEOUT", 0.2)
+    Cache.guardar_dispositivo("SP-7", "11:22:33:44:55:66")
+    escaneos = []
+    w, _ = conectar(hub_factory=_fabrica(escaneos, direccion_viva=False))
+    assert escaneos == ["SP-7"]
+    assert Cache.dispositivo_cacheado("SP-7")["address"] == "AA:BB:CC:00:00:07"
+
+
+def test_direccion_ble_sirve_de_dispositivo():
+    d = Conexion.DireccionBLE("11:22:33:44:55:66", "SP-7")
+    assert isinstance(d, str) and d == d.address == "11:22:33:44:55:66" and d.name == "SP-7"
@@ -0,0 +1,52 @@
+from concurrent.futures import Future
+
+from Conexion import ColaComandos, Comando
+
+
+def _vaciar(cola):
+    salida = []
+    while (cmd := cola.get_nowait()) is not None:
+        salida.append(cmd.texto)
+    return salida
+
+
+def test_canales_y_fifo_en_orden_de_llegada():
+    cola = ColaComandos()
+    for texto in ("F100", "Q", "L", "T50"):
+        cola.put(Comando(texto))
+    assert _vaciar(cola) == ["F100", "Q", "L", "T50"]
+
+
+def test_ultimo_gana_y_toma_el_puesto_nuevo():
+    cola = ColaComandos()
+    viejo = Comando("F100", fin=Future())
+    for cmd in (viejo, Comando("Q"), Comando("F200")):
+        cola.put(cmd)
+    assert viejo.fin.result(0) is False  # sustituido: nunca llegará al hub
+    assert _vaciar(cola) == ["Q", "F200"]
+    assert cola.coalescidos == 1
+
+
+def test_prioridad_adelanta_y_deja_obsoleto_su_canal():
+    cola = ColaComandos()
+    for texto in ("Q", "F500", "L"):
+        cola.put(Comando(texto))
+    cola.put(Comando("S"), prioridad=True)
+    assert _vaciar(cola) == ["S", "Q", "L"]
+
+
+def test_fifo_llena_descarta_el_mas_antiguo():
+    cola = ColaComandos(max_fifo=2)
+    for texto in ("Q", "C", "X"):
+        cola.put(Comando(texto))
+    assert cola.descartados == 1 and cola.fifo_libre() == 0
+    assert _vaciar(cola) == ["C", "X"]
+
+
+def test_clear_y_pendiente():
+    cola = ColaComandos()
+    cola.put(Comando("R"))
+    cola.put(Comando("S"), prioridad=True)
+    assert cola.pendiente("direccion") and cola.pendiente("traccion")
+    cola.clear()
+    assert len(cola) == 0 and not cola.pendiente("direccion")
@@ -0,0 +1,101 @@
+# Controlador: la API asyncio sobre NucleoHub, en el loop del test (sin hilo
+# del worker) contra el hub simulado
+import asyncio
+
+import pytest
+
+import Conexion
+import Registro
+import Simulador
+import Trayectoria
+from Conexion import Comando, NucleoHub
+from Controlador import Controlador
+
+
+def ejecutar(prueba, **opciones):
+    async def principal():
+        hubs = {}
+        ctl = Controlador("SP-7", Registro.Registro(), Simulador.fabrica(5, hubs=hubs),
+                          telemetry_ms=opciones.pop("telemetry_ms", 0), **opciones)
+        await ctl.conectar(5)
+        try:
+            return await prueba(ctl, hubs["SP-7"])
+        finally:
+            await ctl.cerrar()
+    return asyncio.run(principal())
+
+
+def test_conduce_y_confirma():
+    async def prueba(ctl, hub):
+        assert ctl.listo and ctl.estado == "listo"
+        assert isinstance(ctl.nucleo, NucleoHub) and ctl.nucleo.loop is asyncio.get_running_loop()
+        assert await ctl.avanzar(500) and await ctl.girar(-1)
+        assert ctl.confirmado("traccion") == "F500" and ctl.confirmado("direccion") == "L"
+        await asyncio.sleep(0.1)
+        assert hub.motores["A"].speed() == 500 and hub.motores["C"].angle() < 0
+        assert await ctl.parar()
+        await asyncio.sleep(0.1)
+        assert hub.motores["A"].speed() == 0
+        return ctl.resumen()
+    resumen = ejecutar(prueba)
+    assert resumen["confirmados"] >= 4 and resumen["errores_tx"] == 0
+
+
+def test_trayectoria_rumbo_y_telemetria():
+    async def prueba(ctl, hub):
+        tray = Trayectoria.Trayectoria().avanzar(400, 0.3).rampa(0, 0.1)
+        assert await ctl.trayectoria(tray) == "FIN"
+        assert await ctl.mantener_rumbo(0)
+        await asyncio.sleep(0.1)
+        assert ctl.nucleo.heading_hold
+        assert await ctl.soltar_rumbo()
+        return await ctl.esperar_telemetria()
+    tel = ejecutar(prueba, telemetry_ms=50)
+    assert tel is not None and "rumbo" in tel
+
+
+def test_tope_en_vuelo_sin_acks_no_se_bloquea(monkeypatch):
+    # Hub mudo tras conectar: los comandos sin ack liberan su hueco al vencer
+    monkeypatch.setattr(Conexion, "ACK_LIMITE", 0.2)
+
+    async def prueba(ctl, hub):
+        hub.perdida = 1.0
+        assert await ctl.enviar("F100", esperar=False)
+        assert await ctl.enviar("R", esperar=False)
+        # sin vencimiento de acks el tercero esperaría hueco para siempre
+        assert await asyncio.wait_for(ctl.enviar("B100", esperar=False), 2.0)
+        assert not await ctl.enviar("L", timeout=1.0)
+        await asyncio.sleep(0.3)
+        return len(ctl.nucleo._pending_ack)
+    assert ejecutar(prueba, max_en_vuelo=2, lease_ms=0) == 0
+
+
+def test_seq_reutilizado_resuelve_el_anterior():
+    class Hub:
+        async def write(self, data):
+            pass
+
+    async def principal():
+        nucleo = NucleoHub(None)
+        nucleo.hub = Hub()
+        viejo, nuevo = (Comando("Q", fin=asyncio.get_running_loop().create_future()) for _ in range(2))
+        viejo.seq = nuevo.seq = 7  # el contador de 8 bits dio la vuelta
+        await nucleo._write_payload(b"Q;", [viejo])
+        await nucleo._write_payload(b"Q;", [nuevo])
+        assert viejo.fin.result() is False
+        assert nucleo._pending_ack == {7: nuevo} and not nuevo.fin.done()
+    asyncio.run(principal())
+
+
+def test_error_de_conexion():
+    async def sin_hub(nombre):
+        raise asyncio.TimeoutError()
+
+    async def principal():
+        ctl = Controlador("SP-7", Registro.Registro(), sin_hub)
+        with pytest.raises(ConnectionError):
+            await ctl.enviar("F100")
+        with pytest.raises(ConnectionError, match="No se encontró hub"):
+            await ctl.conectar(2)
+        await ctl.cerrar()
+    asyncio.run(principal())
@@ -0,0 +1,39 @@
+import pytest
+
+from Entradas import (DIR_MAX, PASO_DIR, PASO_VEL, VEL_MAX, ZONA_MUERTA, EntradaEjes,
+                      a_consigna)
+from Muestreo import EstadoControl
+
+
+def test_zona_muerta():
+    assert a_consigna(0.0, 0.0) == (0, 0)
+    assert a_consigna(ZONA_MUERTA, -ZONA_MUERTA) == (0, 0)
+    assert a_consigna(0.05, 0.05) == (0, 0)
+
+
+def test_extremos_y_saturacion():
+    assert a_consigna(1, 1) == (VEL_MAX, DIR_MAX)
+    assert a_consigna(-1, -1) == (-VEL_MAX, -DIR_MAX)
+    assert a_consigna(3, -7) == (-VEL_MAX, DIR_MAX)
+
+
+@pytest.mark.parametrize("x, y", [(0.3, 0.5), (-0.71, 0.13), (0.999, -0.42)])
+def test_cuantizacion(x, y):
+    vel, ang = a_consigna(x, y)
+    assert vel % PASO_VEL == 0 and ang % PASO_DIR == 0
+    assert (vel > 0) == (y > 0) and (ang > 0) == (x > 0)
+
+
+def test_solo_se_entrega_si_cambia():
+    entregas = []
+
+    class Estado(EstadoControl):
+        def proporcional(self, fuente, velocidad, angulo):
+            entregas.append((velocidad, angulo))
+            super().proporcional(fuente, velocidad, angulo)
+
+    ejes = EntradaEjes(Estado(), "prueba")
+    ejes.mover(0.5, 0.5)
+    ejes.mover(0.501, 0.501)  # misma consigna cuantizada
+    ejes.centrar()
+    assert entregas == [a_consigna(0.5, 0.5), (0, 0)]
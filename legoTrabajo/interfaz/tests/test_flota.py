@@ -0,0 +1,62 @@
+# Flota de hubs simulados en un solo loop: destinos, estado confirmado y parada
+from queue import Queue
+
+import pytest
+
+import Simulador
+from conftest import esperar
+from Flota import TODOS, FlotaBLE
+
+
+@pytest.fixture
+def flota():
+    hubs = {}
+    f = FlotaBLE(Queue(), ["SP-7", "SP-8", "SP-9"], grupos={"par": ["SP-7", "SP-8"]},
+                 hub_factory=Simulador.fabrica(5, hubs=hubs), telemetry_ms=0)
+    f.start()
+    assert esperar(lambda: all(w.running.is_set() for w in f.workers.values()))
+    yield f, hubs
+    f.close()
+
+
+def test_reparto_por_destino(flota):
+    f, hubs = flota
+    assert f.destinos() == [TODOS, "@par", "SP-7", "SP-8", "SP-9"]
+    f.send_packet("F500")
+    f.send_packet("L", destino="@par")
+    f.send_packet("R", destino="SP-9")
+    assert esperar(lambda: f.workers["SP-9"].estado_confirmado("direccion") == "R"
+                   and f.workers["SP-8"].estado_confirmado("direccion") == "L")
+    assert esperar(lambda: f.estado_confirmado("traccion") == "F500")
+    assert {n: h.motores["A"].speed() for n, h in hubs.items()} == {"SP-7": 500, "SP-8": 500, "SP-9": 500}
+    # con destinos en desacuerdo no hay un estado común confirmado
+    assert f.estado_confirmado("direccion") is None
+    f.set_objetivo("@par")
+    assert f.estado_confirmado("direccion") == "L"
+
+
+def test_parada_de_emergencia_llega_a_todos(flota):
+    f, hubs = flota
+    f.send_packet("F500")
+    assert esperar(lambda: all(h.motores["A"].speed() == 500 for h in hubs.values()))
+    f.set_objetivo("SP-7")
+    f.emergency_stop()
+    assert esperar(lambda: all(h.motores["A"].speed() == 0 for h in hubs.values()))
+
+
+def test_un_hub_caido_no_frena_al_resto(flota):
+    f, hubs = flota
+    hubs["SP-8"].perdida = 1.0
+    f.send_packet("B300")
+    assert esperar(lambda: hubs["SP-7"].motores["A"].speed() == -300
+                   and hubs["SP-9"].motores["A"].speed() == -300)
+    assert f.salud()["SP-8"]["estado"] == "listo"
+
+
+def test_close_termina_los_hilos_lectores():
+    f = FlotaBLE(Queue(), ["SP-7", "SP-8"], hub_factory=Simulador.fabrica(5), telemetry_ms=0)
+    f.start()
+    assert esperar(f.running.is_set)
+    lectores = [w._parser for w in f.workers.values()]
+    f.close()
+    assert esperar(lambda: not any(t.is_alive() for t in lectores))
@@ -0,0 +1,95 @@
+# Gateway: control compartido entre clientes TCP y contrapresión por cliente,
+# con el Controlador sobre el hub simulado en el loop del test
+import asyncio
+import time
+
+import Conexion
+import Registro
+import Simulador
+from Controlador import Controlador
+from Gateway import MAX_EN_VUELO_CLIENTE, Gateway
+
+
+class _Cliente:
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    def escribir(self, *lineas):
+        self.writer.write("".join(l + "\n" for l in lineas).encode('utf-8'))
+
+    async def esperar(self, prefijo: str, timeout: float = 3.0) -> str:
+        async def leer():
+            while True:
+                linea = (await self.reader.readline()).decode('utf-8').strip()
+                if linea.startswith(prefijo):
+                    return linea
+        return await asyncio.wait_for(leer(), timeout)
+
+
+def ejecutar(prueba, **opciones):
+    async def principal():
+        hubs = {}
+        ctl = Controlador("SP-7", Registro.Registro(), Simulador.fabrica(5, hubs=hubs),
+                          telemetry_ms=0, **opciones)
+        gw = Gateway(ctl)
+        servidor = await gw.iniciar("127.0.0.1", 0)
+        puerto = servidor.sockets[0].getsockname()[1]
+        await ctl.conectar(5)
+
+        async def cliente(nombre):
+            c = _Cliente(*await asyncio.open_connection("127.0.0.1", puerto))
+            c.escribir(f"HOLA {nombre}")
+            await c.esperar("HOLA")
+            return c
+        try:
+            return await prueba(gw, hubs["SP-7"], cliente)
+        finally:
+            await gw.cerrar()
+    return asyncio.run(principal())
+
+
+def test_control_entre_clientes():
+    async def prueba(gw, hub, cliente):
+        a, b = await cliente("a"), await cliente("b")
+        a.escribir("?F500")
+        assert await a.esperar("OK") == "OK F500"
+        assert gw.control.nombre == "a"
+        b.escribir("?L")
+        assert await b.esperar("ERR") == "ERR ocupado a"
+        assert await b.esperar("NOK") == "NOK L"
+        # parar: cualquier cliente, siempre
+        b.escribir("PARAR")
+        await asyncio.sleep(0.2)
+        assert hub.motores["A"].speed() == 0
+        a.escribir("SOLTAR")
+        b.escribir("?R")
+        assert await b.esperar("OK") == "OK R"
+        # quien conduce se va: el coche no sigue solo
+        b.escribir("?F300")
+        await b.esperar("OK")
+        b.writer.close()
+        await a.esperar("CONTROL -")
+        await asyncio.sleep(0.2)
+        assert hub.motores["A"].speed() == 0
+    ejecutar(prueba)
+
+
+def test_rafaga_de_un_cliente_no_frena_a_otro(monkeypatch):
+    # Hub mudo: cada comando ocupa su hueco hasta que vence su ack
+    monkeypatch.setattr(Conexion, "ACK_LIMITE", 0.4)
+
+    async def prueba(gw, hub, cliente):
+        a, b = await cliente("a"), await cliente("b")
+        hub.perdida = 1.0
+        a.escribir(*["Q"] * 30)
+        await asyncio.sleep(0.1)
+        rafaga = next(c for c in gw.clientes if c.nombre == "a")
+        assert rafaga.en_vuelo.locked()
+        assert len(gw.ctl.nucleo._pending_ack) <= MAX_EN_VUELO_CLIENTE + 1
+        # el comando de b no espera detrás de los 30 de a: sólo su propio plazo
+        t0 = time.perf_counter()
+        b.escribir("?Q")
+        assert await b.esperar("NOK") == "NOK Q"
+        return time.perf_counter() - t0
+    assert ejecutar(prueba, lease_ms=0) < 1.0
@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+import Grabador
+
+
+def test_ida_y_vuelta(tmp_path):
+    path = str(tmp_path / "sesion.lgr")
+    g = Grabador.Grabador(path)
+    g.registrar("F500", t=10.0)
+    g.registrar("S", prioridad=True, t=10.25)
+    g.registrar("T1234567", t=10.3)  # no cabe en 7 bytes: se omite sin fallar
+    g.cerrar()
+    assert (g.registros, g.omitidos) == (2, 1)
+    with Grabador.Grabacion(path) as grabacion:
+        assert list(grabacion) == [(10.0, "F500", False), (10.25, "S", True)]
+        assert grabacion[-1][1] == "S"
+        assert grabacion.duracion() == pytest.approx(0.25)
+
+
+def test_reabrir_empieza_sesion_nueva(tmp_path):
+    path = str(tmp_path / "sesion.lgr")
+    for t in (1.0, 5000.0):
+        g = Grabador.Grabador(path)
+        g.registrar("L", t=t)
+        g.cerrar()
+    with Grabador.Grabacion(path) as grabacion:
+        assert list(grabacion) == [(5000.0, "L", False)]
+
+
+def test_registro_a_medias_y_otro_formato(tmp_path):
+    path = tmp_path / "corte.lgr"
+    g = Grabador.Grabador(str(path))
+    g.registrar("R", t=1.0)
+    g.cerrar()
+    with open(path, "ab") as f:
+        f.write(b"\x00" * 5)  # corte de luz a mitad de registro
+    with Grabador.Grabacion(str(path)) as grabacion:
+        assert len(grabacion) == 1
+    otro = tmp_path / "otro.bin"
+    otro.write_bytes(b"NOPE\x01\x00\x00\x00")
+    with pytest.raises(ValueError):
+        Grabador.Grabacion(str(otro))
+
+
+def test_reproducir_respeta_los_tiempos(tmp_path):
+    path = str(tmp_path / "sesion.lgr")
+    g = Grabador.Grabador(path)
+    for i, texto in enumerate(("F100", "F200", "S")):
+        g.registrar(texto, t=100.0 + i * 0.05)
+    g.cerrar()
+    enviados = []
+
+    async def principal():
+        loop = asyncio.get_running_loop()
+        inicio = loop.time()
+        with Grabador.Grabacion(path) as grabacion:
+            n = await Grabador.reproducir(
+                lambda texto, prioridad: enviados.append((texto, loop.time() - inicio)),
+                grabacion, velocidad=2.0)
+        return n
+
+    assert asyncio.run(principal()) == 3
+    assert [t for t, _ in enviados] == ["F100", "F200", "S"]
+    assert enviados[-1][1] == pytest.approx(0.05, abs=0.03)
@@ -0,0 +1,44 @@
+import pytest
+
+from conftest import esperar
+from Latencia import Histograma, _MIN_MS, _FACTOR, _N_CUBETAS
+
+
+def test_cubetas_logaritmicas():
+    h = Histograma()
+    h.registrar(0.01)             # por debajo del mínimo: primera cubeta
+    h.registrar(_MIN_MS * 1.5)    # ~5 pasos del 8 %
+    h.registrar(1e9)              # fuera de rango: última cubeta
+    assert h.cubetas[0] == 1
+    assert h.cubetas[6] == 1
+    assert h.cubetas[_N_CUBETAS - 1] == 1
+    assert h.n == 3 and h.max == 1e9
+
+
+def test_percentil_acotado_por_el_maximo():
+    h = Histograma()
+    for ms in (1.0,) * 90 + (20.0,) * 10:
+        h.registrar(ms)
+    assert h.percentil(50) == pytest.approx(1.0, rel=_FACTOR - 1)
+    assert h.percentil(50) >= 1.0
+    assert h.percentil(95) == pytest.approx(20.0, rel=_FACTOR - 1)
+    assert h.percentil(100) == 20.0
+
+
+def test_vacio_y_reset():
+    h = Histograma()
+    assert h.percentil(99) == 0.0
+    h.registrar(5)
+    h.reset()
+    assert h.n == 0 and h.percentil(50) == 0.0 and not any(h.cubetas)
+
+
+def test_acks_confirman_el_estado(conectar):
+    w, hub = conectar()
+    assert "ACK" in w.hub_caps
+    w.send_packet("F500")
+    w.send_packet("L")
+    assert esperar(lambda: w.estado_confirmado("traccion") == "F500"
+                   and w.estado_confirmado("direccion") == "L")
+    assert hub.motores["A"].speed() == 500
+    assert esperar(lambda: w.latency.hist["total"].n >= 2)  # send_packet -> ack
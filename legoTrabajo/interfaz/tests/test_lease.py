@@ -0,0 +1,18 @@
+# Contra el LISTENER_SCRIPT real corriendo en el hub simulado
+import time
+
+from conftest import esperar
+
+
+def test_lease_vencido_para_el_coche(conectar):
+    w, hub = conectar(lease_ms=300)
+    assert esperar(lambda: w.lease_hub_ms == 300)
+    w.send_packet("F500")
+    assert esperar(lambda: hub.motores["A"].speed() == 500)
+    hub.perdida = 1.0  # ni comandos ni latidos llegan al hub
+    t0 = time.perf_counter()
+    assert esperar(lambda: hub.motores["A"].speed() == 0, timeout=2)
+    assert time.perf_counter() - t0 < 1.0
+    hub.perdida = 0.0
+    w.request_stats()
+    assert esperar(lambda: w.lease_fallos >= 1)
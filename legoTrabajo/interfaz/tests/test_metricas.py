@@ -0,0 +1,45 @@
+import Metricas
+
+
+def test_formato_prometheus():
+    r = Metricas.RegistroMetricas()
+    r.contador("lego_writes_total", "writes al hub", hub="SP-7").inc(3)
+    r.contador("lego_writes_total", "writes al hub", hub="SP-8").inc()
+    r.medidor("lego_cola", hub='a"b\\c\nd').set(2.5)
+    r.funcion("lego_latencia_ms", lambda: 12.0, "latencia p50", hub="SP-7")
+    r.funcion("lego_roto", lambda: 1 / 0)  # una función que falla no rompe el volcado
+    assert r.prometheus() == (
+        '# TYPE lego_cola gauge\n'
+        'lego_cola{hub="a\\"b\\\\c\\nd"} 2.5\n'
+        '# HELP lego_latencia_ms latencia p50\n'
+        '# TYPE lego_latencia_ms gauge\n'
+        'lego_latencia_ms{hub="SP-7"} 12\n'
+        '# HELP lego_writes_total writes al hub\n'
+        '# TYPE lego_writes_total counter\n'
+        'lego_writes_total{hub="SP-7"} 3\n'
+        'lego_writes_total{hub="SP-8"} 1\n'
+    )
+
+
+def test_reutiliza_y_quita_por_etiquetas():
+    r = Metricas.RegistroMetricas()
+    c = r.contador("x_total", hub="SP-7")
+    assert r.contador("x_total", hub="SP-7") is c
+    r.medidor("y", hub="SP-7", grupo="g")
+    r.medidor("y", hub="SP-8")
+    r.quitar(hub="SP-7")
+    assert [(m.nombre, m.etiquetas) for m, _ in r.muestra()] == [("y", (("hub", "SP-8"),))]
+
+
+def test_exportador_prom_y_csv(tmp_path):
+    r = Metricas.RegistroMetricas()
+    r.contador("z_total").inc(7)
+    prom = tmp_path / "m.prom"
+    Metricas.Exportador(r, str(prom)).volcar()
+    assert prom.read_text(encoding="utf-8").endswith("z_total 7\n")
+    csv = tmp_path / "m.csv"
+    exp = Metricas.Exportador(r, str(csv), max_bytes=60, copias=2)
+    for _ in range(4):
+        exp.volcar()
+    assert (tmp_path / "m.csv.1").exists() and not (tmp_path / "m.csv.3").exists()
+    assert csv.read_text(encoding="utf-8").startswith("t,metrica,etiquetas,valor\n")
@@ -0,0 +1,100 @@
+import threading
+import time
+
+from conftest import esperar
+from Muestreo import EstadoControl, Muestreador
+
+
+class _Worker:
+    # Lo que usa Muestreador de BLEWorker: running, estado_confirmado y send_packet
+    def __init__(self):
+        self.running = threading.Event()
+        self.running.set()
+        self.confirmado = {}
+        self.enviados = []
+
+    def estado_confirmado(self, canal):
+        return self.confirmado.get(canal)
+
+    def send_packet(self, texto, prioridad=False):
+        self.enviados.append(texto)
+
+
+def test_estado_ultima_pulsada_manda():
+    e = EstadoControl()
+    assert e.comandos() == {"traccion": "S", "direccion": "Z"}
+    e.pulsar("tecla_w", "F")
+    e.pulsar("btn_down", "B")
+    e.pulsar("tecla_a", "L")
+    assert e.comandos() == {"traccion": "B500", "direccion": "L"}
+    e.soltar("btn_down")
+    e.velocidad = 0
+    assert e.comandos()["traccion"] == "S"
+    e.velocidad = 700
+    assert e.comandos()["traccion"] == "F700"
+
+
+def test_teclas_tienen_preferencia_sobre_consignas():
+    e = EstadoControl()
+    e.proporcional("pad", -400, 12)
+    assert e.comandos() == {"traccion": "U-400", "direccion": "W12"}
+    e.pulsar("tecla_d", "R")
+    assert e.comandos() == {"traccion": "U-400", "direccion": "R"}
+
+
+def test_solo_envia_diferencias_con_lo_confirmado():
+    w = _Worker()
+    m = Muestreador(w)
+    w.confirmado = {"traccion": "S", "direccion": "Z"}
+    m.tick()
+    assert w.enviados == []
+    m.estado.pulsar("tecla_w", "F")
+    for _ in range(5):  # repetición de tecla: sin ack todavía, un solo envío
+        m.estado.pulsar("tecla_w", "F")
+        m.tick()
+    assert w.enviados == ["F500"]
+    w.confirmado["traccion"] = "F500"
+    m.tick()
+    assert w.enviados == ["F500"] and m.ticks == 7
+
+
+def test_reenvia_si_no_llega_el_ack():
+    w = _Worker()
+    m = Muestreador(w, reenvio_s=0.05)
+    m.estado.pulsar("tecla_a", "L")
+    m.tick()
+    m.tick()
+    assert w.enviados.count("L") == 1
+    time.sleep(0.06)
+    m.tick()
+    assert w.enviados.count("L") == 2
+
+
+def test_sin_conexion_no_envia_ni_recuerda():
+    w = _Worker()
+    m = Muestreador(w)
+    m.estado.pulsar("tecla_w", "F")
+    m.tick()
+    w.running.clear()
+    m.tick()
+    w.running.set()
+    m.tick()  # lo en vuelo se olvidó al caer: se vuelve a enviar en seguida
+    assert w.enviados.count("F500") == 2
+
+
+def test_contra_el_hub_simulado(conectar):
+    w, hub = conectar(latencia_ms=15)
+    m = Muestreador(w, periodo_ms=20)
+    m.estado.pulsar("tecla_w", "F")
+    fin = time.monotonic() + 0.5
+    while time.monotonic() < fin:
+        m.estado.pulsar("tecla_w", "F")  # autorepetición del teclado
+        m.tick()
+        time.sleep(0.02)
+    assert hub.motores["A"].speed() == 500
+    assert m.enviados <= 3 < m.ticks
+    m.estado.soltar("tecla_w")
+    for _ in range(10):
+        m.tick()
+        time.sleep(0.02)
+    assert esperar(lambda: hub.motores["A"].speed() == 0)
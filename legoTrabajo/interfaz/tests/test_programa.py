@@ -0,0 +1,50 @@
+# Caché del programa compilado y arranque sin descarga (perfil actual del hub)
+import Simulador
+from Conexion import preparar_script
+
+
+def _mensajes(w):
+    mensajes = []
+    while not w.log_queue.empty():
+        mensajes.append(w.log_queue.get())
+    return mensajes
+
+
+def test_reconexion_sin_descarga_si_el_hash_coincide(conectar):
+    hubs = {}
+    fabrica = Simulador.fabrica(5, hubs=hubs)
+    w, hub = conectar(hub_factory=fabrica, hubs=hubs)
+    assert hub._mpy_abi_version == 0 and hub.descargas == 1
+    w.close()
+
+    w, hub = conectar(hub_factory=fabrica, hubs=hubs)
+    assert hub.descargas == 0
+    assert "Programa ya presente en el hub, arrancando..." in _mensajes(w)
+
+
+def test_hash_distinto_vuelve_a_descargar_desde_la_cache(conectar):
+    hubs = {}
+    fabrica = Simulador.fabrica(5, hubs=hubs)
+    w, hub = conectar(hub_factory=fabrica, hubs=hubs)
+    w.close()
+    # otro programa en el hub (p. ej. cargado desde Pybricks Code) con otro hash
+    prog_hash, _ = preparar_script()
+    hub.flash["programa"] = hub.flash["programa"].replace(prog_hash, "0" * len(prog_hash))
+
+    w, hub = conectar(hub_factory=fabrica, hubs=hubs)
+    mensajes = _mensajes(w)
+    assert hub.descargas == 1
+    assert "El programa del hub no coincide, recargando..." in mensajes
+    assert "Usando script compilado en caché." in mensajes
+    assert prog_hash in hub.flash["programa"]
+
+
+def test_firmware_antiguo_ejecuta_el_fuente(conectar):
+    hubs = {}
+
+    async def antiguo(nombre):
+        hubs[nombre] = Simulador.HubSimulado(mpy_abi=6)
+        return f"SIM-{nombre}", hubs[nombre]
+
+    w, hub = conectar(hub_factory=antiguo, hubs=hubs)
+    assert hub.descargas == 1 and "BIN" in w.hub_caps
@@ -0,0 +1,58 @@
+import pytest
+
+from conftest import esperar
+import Protocolo
+
+
+def test_parse_texto():
+    assert Protocolo.parse_texto("F500") == (ord("F"), 500)
+    assert Protocolo.parse_texto("L") == (ord("L"), 0)
+    assert Protocolo.parse_texto("A-32768") == (ord("A"), Protocolo.VALOR_MIN)
+    with pytest.raises(ValueError):
+        Protocolo.parse_texto("  ")
+
+
+@pytest.mark.parametrize("cmd", ["A-40000", "D32768", "Fxx"])
+def test_parse_texto_rechaza_lo_que_no_cabe(cmd):
+    # sin recorte: en texto el hub lo usaría tal cual
+    with pytest.raises(ValueError):
+        Protocolo.parse_texto(cmd)
+
+
+def test_marco_binario_y_checksum():
+    marco = Protocolo.codificar_marco(ord("B"), -300, 0x1FE)
+    assert len(marco) == Protocolo.MARCO_LEN
+    assert marco[0] == Protocolo.MARCO_INICIO and marco[1] == ord("B")
+    assert int.from_bytes(marco[2:4], "little", signed=True) == -300
+    assert marco[4] == 0xFE  # seq de un byte
+    assert marco[5] == (ord("B") + (-300 & 0xFF) + ((-300 >> 8) & 0xFF) + 0xFE) & 0xFF
+
+
+def test_codificador_texto_sin_y_con_ack():
+    c = Protocolo.Codificador()
+    assert c.codificar("F500") == b"F500;"
+    assert c.seq == 0
+    c.ack = True
+    assert c.codificar("L") == b"L@1;"
+    assert c.seq == 1
+
+
+def test_codificador_binario_numera_y_da_la_vuelta():
+    c = Protocolo.Codificador()
+    c.version = Protocolo.PROTO_BINARIO
+    c.seq = 254
+    assert c.codificar("S")[4] == 255
+    marco = c.codificar("F1000")
+    assert c.seq == 0 and marco[4] == 0
+    assert marco == Protocolo.codificar_marco(ord("F"), 1000, 0)
+    c.reset()
+    assert (c.version, c.ack, c.seq) == (Protocolo.PROTO_TEXTO, False, 0)
+
+
+def test_worker_descarta_el_comando_fuera_de_rango(conectar):
+    w, hub = conectar()
+    assert w.codec.version == Protocolo.PROTO_BINARIO
+    w.send_packet("F40000")
+    w.send_packet("L")
+    assert esperar(lambda: w.estado_confirmado("direccion") == "L")
+    assert w.invalidos == 1 and hub.motores["A"].speed() == 0
@@ -0,0 +1,37 @@
+# Caída del enlace (Simulador.cortar_enlace): el worker reconecta solo y
+# restaura el último estado de cada canal
+from conftest import esperar
+
+
+def test_reconecta_y_restaura_el_estado(conectar):
+    w, hub = conectar()
+    estados = []
+    w.add_state_listener(estados.append)
+    w.send_packet("F500")
+    w.send_packet("L")
+    assert esperar(lambda: w.estado_confirmado("direccion") == "L")
+    hub.cortar_enlace()
+    assert esperar(lambda: w.hub is not hub and w.state == "listo")
+    assert "reconectando" in estados and w.reconexiones == 1
+    nuevo = w.hub
+    assert esperar(lambda: nuevo.motores["A"].speed() == 500 and nuevo.motores["C"].angle() < 0)
+
+
+def test_comandos_durante_la_caida_ganan_al_restaurar(conectar):
+    w, hub = conectar(latencia_ms=20)
+    w.send_packet("F500")
+    assert esperar(lambda: w.estado_confirmado("traccion") == "F500")
+    hub.cortar_enlace()
+    assert w.running.is_set()  # sigue aceptando comandos mientras reconecta
+    w.send_packet("B200")
+    assert esperar(lambda: w.hub is not hub and w.state == "listo")
+    assert esperar(lambda: w.hub.motores["A"].speed() == -200)
+
+
+def test_stop_y_start_reutilizan_el_worker(conectar):
+    w, _ = conectar()
+    w.stop()
+    assert esperar(lambda: w.state == "desconectado")
+    w.start()
+    assert esperar(lambda: w.state == "listo")
+    assert w.thread.is_alive()
@@ -0,0 +1,49 @@
+# Mantener rumbo en el hub (M1/A/M0) contra la deriva del coche simulado, y
+# el rumbo de la telemetría con la IMU ya muy girada
+import Simulador
+from conftest import esperar
+
+
+def conectar_con_deriva(conectar, deriva: float = 8.0):
+    hubs = {}
+    w, hub = conectar(hub_factory=Simulador.fabrica(5, hubs=hubs, deriva=deriva), telemetry_ms=50)
+    return w, hub, hub.prime.imu
+
+
+def test_mantiene_el_rumbo_contra_la_deriva(conectar):
+    w, hub, imu = conectar_con_deriva(conectar)
+    w.hold_heading()
+    assert esperar(lambda: w.heading_hold)
+    w.send_packet("F600")
+    assert esperar(lambda: w.estado_confirmado("traccion") == "F600")
+    # sin corrección serían ~8° por segundo
+    assert not esperar(lambda: abs(imu.heading()) > 4, timeout=1.5)
+    assert hub.motores["C"].angle() != 0
+    # L/R: el piloto vuelve a tomar la dirección
+    w.send_packet("R")
+    assert esperar(lambda: not w.heading_hold)
+
+
+def test_rumbo_fijado_con_la_imu_ya_girada(conectar):
+    w, hub, imu = conectar_con_deriva(conectar)
+    imu.reset_heading(360 * 100 + 30)  # más de 32767: no cabe en un int16
+    # el objetivo va en ±180, como el rumbo de la telemetría
+    w.hold_heading(20)
+    w.send_packet("F600")
+    assert esperar(lambda: abs(imu.heading() - (360 * 100 + 20)) < 4)
+    assert w.heading_hold and w.invalidos == 0
+
+
+def test_telemetria_con_rumbo_acumulado(conectar):
+    w, hub, imu = conectar_con_deriva(conectar, deriva=0.0)
+    imu.reset_heading(360 * 100 + 90)
+    total = w.telemetry.total
+    assert esperar(lambda: w.telemetry.total > total + 2)
+    assert w.telemetry.ultimo()["rumbo"] == 90
+    imu.reset_heading(-(360 * 100 + 90))
+    total = w.telemetry.total
+    assert esperar(lambda: w.telemetry.total > total + 2)
+    assert w.telemetry.ultimo()["rumbo"] == -90
+    # el bucle del hub sigue vivo
+    w.send_packet("F200")
+    assert esperar(lambda: w.estado_confirmado("traccion") == "F200")
@@ -0,0 +1,16 @@
+# Contra el LISTENER_SCRIPT real corriendo en el hub simulado
+import time
+
+from conftest import esperar
+
+
+def test_reenvio_con_perdidas_sin_respuesta(conectar):
+    w, hub = conectar(latencia_ms=10, perdida=0.3, semilla=3, sin_respuesta=True)
+    assert esperar(lambda: w.rapido)
+    for texto in ("F500", "L", "B300", "R", "F700", "Z") * 2:
+        w.send_packet(texto)
+        time.sleep(0.05)
+    assert esperar(lambda: w.estado_confirmado("traccion") == "F700"
+                   and w.estado_confirmado("direccion") == "Z", timeout=5)
+    assert hub.perdidos > 0 and w.reenvios > 0
+    assert hub.motores["A"].speed() == 700
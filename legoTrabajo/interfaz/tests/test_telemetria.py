@@ -0,0 +1,14 @@
+# Contra el LISTENER_SCRIPT real corriendo en el hub simulado
+from conftest import esperar
+
+
+def test_telemetria_decodificada(conectar):
+    w, hub = conectar(telemetry_ms=40)
+    # ángulos acumulados fuera del rango de int16
+    hub.motores["A"].reset_angle(40000)
+    hub.motores["E"].reset_angle(-70000)
+    assert esperar(lambda: (w.telemetry.ultimo() or {}).get("ang_e") == -70000)
+    reg = w.telemetry.ultimo()
+    assert reg["ang_a"] == 40000
+    assert reg["bateria_mv"] > 0 and reg["t_ms"] >= 0
+    assert hub._hilo.is_alive()
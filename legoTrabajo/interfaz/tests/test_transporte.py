@@ -0,0 +1,28 @@
+# Transporte automático: al caer el BLE con el cable USB enchufado, la
+# reconexión sigue por USB (Simulador.fabrica(usb=Event) hace de conectar_auto)
+import threading
+
+import Metricas
+import Simulador
+from conftest import esperar
+
+
+def test_cae_el_ble_y_sigue_por_usb(conectar):
+    cable = threading.Event()
+    hubs = {}
+    w, hub = conectar(hub_factory=Simulador.fabrica(5, hubs=hubs, usb=cable))
+    assert w.transporte == "ble" and not isinstance(hub, Simulador.HubSimuladoUSB)
+    w.send_packet("F500")
+    assert esperar(lambda: w.estado_confirmado("traccion") == "F500")
+
+    cable.set()
+    hub.cortar_enlace()
+    assert esperar(lambda: w.hub is not hub and w.state == "listo")
+    assert w.transporte == "usb" and isinstance(w.hub, Simulador.HubSimuladoUSB)
+    # el estado pedido se restaura por el cable
+    assert esperar(lambda: hubs["SP-7"].motores["A"].speed() == 500)
+
+    assert w.write_lat.n > 0
+    assert w.transport_summary().startswith("USB · write p50/p95")
+    metricas = {(m.nombre, m.etiquetas): v for m, v in Metricas.METRICAS.muestra()}
+    assert metricas[("lego_write_p95_ms", (("hub", "SP-7"),))] > 0
@@ -0,0 +1,76 @@
+import time
+
+import pytest
+
+from conftest import esperar
+from Trayectoria import MAX_SEGMENTO_MS, TRJ_MAX, Trayectoria
+
+
+def test_comandos_solo_con_cambios():
+    t = Trayectoria().avanzar(600, 0.3).girar(-30).rampa(0, 0.2)
+    assert t.comandos() == ["C", "V600", "G0", "D300", "P0", "V0", "G-30", "D200", "P1", "X"]
+    assert t.comandos(ejecutar=False)[-1] == "P1"
+    assert t.duracion() == pytest.approx(0.5)
+
+
+def test_rampa_larga_partida_en_tramos():
+    t = Trayectoria().avanzar(100, 0.1).rampa(900, 40)
+    tramos = t.segmentos[1:]
+    assert [s.ms for s in tramos] == [MAX_SEGMENTO_MS, 40000 - MAX_SEGMENTO_MS]
+    assert 100 < tramos[0].velocidad < 900 and tramos[1].velocidad == 900
+    assert all(s.rampa for s in tramos)
+
+
+def test_demasiados_segmentos_no_modifica_la_trayectoria():
+    t = Trayectoria()
+    for i in range(TRJ_MAX - 1):
+        t.avanzar(100 + i, 0.01)
+    antes = t.comandos()
+    with pytest.raises(ValueError):
+        t.esperar(40)  # dos tramos: no caben
+    assert len(t) == TRJ_MAX - 1 and t.comandos() == antes
+    t.avanzar(0, 0.01)  # el último sí cabe
+    assert len(t) == TRJ_MAX
+    with pytest.raises(ValueError):
+        Trayectoria().avanzar(100, -1)
+
+
+def test_ejecuta_en_el_hub_simulado(conectar):
+    w, hub = conectar(latencia_ms=15)
+    t = Trayectoria().avanzar(600, 0.3).girar(-30).rampa(0, 0.2)
+    t0 = time.perf_counter()
+    fin = w.send_trajectory(t)
+    assert esperar(lambda: hub.motores["A"].speed() == 600)
+    assert fin.result(3) == "FIN"
+    assert 0.45 < time.perf_counter() - t0 < 1.0
+    assert hub.motores["A"].speed() == 0 and hub.motores["C"].angle() == -30
+
+
+def test_comando_en_vivo_la_aborta(conectar):
+    w, hub = conectar()
+    fin = w.send_trajectory(Trayectoria().avanzar(300, 2))
+    assert esperar(lambda: hub.motores["A"].speed() == 300)
+    w.send_packet("S")
+    assert fin.result(2) == "ABORT"
+
+
+def test_lo_cargado_sobrevive_a_s_hasta_c(conectar):
+    w, hub = conectar()
+    assert w.send_trajectory(Trayectoria().avanzar(400, 0.3), ejecutar=False).result(2) == "CARGADA"
+    w.send_packet("S")
+    w.send_packet("X")
+    assert esperar(lambda: hub.motores["A"].speed() == 400)
+    w.send_packet("C")
+    assert esperar(lambda: hub.motores["A"].speed() == 0)
+    w.send_packet("X")  # C vació el buffer: nada que ejecutar
+    time.sleep(0.1)
+    assert hub.motores["A"].speed() == 0
+
+
+def test_trayectoria_larga_sin_desbordar_la_fifo(conectar):
+    w, _ = conectar()
+    t = Trayectoria()
+    for i in range(30):
+        t.avanzar(100 + i, 0.01).girar(i)
+    assert w.send_trajectory(t).result(5) == "FIN"
+    assert w.queue_stats()["descartados"] == 0